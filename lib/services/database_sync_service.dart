@@ -31,23 +31,24 @@ class DatabaseSyncService {
     final dbFile = File('$databasePath/assemble_db.db');
     
     if (await dbFile.exists()) {
-      // Read database as bytes
-      final dbBytes = await dbFile.readAsBytes();
-      
-      // Convert to base64 for transmission
-      final base64Db = base64Encode(dbBytes);
-      
-      // Send to Python API - CORRECT ENDPOINT
-      final response = await http.post(
-        Uri.parse('$pythonApiBaseUrl/api/sync/database'), // Correct endpoint
-        headers: {'Content-Type': 'application/json'},
-        body: json.encode({
-          'database_data': base64Db,
-          'timestamp': DateTime.now().millisecondsSinceEpoch,
-        }),
-      ).timeout(Duration(seconds: 30));
+      // Stream the raw database file instead of loading it into memory
+      final request = http.StreamedRequest(
+        'POST',
+        Uri.parse('$pythonApiBaseUrl/api/sync/database'),
+      );
+      request.headers['Content-Type'] = 'application/octet-stream';
+      request.headers['X-Sync-Timestamp'] = DateTime.now().millisecondsSinceEpoch.toString();
+      request.contentLength = await dbFile.length();
 
-      if (response.statusCode == 200) {
+      final pendingResponse = request.send();
+      await request.sink.addStream(dbFile.openRead());
+      await request.sink.close();
+
+      final response = await http.Response.fromStream(await pendingResponse)
+          .timeout(Duration(seconds: 30));
+
+      // 202: the async server swaps the database in as a background job
+      if (response.statusCode == 200 || response.statusCode == 202) {
         print(' Database synced successfully with Python API');
       } else {
         print(' Database sync failed: ${response.statusCode} - ${response.body}');
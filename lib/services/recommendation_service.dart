@@ -264,6 +264,51 @@ class RecommendationService {
     }
   }
 
+  // Compatible recommendations for several categories in one request,
+  // keyed by category and then 'database' / 'dataset'
+  static Future<Map<String, Map<String, List<Recommendation>>>> getCompatibleRecommendationsBatch({
+    required Map<String, int> currentBuild,
+    required List<String> targetCategories,
+    int nRecommendations = 5,
+  }) async {
+    if (targetCategories.isEmpty) return {};
+    try {
+      final baseUrl = await _currentBaseUrl;
+      print('🔄 Getting batch compatible recommendations from: $baseUrl');
+
+      final response = await http.post(
+        Uri.parse('$baseUrl/compatible/batch'),
+        headers: {'Content-Type': 'application/json'},
+        body: json.encode({
+          'current_build': currentBuild,
+          'target_categories': targetCategories,
+          'n_recommendations': nRecommendations,
+          'strict': false,
+        }),
+      ).timeout(const Duration(seconds: 10));
+
+      if (response.statusCode == 200) {
+        final data = json.decode(response.body);
+        if (data['success'] == true) {
+          final results = Map<String, dynamic>.from(data['results'] ?? {});
+
+          return results.map((category, result) {
+            final databaseRecs = List<Map<String, dynamic>>.from(result['database_recommendations'] ?? []);
+            final datasetRecs = List<Map<String, dynamic>>.from(result['dataset_recommendations'] ?? []);
+            return MapEntry(category, {
+              'database': databaseRecs.map((json) => Recommendation.fromJson(json)).toList(),
+              'dataset': datasetRecs.map((json) => Recommendation.fromJson(json)).toList(),
+            });
+          });
+        }
+      }
+      return {};
+    } catch (e) {
+      print('❌ Error getting batch compatible recommendations: $e');
+      return {};
+    }
+  }
+
   static Future<void> debugRecommendations() async {
     print('🎯 DEBUG: Testing recommendation endpoints...');
     
@@ -0,0 +1,343 @@
+"""
+Asynchronous (ASGI) entry point for the recommendation API.
+
+    uvicorn asgi:create_asgi_app --factory --port 5000
+
+This is a bridge in front of the Flask app, not a native asyncio port.
+Every route except the full database sync is still the synchronous Flask
+view of recommendation.py, called with a WSGI environ built from the ASGI
+scope (see _call_wsgi). What the bridge buys is an event loop that never
+blocks on SQLite I/O or scoring: scoring routes and routes that write the
+database run on two separate bounded thread pools, so a slow sync never
+holds up /similar, and /health never waits for either. A full database
+sync is received natively, handed to the writer without blocking, and
+then swapped in and reloaded as a background job, whose progress is
+reported by GET /api/sync/database/status.
+
+What the bridge costs against native handlers:
+- every scoring request hops to a worker thread and back, and pays for
+  the WSGI environ and Flask's request handling on top of the view;
+- the request body is read whole into memory before the view runs, and
+  the response is buffered, not streamed;
+- concurrency is bounded by the thread pools (SCORING_WORKERS scoring
+  requests at a time, the rest wait for a thread), not by the event loop.
+Scoring is CPU-bound and holds the GIL, so a native handler would still
+hand it to a thread; the views stay shared with the WSGI servers.
+"""
+import asyncio
+import base64
+import io
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import recommendation
+
+logger = logging.getLogger(__name__)
+
+SCORING_WORKERS = os.cpu_count() or 4
+DATABASE_WORKERS = 2
+MAX_SYNC_JOBS = 20  # finished sync jobs kept for the status endpoint
+UPLOAD_QUEUE_CHUNKS = 16  # received chunks buffered ahead of the database writer
+
+# Answered on the event loop: they only read the published snapshot
+INLINE_ROUTES = {('GET', '/'), ('GET', '/health'), ('GET', '/metrics'), ('GET', '/test')}
+# Everything under /api/ writes the database or schedules model work
+DATABASE_ROUTE_PREFIX = '/api/'
+SYNC_DATABASE_ROUTE = '/api/sync/database'
+SYNC_STATUS_ROUTE = '/api/sync/database/status'
+
+
+class UploadAborted(Exception):
+    """The client disconnected before its database upload finished"""
+
+
+class AsyncRecommendationAPI:
+    """ASGI application serving the recommendation API through its Flask app"""
+
+    def __init__(self, wsgi_app, scoring_workers: int = SCORING_WORKERS, database_workers: int = DATABASE_WORKERS):
+        self.wsgi_app = wsgi_app
+        self.scoring_executor = ThreadPoolExecutor(max_workers=scoring_workers, thread_name_prefix="scoring")
+        self.database_executor = ThreadPoolExecutor(max_workers=database_workers, thread_name_prefix="database")
+        # Full syncs replace the whole database file, so they run one at a time
+        self.sync_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database-sync")
+        self.sync_jobs = OrderedDict()
+        self.sync_jobs_lock = threading.Lock()
+        self.job_ids = itertools.count(1)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        method, path = scope['method'], scope['path']
+        try:
+            if path == SYNC_DATABASE_ROUTE and method == 'POST':
+                status, headers, body = await self._sync_database(scope, receive)
+            elif path == SYNC_STATUS_ROUTE and method == 'GET':
+                status, headers, body = self._sync_status(scope)
+            else:
+                request_body = await _read_body(receive)
+                if (method, path) in INLINE_ROUTES:
+                    status, headers, body = _call_wsgi(self.wsgi_app, scope, request_body)
+                else:
+                    executor = self.database_executor if path.startswith(DATABASE_ROUTE_PREFIX) else self.scoring_executor
+                    status, headers, body = await asyncio.get_running_loop().run_in_executor(
+                        executor, _call_wsgi, self.wsgi_app, scope, request_body
+                    )
+        except Exception as e:
+            logger.error(f" Error serving {method} {path}: {e}")
+            status, headers, body = _json_response(500, {'error': str(e)})
+
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _lifespan(self, receive, send):
+        """Shut the executors down with the server"""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for executor in (self.scoring_executor, self.database_executor, self.sync_executor):
+                    executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # ========== FULL DATABASE SYNC ==========
+    async def _sync_database(self, scope, receive):
+        """
+        Receive a full database sync and swap it in as a background job.
+        The raw SQLite upload is streamed to the writer as it arrives; the
+        legacy JSON {"database_data": "<base64>"} body is decoded first.
+        Responds 202 once the upload is received, with the payload of the
+        Flask route plus the job id. An upload cut short by a disconnect
+        fails the job and is never swapped in.
+        """
+        loop = asyncio.get_running_loop()
+        job = self._new_sync_job()
+
+        if _header(scope, b'content-type').split(';')[0].strip() == 'application/json':
+            request_body = await _read_body(receive)
+            try:
+                database_data = json.loads(request_body or b'{}').get('database_data')
+            except (ValueError, AttributeError):
+                database_data = None
+            if not database_data:
+                self._finish_sync_job(job, 'failed', error='No database data provided')
+                return _json_response(400, {'error': 'No database data provided', 'job_id': job['job_id']})
+
+            chunks = [base64.b64decode(database_data)]
+            job['bytes_received'] = len(chunks[0])
+            self.sync_executor.submit(self._run_sync_job, job, chunks)
+        else:
+            # Bounded, so a fast client can't buffer the whole upload in memory
+            queue = asyncio.Queue(maxsize=UPLOAD_QUEUE_CHUNKS)
+
+            def upload_chunks():
+                while True:
+                    chunk = asyncio.run_coroutine_threadsafe(queue.get(), loop).result()
+                    if chunk is None:
+                        return
+                    if isinstance(chunk, UploadAborted):
+                        # Stops the writer before it swaps the partial upload in
+                        raise chunk
+                    yield chunk
+
+            self.sync_executor.submit(self._run_sync_job, job, upload_chunks())
+
+            more_body = True
+            while more_body:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    error = 'Client disconnected before the upload finished'
+                    logger.warning(f" Database sync job {job['job_id']} aborted after {job['bytes_received']} bytes: {error}")
+                    self._finish_sync_job(job, 'failed', error=error)
+                    await queue.put(UploadAborted(error))
+                    return _json_response(400, {'error': error, 'job_id': job['job_id']})
+                chunk = message.get('body', b'')
+                if chunk:
+                    job['bytes_received'] += len(chunk)
+                    await queue.put(chunk)
+                more_body = message.get('more_body', False)
+            await queue.put(None)
+
+        logger.info(f" Database sync job {job['job_id']} received {job['bytes_received']} bytes")
+        return _json_response(202, {
+            'success': True,
+            'message': 'Database received, system reload scheduled',
+            'bytes_received': job['bytes_received'],
+            'job_id': job['job_id']
+        })
+
+    def _run_sync_job(self, job, chunks):
+        """Swap in the uploaded database and wait for the model reload"""
+        try:
+            if job['status'] == 'failed':
+                # The upload was aborted before the job got to run
+                return
+            job['status'] = 'receiving'
+            size, rebuild = recommendation.replace_database_and_reload(chunks)
+            if size is None:
+                self._finish_sync_job(job, 'failed', error='Uploaded database failed integrity check')
+                return
+
+            job['status'] = 'reloading'
+            if rebuild.result():
+                self._finish_sync_job(job, 'done')
+            else:
+                self._finish_sync_job(job, 'failed', error='Model reload failed, previous model kept')
+
+        except UploadAborted:
+            # _sync_database already failed the job; nothing was swapped in
+            pass
+        except Exception as e:
+            logger.error(f" Database sync job {job['job_id']} failed: {e}")
+            self._finish_sync_job(job, 'failed', error=str(e))
+        finally:
+            # Consume whatever the writer did not, so the receiving side
+            # never waits on a full queue
+            try:
+                for _ in chunks:
+                    pass
+            except UploadAborted:
+                pass
+
+    def _new_sync_job(self) -> dict:
+        """Register a sync job, forgetting the oldest finished ones"""
+        job = {
+            'job_id': next(self.job_ids),
+            'status': 'queued',
+            'bytes_received': 0,
+            'started_at': time.time(),
+            'finished_at': None,
+            'model_generation': None,
+            'error': None
+        }
+        with self.sync_jobs_lock:
+            self.sync_jobs[job['job_id']] = job
+            while len(self.sync_jobs) > MAX_SYNC_JOBS:
+                self.sync_jobs.popitem(last=False)
+        return job
+
+    def _finish_sync_job(self, job, status, error=None):
+        job['error'] = error
+        job['model_generation'] = recommendation.model_generation
+        job['finished_at'] = time.time()
+        job['status'] = status
+
+    def _sync_status(self, scope):
+        """
+        GET /api/sync/database/status[?job_id=3]
+        The given sync job, or the latest one
+        """
+        job_id = parse_qs(scope.get('query_string', b'').decode('latin1')).get('job_id', [None])[0]
+        with self.sync_jobs_lock:
+            if job_id is None:
+                job = next(reversed(self.sync_jobs.values()), None)
+            else:
+                job = self.sync_jobs.get(int(job_id)) if job_id.isdigit() else None
+            job = dict(job) if job is not None else None
+
+        if job is None:
+            return _json_response(404, {'error': 'No such database sync job'})
+        return _json_response(200, {'success': True, 'job': job})
+
+
+async def _read_body(receive) -> bytes:
+    """The whole request body"""
+    parts = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        parts.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            break
+    return b''.join(parts)
+
+
+def _header(scope, name: bytes) -> str:
+    """A request header of an ASGI scope, or ''"""
+    for key, value in scope.get('headers', []):
+        if key.lower() == name:
+            return value.decode('latin1')
+    return ''
+
+
+def _json_response(status: int, payload: dict):
+    return status, [(b'content-type', b'application/json')], json.dumps(payload).encode('utf-8')
+
+
+def _call_wsgi(wsgi_app, scope, body: bytes):
+    """
+    Run one request through the Flask app, with the whole body and a
+    buffered response. Blocks; called on a worker thread except for the
+    inline routes. Returns (status, headers, body).
+    """
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for key, value in scope.get('headers', []):
+        name = key.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            name = f'HTTP_{name}'
+            environ[name] = f"{environ[name]},{value}" if name in environ else value
+
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(key.lower().encode('latin1'), value.encode('latin1')) for key, value in headers]
+
+    result = wsgi_app(environ, start_response)
+    try:
+        response_body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], response_body
+
+
+def create_asgi_app(config=None):
+    """
+    Load the model with recommendation.create_app and wrap it for ASGI.
+    Optional config keys: those of create_app, plus SCORING_WORKERS and
+    DATABASE_WORKERS (thread pool sizes).
+    """
+    config = dict(config or {})
+    wsgi_app = recommendation.create_app(config)
+    return AsyncRecommendationAPI(
+        wsgi_app,
+        scoring_workers=config.get('SCORING_WORKERS', SCORING_WORKERS),
+        database_workers=config.get('DATABASE_WORKERS', DATABASE_WORKERS)
+    )
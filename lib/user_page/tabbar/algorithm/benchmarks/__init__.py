@@ -0,0 +1 @@
+"""Benchmarks of the recommendation trainer, run from the algorithm directory"""
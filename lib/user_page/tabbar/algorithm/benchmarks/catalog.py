@@ -0,0 +1,377 @@
+"""
+Generate a synthetic component catalog
+
+Writes the eight dataset CSVs and an SQLite database with the app's
+component tables, shaped like the real catalog: the same columns, sockets
+and memory types that match across categories, GPU lengths and PSU
+wattages that overlap what cases and builds need, and the same ids used
+by both a dataset row and a database row.
+
+Usage (from the algorithm directory):
+    python -m benchmarks.catalog --rows 100000 --out /tmp/catalog
+"""
+import argparse
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+
+# Share of the catalog rows in each category
+CATEGORY_SHARES = {
+    'cpu': 0.12,
+    'gpu': 0.15,
+    'motherboard': 0.15,
+    'ram': 0.15,
+    'storage': 0.15,
+    'psu': 0.10,
+    'case': 0.10,
+    'cooling': 0.08
+}
+
+# Columns of each dataset CSV, as in datasets/
+DATASET_COLUMNS = {
+    'cpu': ['id', 'model_name', 'brand', 'socket', 'cores', 'threads', 'baseclock', 'boostclock', 'tdp',
+            'integratedgraphics', 'price'],
+    'gpu': ['id', 'model_name', 'brand', 'vram', 'core_clock', 'boostclock', 'tdp', 'length_mm', 'price'],
+    'motherboard': ['id', 'model_name', 'brand', 'socket', 'chipset', 'form_factor', 'memory_type', 'memory_slots',
+                    'max_memory', 'price'],
+    'ram': ['id', 'model_name', 'memory_type', 'capacity', 'speed', 'modules', 'price'],
+    'storage': ['id', 'model_name', 'interface', 'capacity', 'type', 'price'],
+    'psu': ['id', 'model_name', 'brand', 'wattage', 'form_factor', 'efficiency_rating', 'price'],
+    'case': ['id', 'model_name', 'brand', 'form_factor', 'max_gpu_length', 'estimated_power', 'price'],
+    'cooling': ['id', 'model_name', 'type', 'supported_sockets', 'price']
+}
+
+# Component tables of the app database (assemble_db.db)
+TABLE_SCHEMAS = {
+    'cpu': """CREATE TABLE CPUtable(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        model_name TEXT NOT NULL,
+        brand TEXT NOT NULL,
+        socket TEXT NOT NULL,
+        cores INTEGER NOT NULL,
+        threads INTEGER NOT NULL,
+        baseclock REAL NOT NULL,
+        boostclock REAL NOT NULL,
+        tdp INTEGER NOT NULL,
+        integratedgraphics INTEGER NOT NULL,
+        price INTEGER NOT NULL,
+        imageURL TEXT NOT NULL
+        )""",
+    'gpu': """CREATE TABLE GPUtable(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        model_name TEXT NOT NULL,
+        brand TEXT NOT NULL,
+        vram INTEGER NOT NULL,
+        core_clock REAL NOT NULL,
+        boostclock REAL NOT NULL,
+        tdp INTEGER NOT NULL,
+        length_mm INTEGER NOT NULL,
+        price INTEGER NOT NULL,
+        imageURL TEXT NOT NULL
+        )""",
+    'motherboard': """CREATE TABLE motherboardtable(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        model_name TEXT NOT NULL,
+        brand TEXT NOT NULL,
+        socket TEXT NOT NULL,
+        chipset TEXT NOT NULL,
+        form_factor TEXT NOT NULL,
+        memory_type TEXT NOT NULL,
+        memory_slots INTEGER NOT NULL,
+        max_memory INTEGER NOT NULL,
+        price INTEGER NOT NULL,
+        imageURL TEXT NOT NULL
+        )""",
+    'ram': """CREATE TABLE RAMtable(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        model_name TEXT NOT NULL,
+        memory_type TEXT NOT NULL,
+        capacity INTEGER NOT NULL,
+        speed INTEGER NOT NULL,
+        modules INTEGER NOT NULL,
+        price INTEGER NOT NULL,
+        imageURL TEXT NOT NULL
+        )""",
+    'storage': """CREATE TABLE storagetable(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        model_name TEXT NOT NULL,
+        interface TEXT NOT NULL,
+        capacity INTEGER NOT NULL,
+        price INTEGER NOT NULL,
+        imageURL TEXT NOT NULL
+        )""",
+    'psu': """CREATE TABLE PSUtable(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        model_name TEXT NOT NULL,
+        brand TEXT NOT NULL,
+        wattage INTEGER NOT NULL,
+        form_factor TEXT NOT NULL,
+        efficiency_rating TEXT NOT NULL,
+        price INTEGER NOT NULL,
+        imageURL TEXT NOT NULL
+        )""",
+    'case': """CREATE TABLE casetable(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        model_name TEXT NOT NULL,
+        brand TEXT NOT NULL,
+        form_factor TEXT NOT NULL,
+        max_gpu_length INTEGER NOT NULL,
+        estimated_power INTEGER NOT NULL,
+        price INTEGER NOT NULL,
+        imageURL TEXT NOT NULL
+        )""",
+    'cooling': """CREATE TABLE coolingtable(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        model_name TEXT NOT NULL,
+        type TEXT NOT NULL,
+        supported_sockets TEXT NOT NULL,
+        price INTEGER NOT NULL,
+        imageURL TEXT NOT NULL
+        )"""
+}
+
+TABLE_NAMES = {
+    'cpu': 'CPUtable',
+    'gpu': 'GPUtable',
+    'motherboard': 'motherboardtable',
+    'ram': 'RAMtable',
+    'storage': 'storagetable',
+    'psu': 'PSUtable',
+    'case': 'casetable',
+    'cooling': 'coolingtable'
+}
+
+SOCKETS = ['LGA1700', 'LGA1851', 'LGA1200', 'AM5', 'AM4']
+SOCKET_BRANDS = {'LGA1700': 'Intel', 'LGA1851': 'Intel', 'LGA1200': 'Intel', 'AM5': 'AMD', 'AM4': 'AMD'}
+SOCKET_CHIPSETS = {
+    'LGA1700': ['Z790', 'B760', 'H770', 'H610'],
+    'LGA1851': ['Z890', 'B860'],
+    'LGA1200': ['Z590', 'B560', 'H510'],
+    'AM5': ['X670E', 'B650', 'A620'],
+    'AM4': ['X570', 'B550', 'A520']
+}
+SOCKET_MEMORY = {'LGA1700': ['DDR5', 'DDR4'], 'LGA1851': ['DDR5'], 'LGA1200': ['DDR4'], 'AM5': ['DDR5'], 'AM4': ['DDR4']}
+BOARD_BRANDS = ['ASUS', 'MSI', 'Gigabyte', 'ASRock', 'Biostar']
+GPU_BRANDS = ['NVIDIA', 'AMD', 'Intel', 'ASUS', 'MSI', 'Gigabyte', 'Zotac', 'Sapphire']
+PSU_BRANDS = ['Corsair', 'Seasonic', 'EVGA', 'be quiet!', 'Cooler Master', 'ASUS', 'Thermaltake']
+CASE_BRANDS = ['Lian Li', 'NZXT', 'Fractal Design', 'Corsair', 'Phanteks', 'Cooler Master']
+FORM_FACTORS = ['ATX', 'Micro-ATX', 'Mini-ITX', 'E-ATX']
+CASE_FORM_FACTORS = ['Full Tower', 'Mid Tower', 'Mini Tower', 'Small Form Factor']
+EFFICIENCY_RATINGS = ['Bronze', 'Gold', 'Platinum', 'Titanium']
+COOLER_TYPES = ['Air Cooler', 'Liquid Cooler']
+
+def _model_names(prefix: str, brands: np.ndarray, first_id: int) -> pd.Series:
+    """Unique model names like 'ASUS Board 120'"""
+    numbers = pd.Series(np.arange(first_id, first_id + len(brands))).astype(str)
+    return pd.Series(brands) + f' {prefix} ' + numbers
+
+def _prices(rng, n_rows: int, low: int, high: int) -> np.ndarray:
+    """Prices skewed towards the cheap end, as in the real catalog"""
+    return np.round(low + (high - low) * rng.beta(2, 5, n_rows), -2).astype(int)
+
+def _per_socket(rng, sockets: np.ndarray, choices: dict) -> np.ndarray:
+    """A random pick from choices[socket] for every socket"""
+    values = np.empty(len(sockets), dtype=object)
+    for socket, options in choices.items():
+        mask = sockets == socket
+        values[mask] = rng.choice(options, int(mask.sum()))
+    return values
+
+def _cpu(rng, n_rows, first_id):
+    sockets = rng.choice(SOCKETS, n_rows)
+    brands = np.vectorize(SOCKET_BRANDS.get)(sockets)
+    cores = rng.choice([4, 6, 8, 12, 16, 20, 24], n_rows)
+    return {
+        'model_name': _model_names('Processor', brands, first_id),
+        'brand': brands,
+        'socket': sockets,
+        'cores': cores,
+        'threads': cores * rng.choice([1, 2], n_rows, p=[0.2, 0.8]),
+        'baseclock': np.round(rng.uniform(2.0, 4.5, n_rows), 1),
+        'boostclock': np.round(rng.uniform(4.0, 6.0, n_rows), 1),
+        'tdp': rng.choice([35, 65, 105, 125, 170, 253], n_rows),
+        'integratedgraphics': rng.choice([0, 1], n_rows),
+        'price': _prices(rng, n_rows, 8000, 120000)
+    }
+
+def _gpu(rng, n_rows, first_id):
+    brands = rng.choice(GPU_BRANDS, n_rows)
+    core_clock = rng.integers(1200, 2600, n_rows)
+    return {
+        'model_name': _model_names('Graphics', brands, first_id),
+        'brand': brands,
+        'vram': rng.choice([4, 6, 8, 12, 16, 20, 24], n_rows),
+        'core_clock': core_clock,
+        'boostclock': core_clock + rng.integers(100, 500, n_rows),
+        'tdp': rng.choice([75, 115, 165, 200, 220, 285, 320, 450], n_rows),
+        'length_mm': rng.integers(170, 360, n_rows),
+        'price': _prices(rng, n_rows, 15000, 320000)
+    }
+
+def _motherboard(rng, n_rows, first_id):
+    sockets = rng.choice(SOCKETS, n_rows)
+    brands = rng.choice(BOARD_BRANDS, n_rows)
+    return {
+        'model_name': _model_names('Board', brands, first_id),
+        'brand': brands,
+        'socket': sockets,
+        'chipset': _per_socket(rng, sockets, SOCKET_CHIPSETS),
+        'form_factor': rng.choice(FORM_FACTORS, n_rows, p=[0.5, 0.3, 0.15, 0.05]),
+        'memory_type': _per_socket(rng, sockets, SOCKET_MEMORY),
+        'memory_slots': rng.choice([2, 4], n_rows, p=[0.3, 0.7]),
+        'max_memory': rng.choice([64, 128, 192, 256], n_rows),
+        'price': _prices(rng, n_rows, 9000, 90000)
+    }
+
+def _ram(rng, n_rows, first_id):
+    memory_types = rng.choice(['DDR4', 'DDR5'], n_rows)
+    speeds = np.where(memory_types == 'DDR5', rng.choice([4800, 5600, 6000, 6400, 7200], n_rows),
+                      rng.choice([2666, 3000, 3200, 3600], n_rows))
+    return {
+        'model_name': _model_names('Memory', memory_types, first_id),
+        'memory_type': memory_types,
+        'capacity': rng.choice([8, 16, 32, 64, 96], n_rows),
+        'speed': speeds,
+        'modules': rng.choice([1, 2, 4], n_rows, p=[0.2, 0.7, 0.1]),
+        'price': _prices(rng, n_rows, 3000, 40000)
+    }
+
+def _storage(rng, n_rows, first_id):
+    interfaces = rng.choice(['NVMe', 'SATA'], n_rows, p=[0.7, 0.3])
+    types = np.where(rng.random(n_rows) < 0.15, 'HDD', 'SSD')
+    interfaces = np.where(types == 'HDD', 'SATA', interfaces)
+    return {
+        'model_name': _model_names('Drive', interfaces, first_id),
+        'interface': interfaces,
+        'capacity': rng.choice([250, 500, 1000, 2000, 4000, 8000], n_rows),
+        'type': types,
+        'price': _prices(rng, n_rows, 3000, 45000)
+    }
+
+def _psu(rng, n_rows, first_id):
+    brands = rng.choice(PSU_BRANDS, n_rows)
+    return {
+        'model_name': _model_names('Power', brands, first_id),
+        'brand': brands,
+        'wattage': rng.choice([450, 550, 650, 750, 850, 1000, 1200, 1600], n_rows),
+        'form_factor': rng.choice(['ATX', 'SFX'], n_rows, p=[0.85, 0.15]),
+        'efficiency_rating': rng.choice(EFFICIENCY_RATINGS, n_rows, p=[0.3, 0.45, 0.2, 0.05]),
+        'price': _prices(rng, n_rows, 4000, 45000)
+    }
+
+def _case(rng, n_rows, first_id):
+    brands = rng.choice(CASE_BRANDS, n_rows)
+    return {
+        'model_name': _model_names('Chassis', brands, first_id),
+        'brand': brands,
+        'form_factor': rng.choice(CASE_FORM_FACTORS, n_rows, p=[0.2, 0.55, 0.15, 0.1]),
+        'max_gpu_length': rng.integers(260, 460, n_rows),
+        'estimated_power': rng.choice([500, 800, 1200, 1500, 2000], n_rows),
+        'price': _prices(rng, n_rows, 4000, 30000)
+    }
+
+def _cooling(rng, n_rows, first_id):
+    types = rng.choice(COOLER_TYPES, n_rows, p=[0.6, 0.4])
+    # Each cooler fits a random non-empty subset of the sockets
+    supported = rng.random((n_rows, len(SOCKETS))) < 0.6
+    supported[np.arange(n_rows), rng.integers(0, len(SOCKETS), n_rows)] = True
+    socket_lists = pd.Series([''] * n_rows)
+    for column, socket in enumerate(sorted(SOCKETS)):
+        socket_lists = socket_lists.where(~supported[:, column], socket_lists + ',' + socket)
+    return {
+        'model_name': _model_names('Series', types, first_id),
+        'type': types,
+        'supported_sockets': socket_lists.str.lstrip(','),
+        'price': _prices(rng, n_rows, 2000, 25000)
+    }
+
+GENERATORS = {
+    'cpu': _cpu,
+    'gpu': _gpu,
+    'motherboard': _motherboard,
+    'ram': _ram,
+    'storage': _storage,
+    'psu': _psu,
+    'case': _case,
+    'cooling': _cooling
+}
+
+def category_rows(n_rows: int) -> dict:
+    """Rows of each category in a catalog of n_rows rows"""
+    counts = {category: int(n_rows * share) for category, share in CATEGORY_SHARES.items()}
+    counts['cpu'] += n_rows - sum(counts.values())
+    return counts
+
+def generate_category(category: str, n_rows: int, seed: int = 0, first_id: int = 1) -> pd.DataFrame:
+    """
+    n_rows synthetic components of a category, with every column of its
+    dataset CSV and database table
+    """
+    rng = np.random.default_rng([seed, list(GENERATORS).index(category), first_id])
+    df = pd.DataFrame(GENERATORS[category](rng, n_rows, first_id))
+    df.insert(0, 'id', np.arange(first_id, first_id + n_rows))
+    df['imageURL'] = 'https://example.com/' + category + '/' + df['id'].astype(str) + '.png'
+    return df
+
+def write_catalog(directory: str, n_rows: int, db_fraction: float = 0.1, seed: int = 0) -> dict:
+    """
+    Write a catalog of n_rows components to directory: datasets/*.csv and
+    assemble_db.db. db_fraction of each category's rows go to the
+    database, the rest to its dataset file; both number their rows from 1,
+    so ids collide between the two like in the bundled catalog.
+    Returns the paths and row counts written.
+    """
+    datasets_path = os.path.join(directory, 'datasets')
+    db_path = os.path.join(directory, 'assemble_db.db')
+    os.makedirs(datasets_path, exist_ok=True)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    
+    counts = {}
+    conn = sqlite3.connect(db_path)
+    try:
+        for category, category_total in category_rows(n_rows).items():
+            db_rows = int(round(category_total * db_fraction))
+            dataset_rows = category_total - db_rows
+            
+            dataset_df = generate_category(category, dataset_rows, seed)
+            dataset_df[DATASET_COLUMNS[category]].to_csv(
+                os.path.join(datasets_path, f'{category}_dataset.csv'), index=False)
+            
+            conn.execute(TABLE_SCHEMAS[category])
+            if db_rows:
+                # Numbered past the dataset's model names, so names stay unique
+                db_df = generate_category(category, db_rows, seed, first_id=dataset_rows + 1)
+                db_df['id'] = np.arange(1, db_rows + 1)
+                table_name = TABLE_NAMES[category]
+                columns = [col[1] for col in conn.execute(f"PRAGMA table_info({table_name})")]
+                rows = db_df[columns].astype(object).itertuples(index=False, name=None)
+                conn.executemany(
+                    f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                    rows
+                )
+            counts[category] = {'dataset': dataset_rows, 'database': db_rows}
+        conn.commit()
+    finally:
+        conn.close()
+    
+    return {'datasets_path': datasets_path, 'db_path': db_path, 'rows': counts}
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic component catalog")
+    parser.add_argument('--rows', type=int, default=10000, help="components across all eight categories")
+    parser.add_argument('--out', required=True, help="directory to write datasets/ and assemble_db.db to")
+    parser.add_argument('--db-fraction', type=float, default=0.1, help="share of each category stored in the database")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    
+    catalog = write_catalog(args.out, args.rows, args.db_fraction, args.seed)
+    for category, counts in catalog['rows'].items():
+        print(f"{category:12} {counts['dataset']:>9} dataset  {counts['database']:>8} database")
+    print(f"datasets:    {catalog['datasets_path']}")
+    print(f"database:    {catalog['db_path']}")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
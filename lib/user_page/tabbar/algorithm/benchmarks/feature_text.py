@@ -0,0 +1,78 @@
+"""
+Benchmark feature text construction
+
+Times the column-wise PCRecommendationTrainer._create_feature_text against
+the row-wise builder it replaced on a synthetic frame shaped like the CPU
+table, and checks both produce the same text.
+
+Usage (from the algorithm directory):
+    python -m benchmarks.feature_text --rows 1000000
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from train_recommendation_model import PCRecommendationTrainer
+
+def row_wise_feature_text(df: pd.DataFrame, features: list) -> pd.Series:
+    """The previous row-by-row implementation of _create_feature_text"""
+    def create_text(row):
+        text_parts = []
+        for feature in features:
+            if feature in row and pd.notna(row[feature]):
+                value = str(row[feature]).lower().replace('_', ' ')
+                text_parts.append(f"{feature} {value}")
+        return " ".join(text_parts)
+    
+    return df.apply(create_text, axis=1)
+
+def synthetic_cpu_frame(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """CPU-like components with the missing values of a merged catalog"""
+    rng = np.random.default_rng(seed)
+    cores = rng.choice([4, 6, 8, 12, 16, 24], n_rows)
+    df = pd.DataFrame({
+        'id': np.arange(1, n_rows + 1),
+        'model_name': 'CPU ' + pd.Series(np.arange(n_rows)).astype(str),
+        'brand': rng.choice(['Intel', 'AMD'], n_rows),
+        'socket': rng.choice(['LGA1700', 'AM5', 'AM4', 'LGA1200', 'sTR5'], n_rows),
+        'cores': cores.astype(float),
+        'threads': (cores * rng.choice([1, 2], n_rows)).astype(float),
+        'baseclock': np.round(rng.uniform(2.0, 4.5, n_rows), 1),
+        'boostclock': np.round(rng.uniform(4.0, 6.0, n_rows), 1),
+        'tdp': rng.choice([35, 65, 105, 125, 170], n_rows).astype(float),
+        'integratedgraphics': rng.choice([0.0, 1.0], n_rows),
+        'price': np.round(rng.uniform(10000, 150000, n_rows))
+    })
+    for column in ('socket', 'boostclock', 'integratedgraphics'):
+        df.loc[rng.random(n_rows) < 0.1, column] = np.nan
+    df['category'] = 'cpu'
+    return df
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark feature text construction")
+    parser.add_argument('--rows', type=int, default=1000000, help="rows in the synthetic frame")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    
+    trainer = PCRecommendationTrainer()
+    features = trainer.category_features['cpu']
+    df = synthetic_cpu_frame(args.rows, args.seed)
+    
+    start = time.perf_counter()
+    column_wise = trainer._create_feature_text(df, features)
+    column_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    row_wise = row_wise_feature_text(df, features)
+    row_seconds = time.perf_counter() - start
+    
+    identical = column_wise.tolist() == row_wise.tolist()
+    print(f"rows:        {args.rows}")
+    print(f"row-wise:    {row_seconds:.2f}s")
+    print(f"column-wise: {column_seconds:.2f}s")
+    print(f"speedup:     {row_seconds / column_seconds:.1f}x")
+    print(f"identical:   {identical}")
+    return 0 if identical else 1
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,256 @@
+"""
+Scaling benchmark of the trainer and the API
+
+For every catalog size, generates a synthetic catalog (see
+benchmarks.catalog), times each trainer stage on it and measures request
+latency of /similar and /compatible through the Flask test client.
+Results are written as JSON; pass an earlier result file to --compare to
+see how a revision moved each number.
+
+Usage (from the algorithm directory):
+    python -m benchmarks.scaling --rows 10000 100000 1000000 --output bench.json
+    python -m benchmarks.scaling --rows 10000 --compare bench.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from benchmarks.catalog import write_catalog
+from train_recommendation_model import PCRecommendationTrainer
+
+PERCENTILES = (50, 90, 95, 99)
+
+def _timed(stages: dict, name: str, function, *args):
+    """Call function(*args), recording its wall time in seconds under name"""
+    start = time.perf_counter()
+    result = function(*args)
+    stages[name] = round(time.perf_counter() - start, 4)
+    return result
+
+def _peak_rss_mb() -> float:
+    """Peak resident memory of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def benchmark_trainer(catalog: dict, model_path: str) -> dict:
+    """Wall time of each training stage, and of loading the saved model"""
+    stages = {}
+    trainer = PCRecommendationTrainer(db_path=catalog['db_path'], datasets_path=catalog['datasets_path'])
+    components_df = _timed(stages, 'load_and_combine_datasets', trainer.load_and_combine_datasets)
+    _timed(stages, 'train_model', trainer.train_model, components_df)
+    _timed(stages, 'calculate_similarity_matrix', trainer.calculate_similarity_matrix)
+    _timed(stages, 'save_model', trainer.save_model, model_path)
+    
+    loaded = PCRecommendationTrainer(db_path=catalog['db_path'], datasets_path=catalog['datasets_path'])
+    _timed(stages, 'load_model', loaded.load_model, model_path)
+    
+    return {
+        'components': len(components_df),
+        'features': int(trainer.tfidf_matrix.shape[1]),
+        'neighbor_edges': sum(len(graph['indices']) for graph in trainer.neighbor_graph.values()),
+        'stages': stages,
+        'peak_rss_mb': _peak_rss_mb()
+    }
+
+def _latency_summary(latencies: list, errors: int) -> dict:
+    """Percentiles of request latencies in milliseconds"""
+    summary = {'requests': len(latencies), 'errors': errors}
+    if latencies:
+        values = np.array(latencies) * 1000
+        for percentile in PERCENTILES:
+            summary[f'p{percentile}_ms'] = round(float(np.percentile(values, percentile)), 3)
+        summary['mean_ms'] = round(float(values.mean()), 3)
+        summary['max_ms'] = round(float(values.max()), 3)
+    return summary
+
+def _measure(client, path: str, payloads: list, warmup: int) -> dict:
+    """POST every payload to path, timing the requests after the first `warmup`"""
+    latencies = []
+    errors = 0
+    for number, payload in enumerate(payloads):
+        start = time.perf_counter()
+        response = client.post(path, json=payload)
+        elapsed = time.perf_counter() - start
+        if number < warmup:
+            continue
+        if response.status_code == 200:
+            latencies.append(elapsed)
+        else:
+            errors += 1
+    return _latency_summary(latencies, errors)
+
+def benchmark_api(catalog: dict, model_path: str, requests: int, warmup: int, cache: bool, seed: int) -> dict:
+    """
+    Latency of /similar and /compatible, regular and strict, for random
+    components of the catalog. The result cache is off unless `cache`,
+    so every request is scored.
+    """
+    import recommendation
+    
+    app = recommendation.create_app({
+        'DB_PATH': catalog['db_path'],
+        'MODEL_PATH': model_path,
+        'DATASETS_PATH': catalog['datasets_path'],
+        'RESULT_CACHE_SIZE': recommendation.RESULT_CACHE_SIZE if cache else 0
+    })
+    client = app.test_client()
+    
+    components = recommendation.trainer.components_df
+    rng = np.random.default_rng(seed)
+    samples = components.iloc[rng.integers(0, len(components), warmup + requests)]
+    
+    in_database = components[components['in_database'] == True]
+    cpu_ids = in_database.loc[in_database['category'] == 'cpu', 'id'].to_numpy()
+    motherboard_ids = in_database.loc[in_database['category'] == 'motherboard', 'id'].to_numpy()
+    targets = ['gpu', 'ram', 'storage', 'psu', 'case', 'cooling']
+    
+    results = {'similar': {}, 'compatible': {}}
+    for mode, strict in (('regular', False), ('strict', True)):
+        similar = [
+            {'component_id': int(component_id), 'category': category, 'n_recommendations': 5, 'strict': strict}
+            for component_id, category in zip(samples['id'], samples['category'])
+        ]
+        results['similar'][mode] = _measure(client, '/similar', similar, warmup)
+        
+        compatible = [
+            {
+                'current_build': {'cpu': int(rng.choice(cpu_ids)), 'motherboard': int(rng.choice(motherboard_ids))},
+                'target_category': str(rng.choice(targets)),
+                'n_recommendations': 5,
+                'strict': strict
+            }
+            for _ in range(warmup + requests)
+        ]
+        results['compatible'][mode] = _measure(client, '/compatible', compatible, warmup)
+    
+    return results
+
+def _revision() -> str:
+    """Short git revision of the working tree, if it is a checkout"""
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return revision.stdout.strip() or None
+
+def _flatten(result: dict, prefix: str = '') -> dict:
+    """Nested numbers of a result as {'a.b.c': value}"""
+    flat = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+def compare(baseline: dict, current: dict, tolerance: float) -> list:
+    """
+    Print the stage times and latencies of current next to baseline, for
+    the catalog sizes both have. Returns the metrics that got slower by
+    more than `tolerance` (a fraction).
+    """
+    regressions = []
+    baseline_runs = {run['rows']: run for run in baseline['runs']}
+    for run in current['runs']:
+        previous = baseline_runs.get(run['rows'])
+        if previous is None:
+            continue
+        print(f"\n{run['rows']} rows ({baseline.get('revision')} -> {current.get('revision')})", file=sys.stderr)
+        before, after = _flatten(previous), _flatten(run)
+        for metric in after:
+            # Compare times only: stage seconds and latency percentiles
+            # (the maximum is a single request, too noisy to compare)
+            is_time = metric.startswith('trainer.stages.') or (metric.endswith('_ms') and not metric.endswith('max_ms'))
+            if metric not in before or not is_time:
+                continue
+            old, new = before[metric], after[metric]
+            change = (new - old) / old if old else 0.0
+            flag = ''
+            if change > tolerance:
+                flag = '  REGRESSION'
+                regressions.append(f"{run['rows']} rows: {metric}")
+            print(f"  {metric:45} {old:>10.4f} -> {new:>10.4f}  {change:+7.1%}{flag}", file=sys.stderr)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling benchmark of the trainer and the API")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000],
+                        help="catalog sizes to run, e.g. 10000 100000 1000000")
+    parser.add_argument('--requests', type=int, default=200, help="timed requests per endpoint and mode")
+    parser.add_argument('--warmup', type=int, default=10, help="untimed requests before those")
+    parser.add_argument('--db-fraction', type=float, default=0.1, help="share of each category stored in the database")
+    parser.add_argument('--cache', action='store_true', help="keep the result cache on while measuring the API")
+    parser.add_argument('--skip-api', action='store_true', help="only time the trainer stages")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', help="where catalogs and models are written (default: a temporary directory)")
+    parser.add_argument('--output', help="write the JSON results to this file instead of stdout")
+    parser.add_argument('--compare', metavar='BASELINE', help="JSON results of an earlier run to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="slowdown against the baseline that counts as a regression (default: 0.2 = 20%%)")
+    parser.add_argument('--verbose', action='store_true', help="keep the trainer's INFO logging")
+    args = parser.parse_args()
+    
+    if not args.verbose:
+        logging.disable(logging.INFO)
+    
+    workdir = args.workdir or tempfile.mkdtemp(prefix='recommendation-bench-')
+    result = {
+        'revision': _revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'settings': {key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'workdir')},
+        'runs': []
+    }
+    
+    try:
+        for rows in args.rows:
+            run_dir = os.path.join(workdir, f'rows-{rows}')
+            model_path = os.path.join(run_dir, 'trained_recommendation_model')
+            print(f"Benchmarking {rows} rows in {run_dir}", file=sys.stderr)
+            
+            start = time.perf_counter()
+            catalog = write_catalog(run_dir, rows, args.db_fraction, args.seed)
+            run = {
+                'rows': rows,
+                'catalog_seconds': round(time.perf_counter() - start, 4),
+                'trainer': benchmark_trainer(catalog, model_path)
+            }
+            if not args.skip_api:
+                run['api'] = benchmark_api(catalog, model_path, args.requests, args.warmup, args.cache, args.seed)
+            result['runs'].append(run)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, result, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regressions past {args.tolerance:.0%}:", file=sys.stderr)
+            for regression in regressions:
+                print(f"  {regression}", file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,518 @@
+import bisect
+import heapq
+import math
+import threading
+import time
+import weakref
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from compatibility_graph import CATEGORY_COLUMNS, DIRECTIONS
+from profiling import profiled
+
+# Share of the budget each category is aimed at, and of a build's score
+DEFAULT_WEIGHTS = {
+    'gpu': 0.30,
+    'cpu': 0.22,
+    'motherboard': 0.12,
+    'ram': 0.10,
+    'storage': 0.08,
+    'psu': 0.08,
+    'case': 0.05,
+    'cooling': 0.05
+}
+
+OVERSPEND_RATE = 0.25  # score per rupee past a category's share, relative to the rate up to it
+MAX_BUDGET_STEPS = 2048  # budget steps of the bound table
+SCORE_EPSILON = 1e-12
+
+# Prepared candidates of each model snapshot, by strict mode
+_prepared_candidates = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+
+
+class _Level:
+    """Candidates of one category, most expensive first"""
+    
+    __slots__ = ('category', 'rows', 'prices', 'price_array', 'values', 'value_array', 'local', 'groups',
+                 'group_parts', 'target', 'rate', 'min_price', 'max_price', 'checks')
+    
+    def __init__(self, category: str, rows: list, prices: list, local: np.ndarray, groups: np.ndarray,
+                 group_parts: list, weight: float, target: float):
+        self.category = category
+        self.rows = rows
+        self.prices = prices
+        self.price_array = np.asarray(prices, dtype=float)
+        # Score per rupee up to the category's share of the budget;
+        # OVERSPEND_RATE of it past the share
+        self.target = target
+        self.rate = weight / target if target > 0 else 0.0
+        self.value_array = self.value(self.price_array)
+        self.values = self.value_array.tolist()
+        # Positions of the candidates among the parts of the compatibility graph
+        self.local = local
+        # Parts with the same rule values pass the same rules; groups[i] is
+        # the group of candidate i and group_parts the rule values of each
+        self.groups = groups
+        self.group_parts = group_parts
+        self.min_price = min(prices) if prices else 0.0
+        self.max_price = max(prices) if prices else 0.0
+        self.checks = []  # earlier levels a compatibility rule relates this one to
+    
+    def value(self, prices):
+        """Score of parts of the given prices"""
+        return self.rate * (np.minimum(prices, self.target) + OVERSPEND_RATE * np.maximum(prices - self.target, 0.0))
+    
+    def segments(self, low: float, high: float) -> list:
+        """(score per rupee, rupees) of raising a part's price from low to high"""
+        below = max(min(high, self.target) - low, 0.0)
+        return [(self.rate, below), (self.rate * OVERSPEND_RATE, high - low - below)]
+
+
+class BuildOptimizer:
+    """
+    Branch-and-bound search for the best complete builds, one part of every
+    category, within a budget.
+    
+    Each category is aimed at its weight's share of the budget. A part
+    scores its category's weight in proportion to how much of that share
+    it spends, and only OVERSPEND_RATE of that rate for spending past it,
+    so a build that spends every category's share exactly scores the sum of
+    the weights, 1.0 with the defaults. A rupee is worth the same in every
+    category up to its share: a larger budget goes first to the categories
+    with the largest shares (the GPU and CPU), not to whichever category
+    has the cheapest top part.
+    
+    Parts that break a rule of the compatibility graph against each other
+    never share a build; as everywhere the graph is read, a part missing a
+    value a rule compares passes that rule against nothing. The scorer's
+    storage and cooler fit checks are bonuses, not rules, and don't
+    constrain builds.
+    
+    Categories with the most rules are searched first, each from its most
+    expensive candidate down. A branch is cut when the parts chosen so far
+    break a rule, or when the remaining categories cannot lift the score
+    past the N-th best build found, by the lower of two bounds:
+    
+    - a table of the best score of the remaining categories at every
+      budget step, ignoring the rules, computed once per search. The step
+      is the largest that divides every price when the budget has few
+      enough of them, so the table is exact; otherwise prices are rounded
+      down to the step, so it never underestimates.
+    - the fractional bound (the LP relaxation) over the prices the rules
+      leave each remaining category against the parts chosen so far, so
+      choosing a socket caps what the CPU and cooler can still add.
+    
+    Candidates come most expensive first, so the fractional bound of a
+    category priced anywhere up to the current candidate covers all that
+    are left; once it fails the category is done.
+    """
+    
+    def __init__(self, trainer, weights: Optional[Dict[str, float]] = None):
+        self.trainer = trainer
+        self.weights = dict(DEFAULT_WEIGHTS)
+        if weights:
+            self.weights.update(weights)
+    
+    def optimize(self, budget: float, n_builds: int = 3, pinned: Optional[dict] = None, strict: bool = False,
+                 deadline: float = 1.0) -> dict:
+        """
+        The n_builds best builds costing at most budget. `pinned` fixes
+        parts as {category: component id}; they count against the budget
+        whether or not they are in stock. With strict only parts in the
+        database are chosen. The search stops after deadline seconds and
+        returns the best builds found by then.
+        """
+        started = time.perf_counter()
+        pinned = pinned or {}
+        for category in pinned:
+            if category not in self.trainer.table_mapping:
+                raise ValueError(f"Unknown category: {category}")
+        
+        levels = self._levels(budget, n_builds, pinned, strict)
+        candidates = {level.category: len(level.rows) for level in levels}
+        search = {'nodes': 0, 'exhaustive': True}
+        builds = []
+        if all(level.rows for level in levels) and sum(level.min_price for level in levels) <= budget:
+            builds = self._search(levels, budget, n_builds, started + deadline, search)
+        
+        return {
+            'builds': [self._describe(levels, score, picks, budget, pinned) for score, picks in builds],
+            'search': {
+                'exhaustive': search['exhaustive'],
+                'nodes': search['nodes'],
+                'candidates': candidates,
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 3)
+            }
+        }
+    
+    @profiled('optimizer_candidates')
+    def _levels(self, budget: float, n_builds: int, pinned: dict, strict: bool) -> List[_Level]:
+        """Candidates of every category within the budget, in search order"""
+        prepared = dict(self._prepared(strict))
+        for category, component_id in pinned.items():
+            position = self.trainer._lookup_row(category, component_id)
+            if position is None:
+                raise ValueError(f"Pinned {category} {component_id} not found")
+            frame = self.trainer.components_df.iloc[[position]]
+            pinned_candidates = self._prepare(category, frame, False)
+            if not len(pinned_candidates['rows']):
+                raise ValueError(f"Pinned {category} {component_id} has no price")
+            prepared[category] = pinned_candidates
+        
+        # Only parts compatible with the pinned ones can be in a build
+        for category in pinned:
+            for other in prepared:
+                if (other, category) in DIRECTIONS:
+                    prepared[other] = self._select(prepared[other],
+                                                   self._compatible(other, prepared[other], category, prepared[category]))
+        
+        # Every other category needs at least its cheapest part
+        cheapest = {category: candidates['prices'].min() if len(candidates['prices']) else 0.0
+                    for category, candidates in prepared.items()}
+        reserved = sum(cheapest.values())
+        
+        total_weight = sum(self.weights.get(category, 0.0) for category in prepared)
+        levels = []
+        for category, candidates in prepared.items():
+            # Parts of equal price that the rules can't tell apart make
+            # equally good builds; more than n_builds of them never rank
+            keep = np.flatnonzero((candidates['prices'] <= budget - (reserved - cheapest[category]))
+                                  & (candidates['ranks'] < n_builds))
+            weight = self.weights.get(category, 0.0)
+            target = budget * weight / total_weight if total_weight > 0 else 0.0
+            levels.append(_Level(category, candidates['rows'][keep].tolist(), candidates['prices'][keep].tolist(),
+                                 candidates['local'][keep], candidates['groups'][keep], candidates['group_parts'],
+                                 weight, target))
+        
+        # Pinned parts first, then the categories with the most rules, then
+        # by share of the budget; see the class docstring
+        n_rules = {category: sum(first == category for first, _ in DIRECTIONS) for category in prepared}
+        levels.sort(key=lambda level: (level.category not in pinned, -n_rules[level.category], -level.target))
+        for position, level in enumerate(levels):
+            level.checks = [earlier for earlier in range(position) if (level.category, levels[earlier].category) in DIRECTIONS]
+        return levels
+    
+    def _prepared(self, strict: bool) -> Dict[str, dict]:
+        """
+        Candidates of every category, prepared once per model snapshot and
+        mode; a published snapshot's catalog never changes
+        """
+        trainer = self.trainer
+        with _prepared_lock:
+            by_mode = _prepared_candidates.setdefault(trainer, {})
+            prepared = by_mode.get(strict)
+        if prepared is None:
+            prepared = {}
+            for category in trainer.table_mapping:
+                # Only the columns the search reads
+                columns = [column for column in ['id', 'price', 'in_database'] if column in trainer.components_df.columns]
+                frame = trainer.components_df[columns].iloc[trainer._category_rows(category)]
+                prepared[category] = self._prepare(category, frame, strict)
+            
+            # A part no candidate of a related category is compatible with
+            # is in no build
+            keep = {category: np.ones(len(candidates['rows']), dtype=bool) for category, candidates in prepared.items()}
+            for category, other in DIRECTIONS:
+                if category in prepared and other in prepared:
+                    keep[category] &= self._compatible(category, prepared[category], other, prepared[other])
+            prepared = {category: self._select(candidates, keep[category]) for category, candidates in prepared.items()}
+            with _prepared_lock:
+                by_mode[strict] = prepared
+        return prepared
+    
+    def _prepare(self, category: str, frame: pd.DataFrame, strict: bool) -> dict:
+        """
+        Priced parts of a category frame, most expensive first and in-stock
+        parts before others of a price, as arrays: row positions, positions
+        in the compatibility graph, prices, groups of equal rule values and
+        ranks among parts of the same price and group
+        """
+        in_stock = self._in_stock(category, frame)
+        frame = frame.assign(price=pd.to_numeric(frame['price'], errors='coerce').astype(float), _in_stock=in_stock,
+                             _row=self._row_positions(frame))
+        frame = frame[frame['price'].notna() & (frame['price'] > 0)]
+        if strict:
+            frame = frame[frame['_in_stock']]
+        # A part in both the database and the datasets is one candidate, its database row
+        if 'in_database' in frame.columns:
+            database_first = frame['in_database'].fillna(False).astype(bool).to_numpy()
+            frame = frame.iloc[np.argsort(~database_first, kind='stable')]
+        frame = frame.drop_duplicates('id')
+        frame = frame.sort_values(['price', '_in_stock', 'id'], ascending=[False, False, True], kind='stable')
+        
+        rows = frame['_row'].to_numpy()
+        local = np.searchsorted(self.trainer._category_rows(category), rows)
+        groups = self.trainer._compatibility().groups(category, local)
+        group_rows = np.empty(groups.max() + 1 if len(groups) else 0, dtype=np.int64)
+        group_rows[groups] = rows
+        group_parts = self._rule_values(category, group_rows)
+        ranks = pd.DataFrame({'price': frame['price'].to_numpy(), 'group': groups}).groupby(['price', 'group'], sort=False).cumcount()
+        return {
+            'rows': rows,
+            'local': local,
+            'prices': frame['price'].to_numpy(),
+            'ranks': ranks.to_numpy(),
+            'groups': groups,
+            'group_parts': group_parts
+        }
+    
+    def _compatible(self, category: str, candidates: dict, other: str, other_candidates: dict) -> np.ndarray:
+        """Which candidates of a category the graph allows with at least one candidate of another"""
+        graph = self.trainer._compatibility()
+        bits = 0
+        for group in np.unique(other_candidates['groups']).tolist():
+            bits |= graph.compatible_with(category, other, other_candidates['group_parts'][group])
+        return graph.mask(category, bits)[candidates['local']]
+    
+    @staticmethod
+    def _select(candidates: dict, keep: np.ndarray) -> dict:
+        """Prepared candidates narrowed to a mask; compatibility keeps or drops whole groups, so ranks hold"""
+        selected = dict(candidates)
+        for key in ('rows', 'local', 'prices', 'ranks', 'groups'):
+            selected[key] = candidates[key][keep]
+        return selected
+    
+    def _rule_values(self, category: str, rows: np.ndarray) -> List[dict]:
+        """The rule columns of some rows of a category, as compatible_with reads them"""
+        components_df = self.trainer.components_df
+        columns = [column for column in CATEGORY_COLUMNS.get(category, []) if column in components_df.columns]
+        values = [components_df[column].to_numpy()[rows] for column in columns]
+        return [dict(zip(columns, row_values)) for row_values in zip(*values)] if columns else [{} for _ in rows]
+    
+    def _row_positions(self, frame: pd.DataFrame) -> np.ndarray:
+        """Positions in components_df of the rows of a frame taken from it"""
+        return self.trainer.components_df.index.get_indexer(frame.index)
+    
+    def _in_stock(self, category: str, frame: pd.DataFrame) -> np.ndarray:
+        trainer = self.trainer
+        if trainer.availability_index is None:
+            trainer.load_availability_index()
+        ids = pd.to_numeric(frame['id'], errors='coerce')
+        return ids.isin(trainer.availability_index.get(category, set())).to_numpy()
+    
+    @profiled('optimizer_search')
+    def _search(self, levels: List[_Level], budget: float, n_builds: int, deadline: float, stats: dict) -> list:
+        """Depth-first branch and bound; (score, picks) of the best builds, best first"""
+        n_levels = len(levels)
+        # The cheapest parts of levels k.. cost need[k]
+        need = [0.0] * (n_levels + 1)
+        for k in range(n_levels - 1, -1, -1):
+            need[k] = need[k + 1] + levels[k].min_price
+        
+        plans = {}
+        
+        def fractional_bound(k: int, remaining: float, price_range) -> float:
+            """
+            Best score levels k.. can add with `remaining` to spend when each
+            can cost anything in its price range, spending past the cheapest
+            on the best score per rupee first; -inf when nothing fits. Each
+            level's score is concave in price, so this is exact for the
+            relaxation.
+            """
+            ranges = tuple(price_range(position) for position in range(k, n_levels))
+            if None in ranges:
+                return -np.inf
+            plan = plans.get((k, ranges))
+            if plan is None:
+                # Upgrades by score per rupee, with running rupees and score
+                upgrades = []
+                base = 0.0
+                for position, (low, high) in zip(range(k, n_levels), ranges):
+                    base += sum(rate * rupees for rate, rupees in levels[position].segments(0.0, low))
+                    upgrades.extend(upgrade for upgrade in levels[position].segments(low, high) if upgrade[1] > 0)
+                upgrades.sort(reverse=True)
+                spent, gained = [0.0], [0.0]
+                for rate, rupees in upgrades:
+                    spent.append(spent[-1] + rupees)
+                    gained.append(gained[-1] + rate * rupees)
+                plan = plans[(k, ranges)] = (sum(low for low, _ in ranges), base, upgrades, spent, gained)
+            low_total, base, upgrades, spent, gained = plan
+            extra = remaining - low_total
+            if extra < 0:
+                return -np.inf
+            done = bisect.bisect_right(spent, extra) - 1
+            bound = base + gained[done]
+            if done < len(upgrades):
+                bound += upgrades[done][0] * (extra - spent[done])
+            return bound
+        
+        def full_range(position: int) -> tuple:
+            return levels[position].min_price, levels[position].max_price
+        
+        def rest_bound(k: int, remaining: float, price: float) -> float:
+            """
+            Fractional bound of levels k.. with level k's price anywhere up to
+            `price`: it holds for every candidate of level k from that price
+            down, so once it fails the level is done
+            """
+            return fractional_bound(k, remaining, lambda position: (levels[k].min_price, price) if position == k
+                                    else full_range(position))
+        
+        graph = self.trainer._compatibility()
+        masks = {}
+        
+        def compatible(position: int, other: int) -> np.ndarray:
+            """Which candidates of a level the graph allows with the part chosen at an earlier level"""
+            group = levels[other].groups[picks[other]]
+            key = (position, other, group)
+            if key not in masks:
+                level = levels[position]
+                bits = graph.compatible_with(level.category, levels[other].category, levels[other].group_parts[group])
+                masks[key] = graph.mask(level.category, bits)[level.local]
+            return masks[key]
+        
+        def passing(position: int, k: int) -> Optional[np.ndarray]:
+            """Candidates of a level that pass its rules against the parts chosen down to k; None when no rule applies"""
+            checks = [other for other in levels[position].checks if other <= k]
+            if not checks:
+                return None
+            return np.logical_and.reduce([compatible(position, other) for other in checks])
+        
+        ranges = {}
+        
+        def rule_range(position: int, k: int):
+            """
+            (cheapest, dearest) candidate of a level below k that passes the
+            rules against the parts chosen down to k, None when none does
+            """
+            level = levels[position]
+            checks = [other for other in level.checks if other <= k]
+            if not checks:
+                return level.min_price, level.max_price
+            key = (position,) + tuple(levels[other].groups[picks[other]] for other in checks)
+            if key not in ranges:
+                prices = level.price_array[passing(position, k)]
+                ranges[key] = (prices.min(), prices.max()) if len(prices) else None
+            return ranges[key]
+        
+        unit = self._budget_unit(levels, budget)
+        n_steps = int(budget / unit + 1e-9)
+        tables = self._bound_tables(levels, unit, n_steps)
+        
+        best = []  # min-heap of (score, -found order, picks)
+        picks = [0] * n_levels
+        found = 0
+        
+        def visit(k: int, remaining: float, score: float) -> bool:
+            """Search levels k.. ; False once the deadline passed"""
+            nonlocal found
+            stats['nodes'] += 1
+            if time.perf_counter() > deadline:
+                stats['exhaustive'] = False
+                return False
+            if k == n_levels:
+                if len(best) < n_builds:
+                    heapq.heappush(best, (score, -found, tuple(picks)))
+                elif score > best[0][0] + SCORE_EPSILON:
+                    heapq.heapreplace(best, (score, -found, tuple(picks)))
+                found += 1
+                return True
+            
+            # Bound every candidate by the table at once; the survivors are
+            # checked again as better builds raise the bar
+            level = levels[k]
+            left = remaining - level.price_array
+            bounds = level.value_array + tables[k + 1][np.clip((left / unit + 1e-9).astype(np.int64), 0, n_steps)]
+            bar = best[0][0] + SCORE_EPSILON - score if len(best) == n_builds else -np.inf
+            selected = (left >= need[k + 1]) & (bounds > bar)
+            passes = passing(k, k - 1)
+            if passes is not None:
+                selected &= passes
+            for index in np.flatnonzero(selected).tolist():
+                price = level.prices[index]
+                value = level.values[index]
+                threshold = best[0][0] + SCORE_EPSILON - score - value if len(best) == n_builds else -np.inf
+                if bounds[index] - value <= threshold:
+                    if len(best) == n_builds and rest_bound(k, remaining, price) <= threshold + value:
+                        break
+                    continue
+                picks[k] = index
+                if fractional_bound(k + 1, remaining - price, lambda position: rule_range(position, k)) <= threshold:
+                    if len(best) == n_builds and rest_bound(k, remaining, price) <= threshold + value:
+                        break
+                    continue
+                if not visit(k + 1, remaining - price, score + value):
+                    return False
+            return True
+        
+        visit(0, budget, 0.0)
+        return [(score, picks) for score, _, picks in sorted(best, reverse=True)]
+    
+    @staticmethod
+    def _budget_unit(levels: List[_Level], budget: float) -> float:
+        """
+        Budget step of the bound table: the greatest common divisor of the
+        prices when they are whole and the budget has at most
+        MAX_BUDGET_STEPS of it, else a multiple of it that fits
+        """
+        prices = np.concatenate([level.price_array for level in levels])
+        if len(prices) and np.all(prices == np.round(prices)):
+            divisor = float(np.gcd.reduce(prices.astype(np.int64)))
+        else:
+            divisor = budget / MAX_BUDGET_STEPS
+        return divisor * max(1, math.ceil(budget / (divisor * MAX_BUDGET_STEPS)))
+    
+    @staticmethod
+    def _bound_tables(levels: List[_Level], unit: float, n_steps: int) -> List[np.ndarray]:
+        """
+        tables[k][step]: the best score of one part from each of levels k..
+        costing at most step * unit (-inf when nothing fits), ignoring the
+        rules. Prices are rounded down to whole steps.
+        """
+        steps = np.arange(n_steps + 1)
+        tables = [None] * (len(levels) + 1)
+        tables[-1] = np.zeros(n_steps + 1)
+        for k in range(len(levels) - 1, -1, -1):
+            level = levels[k]
+            cells = np.floor(level.price_array / unit + 1e-9).astype(np.int64)
+            values = np.asarray(level.values, dtype=float)
+            keep = cells <= n_steps
+            cells, values = cells[keep], values[keep]
+            if len(cells) == 0:
+                tables[k] = np.full(n_steps + 1, -np.inf)
+                continue
+            # Only the best part of each step matters
+            order = np.lexsort((-values, cells))
+            cells, values = cells[order], values[order]
+            first = np.r_[True, cells[1:] != cells[:-1]]
+            cells, values = cells[first], values[first]
+            rest = steps[None, :] - cells[:, None]
+            candidates = np.where(rest >= 0, values[:, None] + tables[k + 1][np.maximum(rest, 0)], -np.inf)
+            tables[k] = candidates.max(axis=0)
+        return tables
+    
+    def _describe(self, levels: List[_Level], score: float, picks: tuple, budget: float, pinned: dict) -> dict:
+        """Response entry of one build"""
+        trainer = self.trainer
+        chosen = {level.category: (level.rows[index], level.prices[index]) for level, index in zip(levels, picks)}
+        build_parts = {category: trainer.components_df.iloc[chosen[category][0]] for category in trainer.table_mapping}
+        build = {category: int(part['id']) for category, part in build_parts.items()}
+        total_price = sum(price for _, price in chosen.values())
+        
+        components = {}
+        for category in trainer.table_mapping:
+            component = build_parts[category]
+            in_database = trainer.check_component_in_database(build[category], category)
+            components[category] = {
+                'id': build[category],
+                'model_name': trainer._text(component, 'model_name'),
+                'category': category,
+                'price': int(chosen[category][1]),
+                'brand': trainer._text(component, 'brand'),
+                'in_database': in_database,
+                'availability_status': 'Available in store' if in_database else 'Reference only - Not in database',
+                'pinned': category in pinned,
+                'compatibility_notes': trainer._generate_compatibility_notes(component, build, build_parts)
+            }
+        
+        return {
+            'score': round(float(score), 4),
+            'total_price': int(total_price),
+            'remaining_budget': int(budget - total_price),
+            'all_in_database': all(component['in_database'] for component in components.values()),
+            'build': build,
+            'components': components
+        }
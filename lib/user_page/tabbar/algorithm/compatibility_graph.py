@@ -0,0 +1,258 @@
+import math
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def _same_value(value, other) -> bool:
+    return value == other
+
+
+def _supports_socket(supported_sockets, socket) -> bool:
+    """A cooler lists the CPU's socket among its supported sockets"""
+    return isinstance(supported_sockets, str) and isinstance(socket, str) and bool(socket) and socket in supported_sockets
+
+
+def _fits_length(length_mm, max_gpu_length) -> bool:
+    return max_gpu_length >= length_mm
+
+
+def _has_headroom(tdp, wattage) -> bool:
+    """The PSU has 100W of headroom over the GPU's TDP"""
+    return wattage >= tdp + 100
+
+
+# Cross-category rules, the ones PCRecommendationTrainer scores builds
+# with: a part of the first category is compatible with a part of the
+# second when rule(its column value, the other part's column value). A
+# part missing either value is compatible with nothing.
+RELATIONS = [
+    ('cpu', 'socket', 'motherboard', 'socket', _same_value),
+    ('ram', 'memory_type', 'motherboard', 'memory_type', _same_value),
+    ('cooling', 'supported_sockets', 'cpu', 'socket', _supports_socket),
+    ('gpu', 'length_mm', 'case', 'max_gpu_length', _fits_length),
+    ('gpu', 'tdp', 'psu', 'wattage', _has_headroom)
+]
+
+NUMERIC_COLUMNS = {'length_mm', 'tdp', 'max_gpu_length', 'wattage'}
+
+# Value of every part of a category whose frame lacks the column
+MISSING_COLUMN_DEFAULTS = {('gpu', 'length_mm'): 0, ('gpu', 'tdp'): 0}
+
+
+def _directions() -> Dict[tuple, tuple]:
+    """
+    Every relation in both directions: (category, other) -> (column,
+    other column, test(value, other value))
+    """
+    directions = {}
+    for category, column, other, other_column, rule in RELATIONS:
+        directions[(category, other)] = (column, other_column, rule)
+        directions[(other, category)] = (other_column, column, lambda value, other_value, rule=rule: rule(other_value, value))
+    return directions
+
+
+DIRECTIONS = _directions()
+
+# Rule columns of every related category
+CATEGORY_COLUMNS = {category: sorted({column for (first, _), (column, _, _) in DIRECTIONS.items() if first == category})
+                    for category, _ in DIRECTIONS}
+
+
+def _normalize(column: str, value):
+    """A column value as the rules compare it, None when it is missing"""
+    if column in NUMERIC_COLUMNS:
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return None
+        return None if math.isnan(number) else number
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    return value
+
+
+def _value(category: str, column: str, component):
+    """The normalised column value of a part's row"""
+    return _normalize(column, component.get(column, MISSING_COLUMN_DEFAULTS.get((category, column))))
+
+
+def _to_bits(mask: np.ndarray) -> int:
+    """A boolean mask as an int whose bit i is mask[i]"""
+    return int.from_bytes(np.packbits(mask, bitorder='little').tobytes(), 'little')
+
+
+class CompatibilityGraph:
+    """
+    Cross-category compatibility of every pair of parts the RELATIONS
+    rules relate, as bitsets over category-local indexes (the position of
+    a part among PCRecommendationTrainer._category_rows of its category).
+    
+    For every ordered pair of related categories and every distinct
+    column value of the second category, bits[(category, other)][value]
+    holds the parts of category compatible with a part of other that has
+    that value, so "all RAM compatible with motherboard 203" is one dict
+    lookup, and bitsets of several build parts can be ANDed. The rules
+    only compare distinct values, which are few, so building the graph
+    costs a pass over each rule column.
+    """
+    
+    def __init__(self):
+        self.sizes = {}  # category -> parts in the graph
+        self.columns = {}  # (category, column) -> (value code of every part, -1 when missing; distinct values)
+        self.bits = {}  # (category, other) -> {other value: bitset of compatible parts of category}
+    
+    def copy(self) -> 'CompatibilityGraph':
+        """Copy that can be updated without changing this graph; bitsets are immutable ints"""
+        graph = CompatibilityGraph()
+        graph.sizes = dict(self.sizes)
+        graph.columns = dict(self.columns)
+        graph.bits = {pair: dict(bits) for pair, bits in self.bits.items()}
+        return graph
+    
+    def build(self, components_df: pd.DataFrame, category_rows: Dict[str, np.ndarray], categories: Optional[set] = None):
+        """
+        Build the graph from the rows of every category. With `categories`,
+        only the columns of those categories and the relations they take
+        part in are rebuilt; the other categories must keep their parts in
+        the same order.
+        """
+        rebuilt = set()
+        for category, columns in CATEGORY_COLUMNS.items():
+            if categories is not None and category not in categories and category in self.sizes:
+                continue
+            rebuilt.add(category)
+            rows = category_rows.get(category, np.empty(0, dtype=np.int64))
+            self.sizes[category] = len(rows)
+            frame = components_df[[column for column in columns if column in components_df.columns]].iloc[rows]
+            for column in columns:
+                self.columns[(category, column)] = self._encode(category, column, frame)
+        
+        for pair, (column, other_column, test) in DIRECTIONS.items():
+            if rebuilt & set(pair):
+                self.bits[pair] = self._relation_bits(pair, column, other_column, test)
+    
+    def _encode(self, category: str, column: str, frame: pd.DataFrame) -> tuple:
+        """Value codes of a column of a category frame and its distinct values"""
+        if column in frame.columns:
+            values = frame[column]
+        else:
+            values = pd.Series(MISSING_COLUMN_DEFAULTS.get((category, column)), index=frame.index, dtype=object)
+        if column in NUMERIC_COLUMNS:
+            values = pd.to_numeric(values, errors='coerce').astype(float)
+        else:
+            values = values.astype(object)
+        codes, distinct = pd.factorize(values, use_na_sentinel=True)
+        return codes.astype(np.int64), [value.item() if hasattr(value, 'item') else value for value in distinct]
+    
+    def _relation_bits(self, pair: tuple, column: str, other_column: str, test) -> Dict[object, int]:
+        """Bitset of the compatible parts of pair[0] for every distinct value of pair[1]"""
+        category, other = pair
+        codes, distinct = self.columns[(category, column)]
+        _, other_distinct = self.columns[(other, other_column)]
+        bits = {}
+        for other_value in other_distinct:
+            bits[other_value] = _to_bits(self._accepted(distinct, other_value, test)[codes])
+        return bits
+    
+    @staticmethod
+    def _accepted(distinct: list, other_value, test) -> np.ndarray:
+        """Whether each distinct value passes test against other_value, and False for missing values (code -1)"""
+        return np.array([bool(test(value, other_value)) for value in distinct] + [False], dtype=bool)
+    
+    def add(self, category: str, component):
+        """Append a part to its category; it gets the next local index"""
+        if category not in self.sizes:
+            return
+        local = self.sizes[category]
+        self.sizes[category] = local + 1
+        
+        values = {}
+        for column in CATEGORY_COLUMNS[category]:
+            value = values[column] = _value(category, column, component)
+            codes, distinct = self.columns[(category, column)]
+            if value is None:
+                code = -1
+            elif value in distinct:
+                code = distinct.index(value)
+            else:
+                code = len(distinct)
+                distinct = distinct + [value]
+            self.columns[(category, column)] = (np.append(codes, code), distinct)
+        
+        for (first, second), (column, other_column, test) in DIRECTIONS.items():
+            if first == category:
+                # The new part against every value of the other category
+                value = values[column]
+                bits = self.bits[(first, second)]
+                if value is not None:
+                    for other_value in bits:
+                        if test(value, other_value):
+                            bits[other_value] |= 1 << local
+            elif second == category:
+                # Parts of the other category against a new value
+                value = values[other_column]
+                bits = self.bits[(first, second)]
+                if value is not None and value not in bits:
+                    codes, distinct = self.columns[(first, column)]
+                    bits[value] = _to_bits(self._accepted(distinct, value, test)[codes])
+    
+    def compatible_with(self, category: str, other: str, other_component) -> Optional[int]:
+        """
+        Bitset of the parts of category compatible with a part of other,
+        given as its row; None when no rule relates the two categories
+        """
+        direction = DIRECTIONS.get((category, other))
+        if direction is None or category not in self.sizes:
+            return None
+        column, other_column, test = direction
+        other_value = _value(other, other_column, other_component)
+        if other_value is None:
+            return 0
+        bits = self.bits[(category, other)].get(other_value)
+        if bits is None:
+            # A part that isn't in the graph, with a value no part of other has
+            codes, distinct = self.columns[(category, column)]
+            bits = _to_bits(self._accepted(distinct, other_value, test)[codes])
+        return bits
+    
+    def is_compatible(self, category: str, local: int, other: str, other_component) -> Optional[bool]:
+        """Whether part `local` of category is compatible with a part of other; None when no rule relates them"""
+        bits = self.compatible_with(category, other, other_component)
+        return None if bits is None else bool((bits >> local) & 1)
+    
+    def mask(self, category: str, bits: int) -> np.ndarray:
+        """A bitset of category as a boolean mask over its local indexes"""
+        n = self.sizes.get(category, 0)
+        packed = np.frombuffer(bits.to_bytes((n + 7) // 8, 'little'), dtype=np.uint8)
+        return np.unpackbits(packed, count=n, bitorder='little').astype(bool)
+    
+    def groups(self, category: str, local: np.ndarray) -> np.ndarray:
+        """
+        Group of each of the given parts of category: parts of a group have
+        the same rule values, so the same parts are compatible with them
+        """
+        codes = [self.columns[(category, column)][0][local] for column in CATEGORY_COLUMNS.get(category, [])]
+        if not codes:
+            return np.zeros(len(local), dtype=np.int64)
+        _, groups = np.unique(np.stack(codes, axis=1), axis=0, return_inverse=True)
+        return groups.reshape(-1).astype(np.int64)
+    
+    def matches(self, category: str, other: str, components: Iterable, other_component) -> List[bool]:
+        """
+        The rule relating category to other evaluated on the rows of parts
+        that aren't in the graph
+        """
+        column, other_column, test = DIRECTIONS[(category, other)]
+        other_value = _value(other, other_column, other_component)
+        results = []
+        for component in components:
+            value = _value(category, column, component)
+            results.append(value is not None and other_value is not None and bool(test(value, other_value)))
+        return results
+    
+    def nbytes(self) -> int:
+        """Bytes held by the value codes and the bitsets"""
+        codes = sum(int(codes.nbytes) for codes, _ in self.columns.values())
+        return codes + sum((bits.bit_length() + 7) // 8 for pair_bits in self.bits.values() for bits in pair_bits.values())
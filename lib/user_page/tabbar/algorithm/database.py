@@ -0,0 +1,175 @@
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class Database:
+    """
+    Shared access to one SQLite database file.
+    
+    Connections are pooled and reused, so each keeps its cache of prepared
+    statements across requests; statements are parameterised so their SQL
+    text repeats. The database runs in WAL journal mode, so readers never
+    block on a sync writing to it. Table schemas are cached until the
+    database is replaced.
+    """
+    
+    def __init__(self, path: str, max_idle: int = 8, timeout: float = 30.0, cached_statements: int = 256):
+        self.path = path
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self._lock = threading.Lock()
+        self._idle = []  # (connection, epoch) pairs ready for reuse
+        self._epoch = 0  # connections of older epochs are closed instead of reused
+        self._columns = {}
+    
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit; writes group themselves with transaction()
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                               check_same_thread=False, cached_statements=self.cached_statements)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+    
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection for the duration of the block"""
+        with self._lock:
+            epoch = self._epoch
+            conn = None
+            while self._idle:
+                idle_conn, idle_epoch = self._idle.pop()
+                if idle_epoch == epoch:
+                    conn = idle_conn
+                    break
+                idle_conn.close()
+        if conn is None:
+            conn = self._connect()
+        
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                reuse = epoch == self._epoch and len(self._idle) < self.max_idle
+                if reuse:
+                    self._idle.append((conn, epoch))
+            if not reuse:
+                conn.close()
+    
+    @contextmanager
+    def transaction(self):
+        """
+        A pooled connection inside a write transaction, committed when the
+        block exits and rolled back if it raises. IMMEDIATE takes the write
+        lock up front, so reads made inside see no concurrent writes.
+        """
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+    
+    def table_info(self, table_name: str) -> List[dict]:
+        """
+        Columns of a table, in table order (cached). Each is a dict with
+        name, type, notnull, default and pk, as PRAGMA table_info reports them.
+        """
+        with self._lock:
+            info = self._columns.get(table_name)
+        if info is None:
+            with self.connection() as conn:
+                info = [
+                    {'name': name, 'type': col_type.upper(), 'notnull': bool(notnull), 'default': default, 'pk': bool(pk)}
+                    for _, name, col_type, notnull, default, pk in conn.execute(f"PRAGMA table_info({table_name})").fetchall()
+                ]
+            with self._lock:
+                self._columns[table_name] = info
+        return info
+    
+    def columns(self, table_name: str) -> List[str]:
+        """Column names of a table, in table order (cached)"""
+        return [col['name'] for col in self.table_info(table_name)]
+    
+    def required_columns(self, table_name: str) -> List[str]:
+        """Columns an insert must give a value: NOT NULL, without a default and not the key"""
+        return [col['name'] for col in self.table_info(table_name)
+                if col['notnull'] and col['default'] is None and not col['pk']]
+    
+    def invalidate(self):
+        """Forget cached schemas; the tables may have changed"""
+        with self._lock:
+            self._columns.clear()
+    
+    def close_all(self):
+        """
+        Close every idle connection; connections in use are closed when
+        they are returned. Cached schemas are dropped too.
+        """
+        with self._lock:
+            self._epoch += 1
+            idle, self._idle = self._idle, []
+            self._columns.clear()
+        for conn, _ in idle:
+            conn.close()
+    
+    def replace_with(self, source_path: str):
+        """
+        Replace the whole database with the one at source_path. An existing
+        database is overwritten in place with SQLite's backup API, which is
+        one write transaction: readers keep their snapshot until it commits
+        and no stale WAL file can be applied to the new content.
+        """
+        if not os.path.exists(self.path):
+            os.replace(source_path, self.path)
+            self.close_all()
+            return
+        
+        source = sqlite3.connect(source_path)
+        try:
+            with self.connection() as conn:
+                # A WAL database can't change page size, so match the source to it
+                page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+                if source.execute("PRAGMA page_size").fetchone()[0] != page_size:
+                    source.execute("PRAGMA journal_mode=DELETE")
+                    source.execute(f"PRAGMA page_size = {int(page_size)}")
+                    source.execute("VACUUM")
+                source.backup(conn)
+        finally:
+            source.close()
+        os.remove(source_path)
+        self.close_all()
+
+
+_databases: Dict[str, Database] = {}
+_databases_lock = threading.Lock()
+
+
+def get_database(path: str) -> Database:
+    """The shared Database of a file path"""
+    key = os.path.abspath(path)
+    with _databases_lock:
+        database = _databases.get(key)
+        if database is None:
+            database = _databases[key] = Database(path)
+        return database
+
+
+def _close_before_fork():
+    # SQLite connections must not be used across fork(); children open their own
+    for database in list(_databases.values()):
+        database.close_all()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(before=_close_before_fork)
@@ -0,0 +1,191 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+import profiling
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """Bucket counts, sum and count of observed values; the caller locks"""
+    
+    __slots__ = ('counts', 'sum', 'count')
+    
+    def __init__(self, n_buckets: int):
+        self.counts = [0] * (n_buckets + 1)  # the last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+
+class Metrics:
+    """
+    Request and pipeline metrics of one process, rendered in the
+    Prometheus text format. Recording is a bisect and a few increments
+    under a lock, so it can run on every request.
+    """
+    
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._requests = {}  # (route, method, strict) -> Histogram
+        self._responses = {}  # (route, method, strict, status) -> count
+        self._stages = {}  # stage -> Histogram
+        self.last_rebuild = None  # {'stages', 'seconds', 'finished_at', 'success'}
+        self.rebuilds = {True: 0, False: 0}
+    
+    def _observe(self, histograms: dict, key, seconds: float):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = histograms.get(key)
+            if histogram is None:
+                histogram = histograms[key] = Histogram(len(self.buckets))
+            histogram.counts[index] += 1
+            histogram.sum += seconds
+            histogram.count += 1
+    
+    def observe_request(self, route: str, method: str, strict: bool, status: int, seconds: float):
+        """Record one served request"""
+        key = (route, method, 'true' if strict else 'false')
+        self._observe(self._requests, key, seconds)
+        response_key = key + (str(status),)
+        with self._lock:
+            self._responses[response_key] = self._responses.get(response_key, 0) + 1
+    
+    def observe_stage(self, stage: str, seconds: float):
+        """Record the duration of one run of a pipeline stage"""
+        self._observe(self._stages, stage, seconds)
+        profiling.record(stage, seconds)
+    
+    @contextmanager
+    def stage(self, stage: str):
+        """Time the block as one run of a pipeline stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - start)
+    
+    def record_rebuild(self, stages: dict, seconds: float, success: bool):
+        """Keep the stage timings of the latest model rebuild"""
+        with self._lock:
+            self.last_rebuild = {
+                'stages': dict(stages),
+                'seconds': seconds,
+                'finished_at': time.time(),
+                'success': success
+            }
+            self.rebuilds[success] += 1
+    
+    def render(self, gauges=()) -> str:
+        """
+        The metrics in Prometheus text format. `gauges` adds metrics read
+        at scrape time, as (name, type, help, [(labels, value)]) tuples.
+        """
+        with self._lock:
+            requests = {key: _copy(histogram) for key, histogram in self._requests.items()}
+            responses = dict(self._responses)
+            stages = {key: _copy(histogram) for key, histogram in self._stages.items()}
+            last_rebuild = self.last_rebuild
+            rebuilds = dict(self.rebuilds)
+        
+        lines = []
+        
+        def family(name, metric_type, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        
+        family('recommender_requests_total', 'counter', 'Requests served, by route, method, strict mode and status',
+               [(dict(zip(('route', 'method', 'strict', 'status'), key)), count)
+                for key, count in sorted(responses.items())])
+        family('recommender_request_errors_total', 'counter', 'Requests answered with a 4xx or 5xx status',
+               [(dict(zip(('route', 'method', 'strict'), key)), count)
+                for key, count in sorted(_error_counts(responses).items())])
+        self._render_histograms(lines, 'recommender_request_duration_seconds', 'Request latency',
+                                ('route', 'method', 'strict'), requests)
+        self._render_histograms(lines, 'recommender_stage_duration_seconds',
+                                'Duration of pipeline stages of requests and model updates', ('stage',),
+                                {(stage,): histogram for stage, histogram in stages.items()})
+        
+        family('recommender_rebuilds_total', 'counter', 'Model rebuilds, by outcome',
+               [({'success': 'true' if success else 'false'}, count) for success, count in sorted(rebuilds.items())])
+        if last_rebuild is not None:
+            family('recommender_last_rebuild_seconds', 'gauge', 'Duration of the latest model rebuild',
+                   [({}, last_rebuild['seconds'])])
+            family('recommender_last_rebuild_stage_seconds', 'gauge', 'Duration of each stage of the latest model rebuild',
+                   [({'stage': stage}, seconds) for stage, seconds in last_rebuild['stages'].items()])
+            family('recommender_last_rebuild_timestamp_seconds', 'gauge', 'When the latest model rebuild finished',
+                   [({}, last_rebuild['finished_at'])])
+            family('recommender_last_rebuild_success', 'gauge', 'Whether the latest model rebuild succeeded',
+                   [({}, 1 if last_rebuild['success'] else 0)])
+        
+        for name, metric_type, help_text, samples in gauges:
+            family(name, metric_type, help_text, samples)
+        
+        return '\n'.join(lines) + '\n'
+    
+    def _render_histograms(self, lines, name, help_text, label_names, histograms):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        bounds = [_format_value(bound) for bound in self.buckets] + ['+Inf']
+        for key, histogram in sorted(histograms.items()):
+            labels = dict(zip(label_names, key))
+            cumulative = 0
+            for bound, count in zip(bounds, histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels({**labels, 'le': bound})} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+
+@contextmanager
+def timed(stages: dict, stage: str):
+    """Add the block's wall time in seconds to stages[stage]"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages[stage] = stages.get(stage, 0.0) + time.perf_counter() - start
+
+
+def _copy(histogram: Histogram) -> Histogram:
+    copy = Histogram(len(histogram.counts) - 1)
+    copy.counts = list(histogram.counts)
+    copy.sum = histogram.sum
+    copy.count = histogram.count
+    return copy
+
+
+def _error_counts(responses: dict) -> dict:
+    errors = {}
+    for (route, method, strict, status), count in responses.items():
+        if int(status) >= 400:
+            errors[(route, method, strict)] = errors.get((route, method, strict), 0) + count
+    return errors
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _escape(value) -> str:
+    """A label value with backslashes, quotes and newlines escaped"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value) -> str:
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
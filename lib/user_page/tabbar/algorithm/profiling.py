@@ -0,0 +1,234 @@
+import contextvars
+import cProfile
+import functools
+import itertools
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+# How a request can be profiled: stage timings only, or stage timings
+# plus a cProfile or a sampling profile saved to the profile store
+MODES = ('stages', 'cprofile', 'sample')
+
+SAMPLE_INTERVAL = 0.001  # seconds between stack samples
+
+_active = contextvars.ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    """
+    Stage timings of one request and, in 'cprofile' or 'sample' mode, a
+    profile of the thread serving it. Stages may nest, so their times
+    can add up to more than the request took.
+    """
+    
+    def __init__(self, mode: str):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.mode = mode
+        self.stages = {}  # stage -> [seconds, calls]
+        self.started = None
+        self.seconds = None
+        self._profiler = None
+        self._sampler = None
+        self._token = None
+    
+    def start(self):
+        """Make this the current request's profile and start profiling"""
+        self._token = _active.set(self)
+        if self.mode == 'cprofile':
+            self._profiler = cProfile.Profile()
+            try:
+                self._profiler.enable()
+            except ValueError:
+                # Another profiler is running in this process; keep the stage timings
+                self._profiler = None
+        elif self.mode == 'sample':
+            self._sampler = StackSampler(threading.get_ident())
+            self._sampler.start()
+        self.started = time.perf_counter()
+    
+    def stop(self):
+        """Stop profiling; the profile is no longer current"""
+        self.seconds = time.perf_counter() - self.started
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        _active.reset(self._token)
+    
+    def record(self, stage: str, seconds: float):
+        timing = self.stages.get(stage)
+        if timing is None:
+            self.stages[stage] = [seconds, 1]
+        else:
+            timing[0] += seconds
+            timing[1] += 1
+    
+    def summary(self) -> dict:
+        """Stage breakdown in milliseconds, for the response"""
+        return {
+            'mode': self.mode,
+            'total_ms': round(self.seconds * 1000, 3),
+            'stages': {
+                stage: {'ms': round(seconds * 1000, 3), 'calls': calls}
+                for stage, (seconds, calls) in sorted(self.stages.items(), key=lambda item: -item[1][0])
+            }
+        }
+    
+    def server_timing(self) -> str:
+        """The stage breakdown as a Server-Timing header value"""
+        metrics = [f"{stage};dur={seconds * 1000:.3f}" for stage, (seconds, _) in self.stages.items()]
+        metrics.append(f"total;dur={self.seconds * 1000:.3f}")
+        return ', '.join(metrics)
+    
+    def save(self, store: 'ProfileStore', label: str) -> Optional[str]:
+        """Write the captured profile to store; returns its id"""
+        if self._profiler is not None:
+            return store.add(label, 'prof', self._profiler.dump_stats)
+        if self._sampler is not None:
+            return store.add(label, 'txt', self._sampler.dump)
+        return None
+
+
+class StackSampler:
+    """
+    Samples the stack of one thread at a fixed interval from a background
+    thread and counts the distinct stacks, written in the collapsed format
+    flame graph tools read ("outer;inner;leaf count" per line)
+    """
+    
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self._stopped = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+    
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack = ';'.join(reversed(names))
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+    
+    def dump(self, path: str):
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1]):
+                f.write(f"{stack} {count}\n")
+
+
+class ProfileStore:
+    """
+    Ring of the most recent saved profiles in one directory; adding a
+    profile past max_profiles deletes the oldest. Several processes may
+    share the directory.
+    """
+    
+    def __init__(self, directory: str, max_profiles: int = 50):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+    
+    def add(self, label: str, extension: str, write) -> str:
+        """Save a profile with write(path); returns its id"""
+        os.makedirs(self.directory, exist_ok=True)
+        safe_label = ''.join(c if c.isalnum() else '-' for c in label).strip('-')[:60] or 'request'
+        # Ids sort by creation time; the pid keeps workers' ids distinct
+        profile_id = f"{time.time_ns()}-{os.getpid()}-{next(self._counter)}-{safe_label}.{extension}"
+        temp_path = os.path.join(self.directory, f".{profile_id}.tmp")
+        write(temp_path)
+        os.replace(temp_path, os.path.join(self.directory, profile_id))
+        self._prune()
+        return profile_id
+    
+    def _prune(self):
+        with self._lock:
+            for profile_id in self.list_ids()[self.max_profiles:]:
+                try:
+                    os.remove(os.path.join(self.directory, profile_id))
+                except FileNotFoundError:
+                    # Pruned by another worker
+                    pass
+    
+    def list_ids(self) -> List[str]:
+        """Saved profile ids, newest first"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        # Anything else in the directory (temporary files included) is not a profile
+        ids = [name for name in names if name.split('-', 1)[0].isdigit()]
+        return sorted(ids, key=lambda name: int(name.split('-', 1)[0]), reverse=True)
+    
+    def entries(self) -> List[Dict]:
+        """Saved profiles, newest first"""
+        profiles = []
+        for profile_id in self.list_ids():
+            try:
+                size = os.path.getsize(os.path.join(self.directory, profile_id))
+            except FileNotFoundError:
+                continue
+            profiles.append({
+                'profile_id': profile_id,
+                'created_at': int(profile_id.split('-', 1)[0]) / 1e9,
+                'format': 'pstats' if profile_id.endswith('.prof') else 'collapsed-stacks',
+                'bytes': size
+            })
+        return profiles
+    
+    def path(self, profile_id: str) -> Optional[str]:
+        """File of a saved profile, None for unknown or malformed ids"""
+        if profile_id != os.path.basename(profile_id) or not profile_id.split('-', 1)[0].isdigit():
+            return None
+        path = os.path.join(self.directory, profile_id)
+        return path if os.path.isfile(path) else None
+
+
+def current() -> Optional[RequestProfile]:
+    """Profile of the request being served, if it is profiled"""
+    return _active.get()
+
+
+def record(stage: str, seconds: float):
+    """Add a stage timing to the current request's profile, if any"""
+    profile = _active.get()
+    if profile is not None:
+        profile.record(stage, seconds)
+
+
+def profiled(stage: str):
+    """
+    Decorator timing every call as a stage of the current request's
+    profile. Unprofiled calls only pay for one context variable lookup.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profile = _active.get()
+            if profile is None:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.record(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
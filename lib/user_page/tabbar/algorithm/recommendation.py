@@ -1,12 +1,23 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, send_file
 from flask_cors import CORS
 from train_recommendation_model import PCRecommendationTrainer
+from result_cache import ResultCache
+from build_optimizer import BuildOptimizer
+from database import get_database
+from metrics import Metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE, timed
+from profiling import MODES as PROFILE_MODES, ProfileStore, RequestProfile
+import profiling
 import os
 import logging
+import threading
 import traceback
 import base64
+import hmac
 import sqlite3
+import tempfile
+import time
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -14,44 +25,251 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
+DB_PATH = "assemble_db.db"
+MODEL_PATH = "trained_recommendation_model"
+DATASETS_PATH = "./datasets"
+PROFILE_DIR = "profiles"
+PROFILE_RING_SIZE = 50  # saved request profiles kept
+# Clients sending this token in X-Admin-Token may profile requests; with
+# no token set, only direct (not proxied) loopback clients may
+ADMIN_TOKEN = os.environ.get('RECOMMENDER_ADMIN_TOKEN')
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_BATCH_QUERIES = 100
+MAX_BULK_COMPONENTS = 5000
+MAX_OPTIMIZED_BUILDS = 10
+OPTIMIZE_DEADLINE_MS = 1000  # default search time of /optimize-build
+MAX_OPTIMIZE_DEADLINE_MS = 10000
+SYNC_STATE_TABLE = "recommender_sync_state"
+RESULT_CACHE_SIZE = 1024
+RESULT_CACHE_TTL = 300  # seconds
+
 # Global variables
-trainer = PCRecommendationTrainer(db_path="assemble_db.db", datasets_path="./datasets")
-similarity_matrix = None
-components_df = None
+# `trainer` is the published model snapshot. A snapshot is never modified
+# after it is published: rebuilds and incremental updates work on a new
+# trainer and swap the reference, so requests that already hold the old
+# snapshot finish on it.
+trainer = PCRecommendationTrainer(db_path=DB_PATH, datasets_path=DATASETS_PATH)
+model_generation = 0
 
-def initialize_system():
-    """Initialize the recommendation system with better error handling"""
-    global trainer, similarity_matrix, components_df
+# Recommendation results of the published snapshot. Publishing a model or
+# syncing the database starts a new cache generation.
+result_cache = ResultCache(max_size=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+
+# Request counts and latencies, and stage timings of the model pipeline,
+# served by /metrics
+metrics = Metrics()
+
+# Recent cProfile and sampling profiles of profiled requests
+profile_store = ProfileStore(PROFILE_DIR, max_profiles=PROFILE_RING_SIZE)
+
+# Every model write (rebuild or incremental update) runs on this single
+# background worker, so writes are serialised and never block requests
+model_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-rebuild")
+rebuild_lock = threading.Lock()
+pending_rebuild = None
+pending_full_retrain = False
+
+# Under the pre-fork server (serve.py) every worker process holds its own
+# copy of the model; model events are relayed to the other workers through
+# this connection to the master process
+event_channel = None
+event_channel_lock = threading.Lock()
+
+def _build_trainer(retrain=False, stages=None):
+    """
+    Load or train a new model snapshot. A saved model is refreshed so that
+    only categories whose datasets or database tables changed since it was
+    trained are rebuilt; `retrain` forces a full refit. The seconds spent
+    in each stage are added to `stages`.
+    """
+    stages = {} if stages is None else stages
+    model = PCRecommendationTrainer(db_path=DB_PATH, datasets_path=DATASETS_PATH)
+    model_path = MODEL_PATH
     
-    try:
-        model_path = "trained_recommendation_model.pkl"
-        
-        if os.path.exists(model_path):
-            logger.info("Loading pre-trained model...")
-            trainer.load_model(model_path)
-            components_df = trainer.components_df
-            # Recalculate similarity matrix
-            similarity_matrix = trainer.calculate_similarity_matrix()
-            logger.info(f"Model loaded: {len(components_df)} components")
-        else:
-            logger.info("No pre-trained model found. Training new model...")
-            components_df = trainer.load_and_combine_datasets()
-            trainer.train_model(components_df)
-            similarity_matrix = trainer.calculate_similarity_matrix()
-            trainer.save_model(model_path)
-            logger.info(f" Model trained: {len(components_df)} components")
+    if os.path.exists(model_path) and not retrain:
+        logger.info("Loading pre-trained model...")
+        with timed(stages, 'load_model'):
+            model.load_model(model_path)
+        logger.info(f"Model loaded: {len(model.components_df)} components")
         
+        with timed(stages, 'refresh_model'):
+            changed = model.refresh_model()
+        if changed:
+            with timed(stages, 'save_model'):
+                model.save_model(model_path)
+        retrain = changed is None
+    else:
+        retrain = True
+    
+    if retrain:
+        logger.info("Training new model...")
+        model = PCRecommendationTrainer(db_path=DB_PATH, datasets_path=DATASETS_PATH)
+        with timed(stages, 'load_and_combine_datasets'):
+            components_df = model.load_and_combine_datasets()
+        with timed(stages, 'train_model'):
+            model.train_model(components_df)
+        with timed(stages, 'build_neighbor_graph'):
+            model.build_neighbor_graph()
+        with timed(stages, 'save_model'):
+            model.save_model(model_path)
+        logger.info(f" Model trained: {len(components_df)} components")
+    
+    # Build everything requests would otherwise build lazily, so the
+    # snapshot is complete before it is published
+    with timed(stages, 'build_indexes'):
+        if model.category_blocks is None:
+            model.build_similarity_engine()
+        if model.component_index is None:
+            model.build_component_index()
+        if model.compatibility_graph is None:
+            model.build_compatibility_graph()
+    with timed(stages, 'load_availability_index'):
+        model.load_availability_index()
+    return model
+
+def _publish(model):
+    """Atomically replace the published model snapshot"""
+    global trainer, model_generation
+    
+    trainer = model
+    model_generation += 1
+    # Bumped after the swap; handlers read the cache generation before the
+    # model (see _snapshot), so no result is cached under a newer
+    # generation than the model it was computed from
+    result_cache.invalidate()
+    logger.info(f" Published model generation {model_generation}")
+
+def _snapshot():
+    """The published model and the result cache generation it belongs to"""
+    generation = result_cache.generation
+    if profiling.current() is not None:
+        # A profiled request is scored, not answered from the cache; no
+        # entry has this generation, and nothing is cached under it
+        generation = -1
+    return trainer, generation
+
+def initialize_system(retrain=False):
+    """Initialize the recommendation system with better error handling"""
+    stages = {}
+    start = time.perf_counter()
+    try:
+        _publish(_build_trainer(retrain, stages))
+        metrics.record_rebuild(stages, time.perf_counter() - start, success=True)
         logger.info(" Recommendation system initialized successfully")
+        return True
         
     except Exception as e:
+        metrics.record_rebuild(stages, time.perf_counter() - start, success=False)
         logger.error(f" Failed to initialize recommendation system: {e}")
         logger.error(traceback.format_exc())
-        # Don't raise the exception, just log it so the server can still start
-        components_df = None
-        similarity_matrix = None
+        # Don't raise the exception, just log it so the server keeps
+        # serving the previous snapshot
+        return False
+
+def schedule_rebuild(retrain=False):
+    """
+    Rebuild the model on the background worker. A rebuild that is queued
+    but not started yet already covers this request, unless this one asks
+    for a full retrain and the queued one doesn't, so it is reused.
+    """
+    global pending_rebuild, pending_full_retrain
+    
+    with rebuild_lock:
+        if (pending_rebuild is not None and not pending_rebuild.running() and not pending_rebuild.done()
+                and (pending_full_retrain or not retrain)):
+            return pending_rebuild
+        pending_rebuild = model_executor.submit(initialize_system, retrain)
+        pending_full_retrain = retrain
+        return pending_rebuild
+
+def create_app(config=None):
+    """
+    Configure the API and load (or train) the model it serves.
+    Optional config keys: DB_PATH, MODEL_PATH, DATASETS_PATH,
+    RESULT_CACHE_SIZE, RESULT_CACHE_TTL, RETRAIN (refit the whole model
+    at startup), ADMIN_TOKEN, PROFILE_DIR and PROFILE_RING_SIZE.
+    Routes are registered on the module's app, so this configures and
+    returns that app; call it once per process, before forking workers.
+    """
+    global DB_PATH, MODEL_PATH, DATASETS_PATH, ADMIN_TOKEN, result_cache, profile_store
+    
+    config = dict(config or {})
+    app.config.update(config)
+    DB_PATH = config.get('DB_PATH', DB_PATH)
+    MODEL_PATH = config.get('MODEL_PATH', MODEL_PATH)
+    DATASETS_PATH = config.get('DATASETS_PATH', DATASETS_PATH)
+    result_cache = ResultCache(
+        max_size=config.get('RESULT_CACHE_SIZE', RESULT_CACHE_SIZE),
+        ttl=config.get('RESULT_CACHE_TTL', RESULT_CACHE_TTL)
+    )
+    ADMIN_TOKEN = config.get('ADMIN_TOKEN', ADMIN_TOKEN)
+    profile_store = ProfileStore(
+        config.get('PROFILE_DIR', PROFILE_DIR),
+        max_profiles=config.get('PROFILE_RING_SIZE', PROFILE_RING_SIZE)
+    )
+    
+    initialize_system(retrain=config.get('RETRAIN', False))
+    return app
+
+# ========== MULTI-WORKER EVENTS ==========
+def attach_event_channel(conn):
+    """
+    Relay this worker's model events through conn (a multiprocessing
+    Connection to the master) and apply the events other workers send
+    """
+    global event_channel
+    
+    event_channel = conn
+    threading.Thread(target=_receive_events, args=(conn,), name="model-events", daemon=True).start()
+
+def _receive_events(conn):
+    """Apply model events relayed from other workers until the master goes away"""
+    while True:
+        try:
+            event = conn.recv()
+        except (EOFError, OSError):
+            logger.warning(" Event channel to master closed")
+            return
+        
+        logger.info(f" Applying {event['type']} event from another worker")
+        # The database already changed, so drop results of the old data now
+        result_cache.invalidate()
+        if event['type'] == 'rebuild':
+            # The database may have been replaced, with different tables
+            get_database(DB_PATH).invalidate()
+        _apply_event(event)
 
-# Initialize the system when the app starts
-initialize_system()
+def _fan_out(event):
+    """
+    Apply a model event in this process and relay it to the other workers.
+    A rebuild is only run (and saved) here; the other workers are told to
+    rebuild once it finishes, which loads the saved model instead of
+    training it again.
+    """
+    future = _apply_event(event)
+    
+    if event_channel is not None:
+        if event['type'] == 'rebuild':
+            future.add_done_callback(lambda _: _send_event({'type': 'rebuild', 'retrain': False}))
+        else:
+            _send_event(event)
+    return future
+
+def _apply_event(event):
+    """Schedule the model work for an event on the background worker"""
+    if event['type'] == 'rebuild':
+        return schedule_rebuild(event['retrain'])
+    if event['type'] == 'changes':
+        return model_executor.submit(_update_model_with_changes, event['changes'])
+    raise ValueError(f"Unknown model event: {event['type']}")
+
+def _send_event(event):
+    """Send an event to the master, which relays it to every other worker"""
+    try:
+        with event_channel_lock:
+            event_channel.send(event)
+    except (OSError, ValueError) as e:
+        logger.error(f" Could not relay {event['type']} event: {e}")
 
 # ========== SYNC ENDPOINTS ==========
 @app.route('/api/fix-dataset-ids', methods=['POST'])
@@ -92,40 +310,120 @@ def fix_dataset_ids_endpoint():
 
 @app.route('/api/sync/database', methods=['POST'])
 def sync_database():
-    """Receive full database sync from Flutter app"""
+    """
+    Receive full database sync from Flutter app
+    Preferred: raw SQLite file as application/octet-stream (chunked uploads supported)
+    Legacy JSON: {"database_data": "<base64>", "timestamp": 1700000000000}
+    """
     try:
-        data = request.get_json()
-        database_data = data.get('database_data')
-        timestamp = data.get('timestamp')
-        
-        logger.info(f" Received database sync request at {timestamp}")
-        
-        if not database_data:
-            return jsonify({'error': 'No database data provided'}), 400
-        
-        # Decode base64 database
-        db_bytes = base64.b64decode(database_data)
-        
-        # Save to file (overwrite existing)
-        with open('assemble_db.db', 'wb') as f:
-            f.write(db_bytes)
-        
-        logger.info(" Database file updated")
+        if request.mimetype == 'application/json':
+            data = request.get_json()
+            database_data = data.get('database_data')
+            timestamp = data.get('timestamp')
+            
+            logger.info(f" Received database sync request at {timestamp}")
+            
+            if not database_data:
+                return jsonify({'error': 'No database data provided'}), 400
+            
+            # Decode base64 database
+            chunks = [base64.b64decode(database_data)]
+        else:
+            timestamp = request.headers.get('X-Sync-Timestamp')
+            logger.info(f" Received streamed database sync request at {timestamp}")
+            chunks = iter(lambda: request.stream.read(UPLOAD_CHUNK_SIZE), b'')
         
-        # Reload the recommendation system with new database
-        initialize_system()
+        size, _ = replace_database_and_reload(chunks)
+        if size is None:
+            return jsonify({'error': 'Uploaded database failed integrity check'}), 400
         
-        logger.info(" Recommendation system reloaded with new database")
-        return jsonify({'success': True, 'message': 'Database synced and system reloaded'})
+        logger.info(" Recommendation system reload scheduled")
+        return jsonify({'success': True, 'message': 'Database synced, system reload scheduled', 'bytes_received': size})
         
     except Exception as e:
         logger.error(f"Database sync error: {e}")
         logger.error(traceback.format_exc())
         return jsonify({'error': str(e)}), 500
 
+def replace_database_and_reload(chunks):
+    """
+    Swap in an uploaded database and reload the recommendation system from
+    it in the background. Returns (bytes written, rebuild future), or
+    (None, None) if the upload is not a valid SQLite database.
+    """
+    size = _replace_database(chunks)
+    if size is None:
+        return None, None
+    
+    logger.info(f" Database file updated ({size} bytes)")
+    result_cache.invalidate()
+    return size, _fan_out({'type': 'rebuild', 'retrain': False})
+
+def _replace_database(chunks):
+    """
+    Write an uploaded database to a temporary file next to the live one,
+    check it with PRAGMA integrity_check and copy it into the live database
+    in one transaction, so readers never see a partially written file.
+    Returns the number of bytes written, or None if the upload is not a
+    valid SQLite database.
+    """
+    db_dir = os.path.dirname(os.path.abspath(DB_PATH))
+    fd, temp_path = tempfile.mkstemp(prefix='.upload-', suffix='.db', dir=db_dir)
+    
+    try:
+        size = 0
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+        
+        if not size or not _database_is_valid(temp_path):
+            os.remove(temp_path)
+            return None
+        
+        _carry_sync_version(temp_path)
+        get_database(DB_PATH).replace_with(temp_path)
+        return size
+        
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def _carry_sync_version(path):
+    """
+    Give an uploaded database a sync version past both its own and the live
+    database's, so replacing the file never moves the version back
+    """
+    version = _current_sync_version()
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            _store_sync_version(conn, max(version, _read_sync_version(conn)) + 1)
+    finally:
+        conn.close()
+
+def _database_is_valid(path):
+    """Run PRAGMA integrity_check on a database file"""
+    try:
+        conn = sqlite3.connect(path)
+        try:
+            result = conn.execute("PRAGMA integrity_check").fetchall()
+        finally:
+            conn.close()
+        return result == [('ok',)]
+    except sqlite3.DatabaseError as e:
+        logger.warning(f" Uploaded database rejected: {e}")
+        return False
+
 @app.route('/api/sync/component', methods=['POST'])
 def sync_component():
-    """Receive individual component sync from Flutter"""
+    """
+    Receive individual component sync from Flutter
+    Expected JSON: {"component": {...}, "category": "cpu", "action": "add"}
+    or {"component_id": 7, "category": "cpu", "action": "update", "component": {...}}
+    or {"component_id": 7, "category": "cpu", "action": "delete"}
+    """
     try:
         data = request.get_json()
         component = data.get('component')
@@ -134,129 +432,385 @@ def sync_component():
         
         logger.info(f" Received component sync: {action} {category}")
         
+        if action in ('update', 'delete'):
+            if not category or data.get('component_id') is None or (action == 'update' and not component):
+                return jsonify({'error': 'component_id, category and (for updates) component are required'}), 400
+            
+            change = {'op': action, 'category': category, 'id': data['component_id'], 'row': component}
+            version, applied = _apply_changes_to_database([change])
+            result_cache.invalidate()
+            _fan_out({'type': 'changes', 'changes': applied})
+            
+            return jsonify({
+                'success': True,
+                'message': f'{category} {action} synced',
+                'component_id': data['component_id'],
+                'version': version
+            })
+        
         if not component or not category:
             return jsonify({'error': 'Component and category are required'}), 400
         
-        component_id = None
         if action == 'add':
-            # Add component to local database
-            component_id = _add_component_to_database(component, category)
+            # An add is a one-insert changeset, so it takes the next sync version
+            version, applied = _apply_changes_to_database([{'op': 'insert', 'category': category, 'row': component}])
+            result_cache.invalidate()
             
-            # Update model with new data
-            _update_model_with_new_component(component, category, component_id)
+            # Update model with new data in the background
+            _fan_out({'type': 'changes', 'changes': applied})
             
-            logger.info(f"{category} component added and model updated")
+            logger.info(f"{category} component added, model update scheduled")
+            return jsonify({
+                'success': True,
+                'message': f'{category} synced',
+                'component_id': applied[0]['id'],
+                'version': version
+            })
         
         return jsonify({
             'success': True, 
             'message': f'{category} synced',
-            'component_id': component_id
+            'component_id': None
         })
         
+    except (ValueError, sqlite3.IntegrityError) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f" Component sync error: {e}")
         logger.error(traceback.format_exc())
         return jsonify({'error': str(e)}), 500
 
-def _add_component_to_database(component, category):
-    """Add component to local SQLite database"""
+@app.route('/api/sync/changes', methods=['GET', 'POST'])
+def sync_changes():
+    """
+    Row-level delta sync
+    GET returns the server's current sync version: {"version": 12}
+    POST JSON: {"version": 13, "changes": [
+        {"category": "cpu", "op": "insert", "row": {...}},
+        {"category": "ram", "op": "update", "id": 3, "row": {"price": 21000}},
+        {"category": "gpu", "op": "delete", "id": 5}]}
+    The batch is applied in one transaction and must carry a version greater
+    than the server's; otherwise nothing is applied and 409 is returned with
+    the current version.
+    """
     try:
-        conn = sqlite3.connect('assemble_db.db')
-        cursor = conn.cursor()
-        
-        # Map category to table name
-        table_mapping = {
-            'cpu': 'CPUtable',
-            'gpu': 'GPUtable',
-            'ram': 'RAMtable',
-            'psu': 'PSUtable',
-            'storage': 'storagetable',
-            'motherboard': 'motherboardtable',
-            'case': 'casetable',
-            'cooling': 'coolingtable'
-        }
+        if request.method == 'GET':
+            return jsonify({'success': True, 'version': _current_sync_version()})
         
-        table_name = table_mapping.get(category)
-        if not table_name:
-            raise Exception(f"Unknown category: {category}")
+        data = request.get_json()
+        version = data.get('version')
+        changes = data.get('changes')
         
-        # Remove id if it's None (for auto-increment)
-        component_data = component.copy()
-        if component_data.get('id') is None:
-            component_data.pop('id', None)
+        if not isinstance(version, int) or not isinstance(changes, list):
+            return jsonify({'error': 'version (integer) and changes (list) are required'}), 400
         
-        # DEBUG: Print what we're trying to insert
-        print(f" Inserting into {table_name}:")
-        print(f"   Columns: {list(component_data.keys())}")
-        print(f"   Values: {list(component_data.values())}")
+        logger.info(f" Received changeset version {version} with {len(changes)} changes")
         
-        # Get the actual column names from the database table
-        try:
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            table_info = cursor.fetchall()
-            actual_columns = [col[1] for col in table_info if col[1] != 'id']  # Skip id column
-            print(f"   Actual columns in {table_name}: {actual_columns}")
-            
-            # Filter component_data to only include columns that exist in the table
-            filtered_component_data = {}
-            for key, value in component_data.items():
-                if key in actual_columns:
-                    filtered_component_data[key] = value
-                else:
-                    print(f"    Skipping column '{key}' - not in table")
-            
-            component_data = filtered_component_data
-            
-        except Exception as e:
-            print(f"  Could not get table info: {e}")
-            # Continue with original data if we can't get table info
+        version, applied = _apply_changes_to_database(changes, version)
+        if applied:
+            result_cache.invalidate()
+            _fan_out({'type': 'changes', 'changes': applied})
         
-        # Build insert query with filtered data
-        if not component_data:
-            raise Exception("No valid columns to insert after filtering")
-            
-        columns = ', '.join(component_data.keys())
-        placeholders = ', '.join(['?' for _ in component_data])
-        values = list(component_data.values())
+        return jsonify({
+            'success': True,
+            'version': version,
+            'applied': [{'op': change['op'], 'category': change['category'], 'id': change['id']} for change in applied]
+        })
         
-        query = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
-        print(f"   Final query: {query}")
-        print(f"   Final values: {values}")
+    except SyncVersionConflict as e:
+        return jsonify({'error': str(e), 'version': e.current_version}), 409
+    except (ValueError, sqlite3.IntegrityError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f" Changeset sync error: {e}")
+        logger.error(traceback.format_exc())
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/sync/components', methods=['POST'])
+def sync_components_bulk():
+    """
+    Bulk component ingest
+    Expected JSON: {"components": [
+        {"category": "cpu", "component": {...}},
+        {"category": "gpu", "component": {"id": 40, ...}}]}
+    Rows are checked against the table schemas and the valid ones inserted
+    in one transaction, then applied to the model in one update. Each row
+    gets a result, in request order: its assigned component_id, or why it
+    was rejected.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        components = data.get('components')
         
-        cursor.execute(query, values)
+        if not isinstance(components, list) or not components:
+            return jsonify({'error': 'components (non-empty list) is required'}), 400
+        if len(components) > MAX_BULK_COMPONENTS:
+            return jsonify({'error': f'At most {MAX_BULK_COMPONENTS} components per request'}), 400
         
-        # Get the inserted ID
-        component_id = cursor.lastrowid
+        logger.info(f" Received bulk ingest of {len(components)} components")
         
-        conn.commit()
-        conn.close()
+        version, results, applied = _ingest_components(components)
+        if applied:
+            result_cache.invalidate()
+            _fan_out({'type': 'changes', 'changes': applied})
         
-        logger.info(f" Added {category} to database with ID: {component_id}")
-        return component_id
+        return jsonify({
+            'success': True,
+            'version': version,
+            'inserted': len(applied),
+            'failed': len(results) - len(applied),
+            'results': results
+        })
         
     except Exception as e:
-        logger.error(f"Error adding component to database: {e}")
-        print(f" Detailed error: {traceback.format_exc()}")
-        raise
+        logger.error(f" Bulk ingest error: {e}")
+        logger.error(traceback.format_exc())
+        return jsonify({'error': str(e)}), 500
 
-def _update_model_with_new_component(component, category, component_id):
-    """Update the recommendation model with new component - OPTIMIZED VERSION"""
-    global components_df, similarity_matrix
+class SyncVersionConflict(Exception):
+    """A changeset did not advance the server's sync version"""
     
+    def __init__(self, current_version):
+        super().__init__(f"Sync version must be greater than {current_version}")
+        self.current_version = current_version
+
+def _read_sync_version(conn):
+    """Sync version stored in the database, 0 if it was never set"""
     try:
-        # Instead of retraining the entire model, just update the data
-        # and let the next initialization handle it properly
+        row = conn.execute(f"SELECT version FROM {SYNC_STATE_TABLE} WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] if row else 0
+
+def _current_sync_version():
+    """Current sync version of the database file"""
+    if not os.path.exists(DB_PATH):
+        return 0
+    with get_database(DB_PATH).connection() as conn:
+        return _read_sync_version(conn)
+
+def _apply_changes_to_database(changes, version=None):
+    """
+    Apply a batch of row changes in one transaction and store the new sync
+    version with them. Without `version` the batch takes the next version.
+    Returns (version, applied changes) where inserts carry their assigned
+    id and every row is limited to columns of its table.
+    """
+    # The transaction takes the write lock before the version is read
+    with get_database(DB_PATH).transaction() as conn:
+        current_version = _read_sync_version(conn)
+        if version is None:
+            version = current_version + 1
+        elif version <= current_version:
+            raise SyncVersionConflict(current_version)
         
-        logger.info(f" Component {category} (ID: {component_id}) added to database")
-        logger.info(" Model will be updated on next system restart or via full retrain")
+        applied = [_apply_change(conn, change) for change in changes]
+        _store_sync_version(conn, version)
+    
+    logger.info(f" Applied {len(applied)} changes, sync version is now {version}")
+    return version, applied
+
+def _store_sync_version(conn, version):
+    """Store the sync version inside an open transaction"""
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {SYNC_STATE_TABLE} "
+                 "(id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)")
+    conn.execute(f"INSERT OR REPLACE INTO {SYNC_STATE_TABLE} (id, version) VALUES (1, ?)", (version,))
+
+def _apply_change(conn, change):
+    """Apply one insert, update or delete inside an open transaction"""
+    op = change.get('op')
+    category = change.get('category')
+    table_name = trainer.table_mapping.get(category)
+    if not table_name:
+        raise ValueError(f"Unknown category: {category}")
+    if op not in ('insert', 'update', 'delete'):
+        raise ValueError(f"Unknown op: {op}")
+    
+    row = change.get('row') or {}
+    component_id = change.get('id', row.get('id'))
+    if op != 'insert' and component_id is None:
+        raise ValueError(f"{op} of {category} needs an id")
+    
+    # Columns in table order, so statements for the same columns share SQL text
+    values = {key: row[key] for key in get_database(DB_PATH).columns(table_name) if key in row and key != 'id'}
+    
+    if op == 'insert':
+        if component_id is not None:
+            values['id'] = component_id
+        if not values:
+            raise ValueError(f"Insert into {category} has no valid columns")
+        placeholders = ', '.join('?' for _ in values)
+        cursor = conn.execute(f"INSERT INTO {table_name} ({', '.join(values)}) VALUES ({placeholders})",
+                              list(values.values()))
+        component_id = cursor.lastrowid
+        values.pop('id', None)
+    elif op == 'update':
+        if not values:
+            raise ValueError(f"Update of {category} has no valid columns")
+        assignments = ', '.join(f"{key} = ?" for key in values)
+        cursor = conn.execute(f"UPDATE {table_name} SET {assignments} WHERE id = ?",
+                              list(values.values()) + [component_id])
+        if cursor.rowcount == 0:
+            raise ValueError(f"{category} ID {component_id} not found")
+    else:
+        cursor = conn.execute(f"DELETE FROM {table_name} WHERE id = ?", (component_id,))
+        if cursor.rowcount == 0:
+            raise ValueError(f"{category} ID {component_id} not found")
+    
+    return {'op': op, 'category': category, 'id': int(component_id), 'row': values}
+
+def _validate_component(entry):
+    """
+    Check one bulk ingest entry against its table's cached schema.
+    Returns (category, table name, row limited to table columns in table
+    order); raises ValueError when the row can't be inserted.
+    """
+    if not isinstance(entry, dict) or not isinstance(entry.get('component'), dict):
+        raise ValueError("Entry needs a category and a component object")
+    
+    category = entry.get('category')
+    table_name = trainer.table_mapping.get(category)
+    if not table_name:
+        raise ValueError(f"Unknown category: {category}")
+    
+    component = entry['component']
+    database = get_database(DB_PATH)
+    row = {}
+    for column in database.table_info(table_name):
+        value = component.get(column['name'])
+        if value is None:
+            continue
+        if column['type'] in ('INTEGER', 'REAL'):
+            if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+                raise ValueError(f"{column['name']} must be a number")
+            try:
+                value = float(value)
+            except ValueError:
+                raise ValueError(f"{column['name']} must be a number, got {value!r}")
+            if column['type'] == 'INTEGER':
+                if not value.is_integer():
+                    raise ValueError(f"{column['name']} must be an integer, got {value!r}")
+                value = int(value)
+        row[column['name']] = value
+    
+    missing = [name for name in database.required_columns(table_name) if name not in row]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+    return category, table_name, row
+
+def _ingest_components(components):
+    """
+    Insert validated bulk ingest rows in one transaction, taking the next
+    sync version. Rows without an id get the next ids of their table, so
+    rows of the same table and columns go in with one executemany. Returns
+    (version, per-row results, applied insert changes).
+    """
+    results = [None] * len(components)
+    pending = {}  # table name -> [(index, category, row)]
+    for index, entry in enumerate(components):
+        try:
+            category, table_name, row = _validate_component(entry)
+            pending.setdefault(table_name, []).append((index, category, row))
+        except ValueError as e:
+            results[index] = {'index': index, 'success': False, 'error': str(e)}
+    
+    applied = []
+    with get_database(DB_PATH).transaction() as conn:
+        version = _read_sync_version(conn) + 1
+        
+        for table_name, rows in pending.items():
+            explicit_ids = [row['id'] for _, _, row in rows if 'id' in row]
+            taken = _existing_ids(conn, table_name, explicit_ids)
+            next_id = _next_id(conn, table_name, explicit_ids)
+            groups = {}  # column names -> rows inserted with one statement
+            for index, category, row in rows:
+                if 'id' in row:
+                    if row['id'] in taken:
+                        results[index] = {'index': index, 'success': False,
+                                          'error': f"{category} ID {row['id']} already exists"}
+                        continue
+                else:
+                    row['id'] = next_id
+                    next_id += 1
+                taken.add(row['id'])
+                groups.setdefault(tuple(row), []).append((index, category, row))
+            
+            for columns, group in groups.items():
+                for index, category, row in _insert_rows(conn, table_name, columns, group, results):
+                    values = dict(row)
+                    component_id = values.pop('id')
+                    results[index] = {'index': index, 'success': True, 'category': category, 'component_id': component_id}
+                    applied.append({'op': 'insert', 'category': category, 'id': component_id, 'row': values})
+        
+        if applied:
+            _store_sync_version(conn, version)
+        else:
+            version -= 1
+    
+    logger.info(f" Ingested {len(applied)} of {len(components)} components, sync version is now {version}")
+    return version, results, applied
+
+def _existing_ids(conn, table_name, ids):
+    """The ids among `ids` that the table already has"""
+    existing = set()
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        placeholders = ', '.join('?' for _ in chunk)
+        existing.update(row[0] for row in conn.execute(f"SELECT id FROM {table_name} WHERE id IN ({placeholders})", chunk))
+    return existing
+
+def _next_id(conn, table_name, explicit_ids):
+    """The id AUTOINCREMENT would assign next, past any id given in this batch"""
+    next_id = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table_name}").fetchone()[0]
+    try:
+        sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table_name,)).fetchone()
+    except sqlite3.OperationalError:
+        sequence = None
+    if sequence:
+        next_id = max(next_id, sequence[0])
+    return max([next_id] + explicit_ids) + 1
+
+def _insert_rows(conn, table_name, columns, group, results):
+    """
+    Insert rows with the same columns using one executemany. If a
+    constraint rejects any of them, the rows are retried one at a time so
+    only the failing ones are left out. Returns the inserted rows.
+    """
+    query = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+    conn.execute("SAVEPOINT bulk_insert")
+    try:
+        conn.executemany(query, [list(row.values()) for _, _, row in group])
+        conn.execute("RELEASE bulk_insert")
+        return group
+    except sqlite3.DatabaseError:
+        conn.execute("ROLLBACK TO bulk_insert")
+        conn.execute("RELEASE bulk_insert")
+    
+    inserted = []
+    for index, category, row in group:
+        try:
+            conn.execute(query, list(row.values()))
+            inserted.append((index, category, row))
+        except sqlite3.DatabaseError as e:
+            results[index] = {'index': index, 'success': False, 'error': str(e)}
+    return inserted
+
+def _update_model_with_changes(changes):
+    """Apply synced row changes to a copy of the model and publish it"""
+    try:
+        model = trainer.copy()
+        with metrics.stage('apply_changes'):
+            applied = model.tfidf_matrix is not None and model.apply_changes(changes)
+        if not applied:
+            logger.info(" Running full retrain")
+            initialize_system(retrain=True)
+            return
         
-        # For now, we'll just reload the system to ensure consistency
-        initialize_system()
+        _publish(model)
         
     except Exception as e:
-        logger.error(f" Error updating model: {e}")
+        logger.error(f" Error applying changes to model: {e}")
         logger.error(traceback.format_exc())
-        raise
 
 # ========== RECOMMENDATION ENDPOINTS ==========
 
@@ -269,27 +823,156 @@ def home():
         'endpoints': {
             'GET /': 'This message',
             'GET /health': 'Health check',
+            'GET /metrics': 'Prometheus metrics',
             'POST /similar': 'Get similar components',
+            'POST /similar/batch': 'Get similar components for several components',
             'POST /compatible': 'Get compatible components',
+            'POST /compatible/batch': 'Get compatible components of several categories',
+            'POST /complete-build': 'Get compatible components for every missing category',
+            'POST /optimize-build': 'Get the best compatible full builds within a budget',
             'POST /api/sync/database': 'Sync full database',
             'POST /api/sync/component': 'Sync individual component',
-            'POST /api/retrain': 'Force retrain model'
+            'POST /api/sync/components': 'Bulk ingest components in one transaction',
+            'GET/POST /api/sync/changes': 'Versioned row-level changeset sync',
+            'POST /api/retrain': 'Force retrain model',
+            'GET /api/profiles': 'Saved request profiles (admin)'
         }
     })
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
+    model = trainer
     status = {
         'status': 'healthy',
         'message': 'PC Component Recommendation API',
-        'components_loaded': len(components_df) if components_df is not None else 0,
-        'model_loaded': components_df is not None,
-        'similarity_matrix_loaded': similarity_matrix is not None,
+        'components_loaded': len(model.components_df) if model.components_df is not None else 0,
+        'model_loaded': model.components_df is not None,
+        'similarity_matrix_loaded': model.neighbor_graph is not None,
+        'model_generation': model_generation,
+        'worker_pid': os.getpid(),
+        'rebuild_pending': pending_rebuild is not None and not pending_rebuild.done(),
+        'result_cache': result_cache.stats(),
         'sync_endpoints_available': True
     }
     return jsonify(status)
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Request, pipeline and model metrics in Prometheus text format"""
+    model = trainer
+    categories = model.category_blocks or {}
+    availability = model.availability_index or {}
+    cache_stats = result_cache.stats()
+    gauges = [
+        ('recommender_catalog_components', 'gauge', 'Components in the published model, by category and source',
+         [({'category': category, 'source': 'all'}, len(block['rows'])) for category, block in sorted(categories.items())]
+         + [({'category': category, 'source': 'database'}, len(ids)) for category, ids in sorted(availability.items())]),
+        ('recommender_model_memory_bytes', 'gauge', 'Bytes held by each part of the published model',
+         [({'part': part}, size) for part, size in model.memory_usage().items()]),
+        ('recommender_model_generation', 'gauge', 'Generation of the published model', [({}, model_generation)]),
+        ('recommender_rebuild_pending', 'gauge', 'Whether a model rebuild is queued or running',
+         [({}, pending_rebuild is not None and not pending_rebuild.done())]),
+        ('recommender_result_cache_entries', 'gauge', 'Results in the result cache', [({}, cache_stats['size'])]),
+        ('recommender_result_cache_lookups_total', 'counter', 'Result cache lookups, by outcome',
+         [({'result': 'hit'}, cache_stats['hits']), ({'result': 'miss'}, cache_stats['misses'])]),
+        ('recommender_result_cache_evictions_total', 'counter', 'Results evicted from the result cache',
+         [({}, cache_stats['evictions'])]),
+    ]
+    return Response(metrics.render(gauges), content_type=METRICS_CONTENT_TYPE)
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def _record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Unknown paths share one label, so scans can't grow the series
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        # Handlers parsed the body already; get_json returns the cached result
+        data = request.get_json(silent=True) if request.is_json else None
+        strict = bool(data.get('strict', False)) if isinstance(data, dict) else False
+        metrics.observe_request(route, request.method, strict, response.status_code, time.perf_counter() - started)
+    return response
+
+# ========== REQUEST PROFILING ==========
+def _is_admin_request():
+    """Whether the client may use the admin-only debugging features"""
+    if ADMIN_TOKEN:
+        return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN)
+    return request.remote_addr in ('127.0.0.1', '::1') and 'X-Forwarded-For' not in request.headers
+
+@app.before_request
+def _start_request_profile():
+    """
+    Profile the request when an admin client asks for it with the
+    X-Profile header or the profile query parameter:
+    'stages' adds a stage timing breakdown to the response, 'cprofile' and
+    'sample' also save a cProfile or stack sampling profile of the request
+    to the profile store, downloadable from /api/profiles.
+    """
+    mode = request.headers.get('X-Profile') or request.args.get('profile')
+    if not mode:
+        return None
+    if mode not in PROFILE_MODES:
+        return jsonify({'error': f"profile must be one of: {', '.join(PROFILE_MODES)}"}), 400
+    if not _is_admin_request():
+        return jsonify({'error': 'Profiling is restricted to admin clients'}), 403
+    
+    g.request_profile = RequestProfile(mode)
+    g.request_profile.start()
+    return None
+
+@app.after_request
+def _finish_request_profile(response):
+    """Attach the stage breakdown of a profiled request and save its profile"""
+    profile = g.pop('request_profile', None)
+    if profile is None:
+        return response
+    
+    profile.stop()
+    summary = profile.summary()
+    try:
+        profile_id = profile.save(profile_store, f"{request.method} {request.path}")
+    except OSError as e:
+        logger.error(f" Could not save request profile: {e}")
+        profile_id = None
+    if profile_id is not None:
+        summary['profile_id'] = profile_id
+        response.headers['X-Profile-Id'] = profile_id
+    
+    response.headers['Server-Timing'] = profile.server_timing()
+    if response.is_json:
+        body = response.get_json(silent=True)
+        if isinstance(body, dict):
+            body['profile'] = summary
+            response.set_data(app.json.dumps(body))
+    return response
+
+@app.route('/api/profiles', methods=['GET'])
+def list_profiles():
+    """Saved request profiles, newest first (admin only)"""
+    if not _is_admin_request():
+        return jsonify({'error': 'Profiles are restricted to admin clients'}), 403
+    return jsonify({'success': True, 'max_profiles': profile_store.max_profiles, 'profiles': profile_store.entries()})
+
+@app.route('/api/profiles/<profile_id>', methods=['GET'])
+def download_profile(profile_id):
+    """
+    Download a saved request profile (admin only): .prof files are
+    pstats dumps (python -m pstats, snakeviz), .txt files collapsed
+    stacks (flamegraph.pl, speedscope)
+    """
+    if not _is_admin_request():
+        return jsonify({'error': 'Profiles are restricted to admin clients'}), 403
+    path = profile_store.path(profile_id)
+    if path is None:
+        return jsonify({'error': 'No such profile'}), 404
+    mimetype = 'application/octet-stream' if profile_id.endswith('.prof') else 'text/plain'
+    return send_file(os.path.abspath(path), mimetype=mimetype, as_attachment=True, download_name=profile_id)
+
 @app.route('/similar', methods=['POST'])
 def recommend_similar():
     """
@@ -308,28 +991,88 @@ def recommend_similar():
         if not component_id or not category:
             return jsonify({'error': 'component_id and category are required'}), 400
         
-        recommendations = trainer.get_similar_components(
-            component_id=component_id,
-            category=category,
-            n_recommendations=n_recommendations,
-            strict=strict_mode  # Pass strict parameter
-        )
+        model, generation = _snapshot()
+        with metrics.stage('score'):
+            result = _similar_result(model, generation, component_id, category, n_recommendations, strict_mode)
         
-        logger.info(f"Returning {len(recommendations)} similar recommendations (strict: {strict_mode})")
+        logger.info(f"Returning {len(result['recommendations'])} similar recommendations (strict: {strict_mode})")
         
-        return jsonify({
-            'success': True,
-            'component_id': component_id,
-            'category': category,
-            'strict_mode': strict_mode,
-            'recommendations': recommendations
-        })
+        with metrics.stage('respond'):
+            return jsonify({'success': True, **result})
         
     except Exception as e:
         logger.error(f" Error in similar recommendations: {e}")
         logger.error(traceback.format_exc())
         return jsonify({'error': str(e)}), 500
 
+@app.route('/similar/batch', methods=['POST'])
+def recommend_similar_batch():
+    """
+    Get similar components for several components in one request
+    Expected JSON: {"queries": [{"component_id": 1, "category": "cpu"}, {"component_id": 101, "category": "gpu"}],
+                    "n_recommendations": 5, "strict": false}
+    A query may override n_recommendations and strict. Results are keyed "<category>:<component_id>";
+    a query that fails is reported under "errors" instead of failing the batch.
+    """
+    try:
+        data = request.get_json()
+        queries = data.get('queries')
+        n_recommendations = data.get('n_recommendations', 5)
+        strict_mode = data.get('strict', False)
+        
+        if not isinstance(queries, list) or not queries:
+            return jsonify({'error': 'queries must be a non-empty list'}), 400
+        if len(queries) > MAX_BATCH_QUERIES:
+            return jsonify({'error': f'At most {MAX_BATCH_QUERIES} queries per batch'}), 400
+        if not all(isinstance(query, dict) and query.get('component_id') and query.get('category') for query in queries):
+            return jsonify({'error': 'Every query needs component_id and category'}), 400
+        
+        logger.info(f" Received similar batch request: {len(queries)} queries")
+        
+        # Every query is answered from the same model snapshot
+        model, generation = _snapshot()
+        results, errors = {}, {}
+        with metrics.stage('score'):
+            for query in queries:
+                key = f"{query['category']}:{query['component_id']}"
+                try:
+                    results[key] = _similar_result(
+                        model, generation, query['component_id'], query['category'],
+                        query.get('n_recommendations', n_recommendations),
+                        query.get('strict', strict_mode)
+                    )
+                except Exception as e:
+                    logger.error(f" Error in similar recommendations for {key}: {e}")
+                    errors[key] = str(e)
+        
+        with metrics.stage('respond'):
+            return jsonify({'success': True, 'results': results, 'errors': errors})
+        
+    except Exception as e:
+        logger.error(f" Error in similar batch recommendations: {e}")
+        logger.error(traceback.format_exc())
+        return jsonify({'error': str(e)}), 500
+
+def _similar_result(model, generation, component_id, category, n_recommendations, strict_mode):
+    """Response body of one similar-components query"""
+    recommendations = result_cache.get_or_compute(
+        ('similar', category, _cache_id(component_id), n_recommendations, bool(strict_mode)),
+        generation,
+        lambda: model.get_similar_components(
+            component_id=component_id,
+            category=category,
+            n_recommendations=n_recommendations,
+            strict=strict_mode  # Pass strict parameter
+        )
+    )
+    
+    return {
+        'component_id': component_id,
+        'category': category,
+        'strict_mode': strict_mode,
+        'recommendations': recommendations
+    }
+
 @app.route('/compatible', methods=['POST'])
 def recommend_compatible():
     """
@@ -349,57 +1092,284 @@ def recommend_compatible():
         if not target_category:
             return jsonify({'error': 'target_category is required'}), 400
         
-        if strict_mode:
-            # Strict mode: only database recommendations
-            recommendations = trainer.get_compatible_components(
-                current_build=current_build,
-                target_category=target_category,
-                n_recommendations=n_recommendations,
-                strict=True
+        model, generation = _snapshot()
+        with metrics.stage('score'):
+            recommendations = result_cache.get_or_compute(
+                _compatible_cache_key(current_build, target_category, n_recommendations, strict_mode),
+                generation,
+                lambda: model.get_compatible_components(
+                    current_build=current_build,
+                    target_category=target_category,
+                    n_recommendations=n_recommendations,
+                    strict=strict_mode
+                )
             )
-            database_recommendations = recommendations
-            dataset_recommendations = []
-        else:
-            # Non-strict mode: get both types separately
-            all_recommendations = trainer.get_compatible_components(
-                current_build=current_build,
-                target_category=target_category,
-                n_recommendations=n_recommendations,
-                strict=False
+        result = _compatible_result(target_category, strict_mode, recommendations)
+        
+        logger.info(f" Returning {len(result['database_recommendations'])} database and {len(result['dataset_recommendations'])} dataset recommendations")
+        
+        with metrics.stage('respond'):
+            return jsonify({'success': True, 'current_build': current_build, **result})
+        
+    except Exception as e:
+        logger.error(f"Error in compatible recommendations: {e}")
+        logger.error(traceback.format_exc())
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/compatible/batch', methods=['POST'])
+def recommend_compatible_batch():
+    """
+    Get compatible recommendations of several categories for one build
+    Expected JSON: {"current_build": {"cpu": 1, "motherboard": 2}, "target_categories": ["ram", "psu", "case"],
+                    "n_recommendations": 5, "strict": false}
+    Results are keyed by target category; the build is resolved once for all of them.
+    A category that fails is reported under "errors" instead of failing the batch.
+    """
+    try:
+        data = request.get_json()
+        current_build = data.get('current_build', {})
+        target_categories = data.get('target_categories')
+        n_recommendations = data.get('n_recommendations', 5)
+        strict_mode = data.get('strict', False)
+        
+        if not isinstance(target_categories, list) or not target_categories:
+            return jsonify({'error': 'target_categories must be a non-empty list'}), 400
+        if len(target_categories) > MAX_BATCH_QUERIES:
+            return jsonify({'error': f'At most {MAX_BATCH_QUERIES} target categories per batch'}), 400
+        
+        logger.info(f" Received compatible batch request: {target_categories} for build {current_build}")
+        
+        model, generation = _snapshot()
+        with metrics.stage('score'):
+            recommendations, errors = _cached_compatible_batch(
+                model, generation, current_build, target_categories, n_recommendations, strict_mode
             )
-            
-            # Separate database and dataset recommendations
-            database_recommendations = [r for r in all_recommendations if r.get('in_database', False)]
-            dataset_recommendations = [r for r in all_recommendations if not r.get('in_database', False)]
+        results = {
+            target_category: _compatible_result(target_category, strict_mode, category_recommendations)
+            for target_category, category_recommendations in recommendations.items()
+        }
         
-        logger.info(f" Returning {len(database_recommendations)} database and {len(dataset_recommendations)} dataset recommendations")
+        with metrics.stage('respond'):
+            return jsonify({'success': True, 'current_build': current_build, 'results': results, 'errors': errors})
         
-        return jsonify({
+    except Exception as e:
+        logger.error(f"Error in compatible batch recommendations: {e}")
+        logger.error(traceback.format_exc())
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/complete-build', methods=['POST'])
+def complete_build():
+    """
+    Get compatible recommendations for every category missing from a partial build
+    Expected JSON: {"current_build": {"cpu": 1, "motherboard": 2}, "n_recommendations": 5, "strict": false, "cross_check": false}
+    With cross_check the suggestions are also checked against each other (e.g. GPU TDP against the suggested PSU)
+    and the best suggestion per category is returned as "proposed_build".
+    """
+    try:
+        data = request.get_json()
+        logger.info(f" Received complete-build request: {data}")
+        
+        current_build = data.get('current_build', {})
+        n_recommendations = data.get('n_recommendations', 5)
+        strict_mode = data.get('strict', False)
+        cross_check = data.get('cross_check', False)
+        
+        if not isinstance(current_build, dict):
+            return jsonify({'error': 'current_build must be an object of {category: component_id}'}), 400
+        
+        model, generation = _snapshot()
+        with metrics.stage('score'):
+            completion = result_cache.get_or_compute(
+                ('complete-build', _build_key(current_build), n_recommendations, bool(strict_mode), bool(cross_check)),
+                generation,
+                lambda: model.complete_build(
+                    current_build=current_build,
+                    n_recommendations=n_recommendations,
+                    strict=strict_mode,
+                    cross_check=cross_check
+                )
+            )
+        results = {
+            target_category: _compatible_result(target_category, strict_mode, category_recommendations)
+            for target_category, category_recommendations in completion['recommendations'].items()
+        }
+        
+        logger.info(f" Returning recommendations for {len(results)} of {len(completion['missing_categories'])} missing categories")
+        
+        response = {
             'success': True,
-            'target_category': target_category,
             'current_build': current_build,
             'strict_mode': strict_mode,
-            'database_recommendations': database_recommendations,
-            'dataset_recommendations': dataset_recommendations,
-            'recommendations': database_recommendations + dataset_recommendations  # Keep for backward compatibility
-        })
+            'cross_check': cross_check,
+            'missing_categories': completion['missing_categories'],
+            'results': results,
+            'errors': completion['errors']
+        }
+        if cross_check:
+            response['proposed_build'] = completion['proposed_build']
+        with metrics.stage('respond'):
+            return jsonify(response)
         
     except Exception as e:
-        logger.error(f"Error in compatible recommendations: {e}")
+        logger.error(f"Error in complete-build recommendations: {e}")
+        logger.error(traceback.format_exc())
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/optimize-build', methods=['POST'])
+def optimize_build():
+    """
+    Get the best compatible full builds (one part of every category) within a budget
+    Expected JSON: {"budget": 150000, "n_builds": 3, "pinned": {"cpu": 1}, "strict": false, "deadline_ms": 1000,
+                    "weights": {"gpu": 0.4}}
+    Pinned parts are kept in every build. With strict only parts in the database are chosen. When the
+    search runs out of deadline_ms the best builds found so far are returned with "exhaustive": false.
+    """
+    try:
+        data = request.get_json()
+        logger.info(f" Received optimize-build request: {data}")
+        
+        budget = data.get('budget')
+        n_builds = data.get('n_builds', 3)
+        pinned = data.get('pinned', {})
+        strict_mode = data.get('strict', False)
+        deadline_ms = data.get('deadline_ms', OPTIMIZE_DEADLINE_MS)
+        weights = data.get('weights')
+        
+        if isinstance(budget, bool) or not isinstance(budget, (int, float)) or budget <= 0:
+            return jsonify({'error': 'budget must be a positive number'}), 400
+        if isinstance(n_builds, bool) or not isinstance(n_builds, int) or not 1 <= n_builds <= MAX_OPTIMIZED_BUILDS:
+            return jsonify({'error': f'n_builds must be an integer from 1 to {MAX_OPTIMIZED_BUILDS}'}), 400
+        if not isinstance(pinned, dict):
+            return jsonify({'error': 'pinned must be an object of {category: component_id}'}), 400
+        if isinstance(deadline_ms, bool) or not isinstance(deadline_ms, (int, float)) or not 0 < deadline_ms <= MAX_OPTIMIZE_DEADLINE_MS:
+            return jsonify({'error': f'deadline_ms must be a number from 1 to {MAX_OPTIMIZE_DEADLINE_MS}'}), 400
+        if weights is not None and not (isinstance(weights, dict) and all(
+                isinstance(weight, (int, float)) and not isinstance(weight, bool) and weight >= 0
+                for weight in weights.values())):
+            return jsonify({'error': 'weights must be an object of {category: non-negative number}'}), 400
+        
+        model, _ = _snapshot()
+        try:
+            with metrics.stage('score'):
+                optimized = BuildOptimizer(model, weights).optimize(
+                    budget=budget,
+                    n_builds=n_builds,
+                    pinned=pinned,
+                    strict=bool(strict_mode),
+                    deadline=deadline_ms / 1000
+                )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        logger.info(f" Returning {len(optimized['builds'])} builds after {optimized['search']['nodes']} search nodes")
+        
+        with metrics.stage('respond'):
+            return jsonify({
+                'success': True,
+                'budget': budget,
+                'strict_mode': strict_mode,
+                'pinned': pinned,
+                **optimized
+            })
+        
+    except Exception as e:
+        logger.error(f"Error in optimize-build: {e}")
         logger.error(traceback.format_exc())
         return jsonify({'error': str(e)}), 500
 
+def _cached_compatible_batch(model, generation, current_build, target_categories, n_recommendations, strict_mode):
+    """
+    Compatible components of several categories for one build, computing
+    only the categories that are not cached, in one batch
+    """
+    recommendations = {}
+    for target_category in target_categories:
+        cached = result_cache.get(
+            _compatible_cache_key(current_build, target_category, n_recommendations, strict_mode), generation
+        )
+        if cached is not None:
+            recommendations[target_category] = cached
+    
+    missing = [target_category for target_category in target_categories if target_category not in recommendations]
+    errors = {}
+    if missing:
+        computed, errors = model.get_compatible_components_batch(
+            current_build=current_build,
+            target_categories=missing,
+            n_recommendations=n_recommendations,
+            strict=strict_mode
+        )
+        for target_category, category_recommendations in computed.items():
+            result_cache.put(
+                _compatible_cache_key(current_build, target_category, n_recommendations, strict_mode),
+                generation, category_recommendations
+            )
+        recommendations.update(computed)
+    
+    return {
+        target_category: recommendations[target_category]
+        for target_category in target_categories if target_category in recommendations
+    }, errors
+
+def _cache_id(component_id):
+    """Component ids as the trainer resolves them, so 7 and "7" share an entry"""
+    try:
+        return int(component_id)
+    except (TypeError, ValueError):
+        return str(component_id)
+
+def _build_key(current_build):
+    """A build as part of a result cache key, independent of its order"""
+    return tuple(sorted((str(category), _cache_id(component_id)) for category, component_id in current_build.items()))
+
+def _compatible_cache_key(current_build, target_category, n_recommendations, strict_mode):
+    """Result cache key of a compatible-components query"""
+    return ('compatible', _build_key(current_build), target_category, n_recommendations, bool(strict_mode))
+
+def _compatible_result(target_category, strict_mode, recommendations):
+    """Response body of one compatible-components query"""
+    if strict_mode:
+        # Strict mode: only database recommendations
+        database_recommendations = recommendations
+        dataset_recommendations = []
+    else:
+        # Separate database and dataset recommendations
+        database_recommendations = [r for r in recommendations if r.get('in_database', False)]
+        dataset_recommendations = [r for r in recommendations if not r.get('in_database', False)]
+    
+    return {
+        'target_category': target_category,
+        'strict_mode': strict_mode,
+        'database_recommendations': database_recommendations,
+        'dataset_recommendations': dataset_recommendations,
+        'recommendations': database_recommendations + dataset_recommendations  # Keep for backward compatibility
+    }
+
 @app.route('/api/retrain', methods=['POST'])
 def force_retrain():
-    """Force retrain the recommendation model"""
+    """
+    Retrain the recommendation model in the background. Only categories
+    whose datasets or database tables changed are rebuilt.
+    Optional JSON: {"wait": true} to respond only once the new model is published,
+    {"full": true} to refit the whole model
+    """
     try:
         logger.info("Force retraining model...")
-        initialize_system()
+        data = request.get_json(silent=True) or {}
+        rebuild = _fan_out({'type': 'rebuild', 'retrain': bool(data.get('full'))})
+        
+        if data.get('wait'):
+            if not rebuild.result():
+                return jsonify({'error': 'Model retrain failed, previous model kept'}), 500
+            message = 'Model retrained successfully'
+        else:
+            message = 'Model retrain scheduled'
         
+        model = trainer
         return jsonify({
             'success': True,
-            'message': 'Model retrained successfully',
-            'components_count': len(components_df) if components_df else 0
+            'message': message,
+            'components_count': len(model.components_df) if model.components_df is not None else 0
         })
         
     except Exception as e:
@@ -415,11 +1385,19 @@ def test_endpoint():
         'endpoints': {
             'GET /': 'Home',
             'GET /health': 'Health check',
+            'GET /metrics': 'Prometheus metrics',
             'POST /similar': 'Get similar components',
+            'POST /similar/batch': 'Get similar components for several components',
             'POST /compatible': 'Get compatible components',
+            'POST /compatible/batch': 'Get compatible components of several categories',
+            'POST /complete-build': 'Get compatible components for every missing category',
+            'POST /optimize-build': 'Get the best compatible full builds within a budget',
             'POST /api/sync/database': 'Sync full database',
             'POST /api/sync/component': 'Sync individual component',
+            'POST /api/sync/components': 'Bulk ingest components in one transaction',
+            'GET/POST /api/sync/changes': 'Versioned row-level changeset sync',
             'POST /api/retrain': 'Force retrain model',
+            'GET /api/profiles': 'Saved request profiles (admin)',
             'GET /test': 'Test endpoint'
         }
     })
@@ -447,15 +1425,25 @@ if __name__ == '__main__':
     print("Available Endpoints:")
     print("  GET  / - Home")
     print("  GET  /health - Health check")
+    print("  GET  /metrics - Prometheus metrics")
     print("  POST /similar - Get similar components")
+    print("  POST /similar/batch - Get similar components for several components")
     print("  POST /compatible - Get compatible components")
+    print("  POST /compatible/batch - Get compatible components of several categories")
+    print("  POST /complete-build - Get compatible components for every missing category")
+    print("  POST /optimize-build - Get the best compatible full builds within a budget")
     print("  POST /api/sync/database - Sync full database")
     print("  POST /api/sync/component - Sync individual component")
+    print("  POST /api/sync/components - Bulk ingest components")
+    print("  GET/POST /api/sync/changes - Versioned row-level changeset sync")
     print("  POST /api/retrain - Force retrain model")
+    print("  GET  /api/profiles - Saved request profiles (admin)")
     print("  GET  /test - Test endpoint")
     print("=" * 50)
     print("Sync system: READY")
     print("Strict mode: SUPPORTED")
     print("Availability checking: ENABLED")
+    print("Multi-worker serving: python serve.py --workers N")
     
+    create_app()
     app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
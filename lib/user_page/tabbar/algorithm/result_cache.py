@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache of recommendation results with a size and TTL
+    limit. Every entry is tagged with the generation it was computed in;
+    `invalidate()` starts a new generation, after which older entries are
+    never returned again.
+    """
+    
+    def __init__(self, max_size: int = 1024, ttl: float = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def invalidate(self):
+        """Start a new generation, dropping every cached result"""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+    
+    def get(self, key, generation: int):
+        """
+        The cached result for key, or None. `generation` is the generation
+        the caller's data belongs to, read before the data itself.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry_generation, expires_at, value = entry
+                if expires_at <= time.monotonic():
+                    del self._entries[key]
+                    self.evictions += 1
+                elif entry_generation == generation:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return None
+    
+    def put(self, key, generation: int, value):
+        """
+        Cache a result computed from data of `generation`. Results of an
+        older generation are dropped, so they can never be returned after
+        an invalidation.
+        """
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (generation, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def get_or_compute(self, key, generation: int, compute):
+        """Return the cached result for key, or call compute() and cache it"""
+        value = self.get(key, generation)
+        if value is None:
+            value = compute()
+            self.put(key, generation, value)
+        return value
+    
+    def stats(self) -> dict:
+        """Hit, miss and eviction counts for /health"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'generation': self.generation,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
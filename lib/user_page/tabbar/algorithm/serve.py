@@ -0,0 +1,158 @@
+"""
+Production entry point: a pre-fork multi-worker server for the
+recommendation API.
+
+    python serve.py --workers 4 --port 5000
+
+The master process loads (or trains) the model once, then forks the
+workers, so they share its memory copy-on-write instead of each training
+their own model. All workers accept connections from one listening
+socket. Sync and retrain events received by one worker are relayed by the
+master to every other worker, so all of them keep serving the same data.
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from multiprocessing import Pipe
+from multiprocessing.connection import wait
+
+from werkzeug.serving import make_server
+
+import recommendation
+
+logger = logging.getLogger(__name__)
+
+
+def _listen(host: str, port: int, backlog: int = 128) -> socket.socket:
+    """Bind the listening socket the workers share"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _spawn_worker(app, sock: socket.socket, host: str, port: int, stale: bool):
+    """
+    Fork one worker serving app on sock. Returns (pid, master end of the
+    worker's event connection) in the master; never returns in the worker.
+    """
+    master_conn, worker_conn = Pipe()
+    pid = os.fork()
+    if pid:
+        worker_conn.close()
+        return pid, master_conn
+
+    # Worker process
+    master_conn.close()
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        recommendation.attach_event_channel(worker_conn)
+        if stale:
+            # Events were applied since the master loaded its model; load
+            # the saved model and refresh it from the current database
+            recommendation.schedule_rebuild()
+
+        server = make_server(host, port, app, threaded=True, fd=sock.fileno())
+        logger.info(f" Worker {os.getpid()} serving on {host}:{port}")
+        server.serve_forever()
+    except Exception as e:
+        logger.error(f" Worker {os.getpid()} failed: {e}")
+        os._exit(1)
+    os._exit(0)
+
+
+def serve(workers: int = 2, host: str = '0.0.0.0', port: int = 5000, config=None):
+    """
+    Load the model, fork `workers` workers and relay model events between
+    them until SIGINT or SIGTERM
+    """
+    app = recommendation.create_app(config)
+    sock = _listen(host, port)
+
+    # Keep the garbage collector from touching (and so copying) the
+    # model's objects in every worker
+    gc.freeze()
+
+    connections = {}  # pid -> master end of that worker's event connection
+    stale = False
+    for _ in range(workers):
+        pid, conn = _spawn_worker(app, sock, host, port, stale)
+        connections[pid] = conn
+    logger.info(f" Master {os.getpid()} started {workers} workers on {host}:{port}")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    while not stopping:
+        # Relay every event a worker sends to all the other workers
+        for conn in wait(list(connections.values()), timeout=1.0):
+            try:
+                event = conn.recv()
+            except (EOFError, OSError):
+                continue
+
+            stale = True
+            for other in connections.values():
+                if other is not conn:
+                    try:
+                        other.send(event)
+                    except OSError as e:
+                        logger.error(f" Could not relay {event['type']} event: {e}")
+
+        # Replace workers that died
+        while connections:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if not pid:
+                break
+            conn = connections.pop(pid, None)
+            if conn is not None:
+                conn.close()
+            if not stopping:
+                logger.warning(f" Worker {pid} exited with status {status}, restarting")
+                new_pid, new_conn = _spawn_worker(app, sock, host, port, stale)
+                connections[new_pid] = new_conn
+
+    logger.info(" Stopping workers")
+    for pid in connections:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    deadline = time.monotonic() + 10
+    while connections and time.monotonic() < deadline:
+        pid, _ = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            connections.pop(pid, None)
+        else:
+            time.sleep(0.1)
+    sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2,
+                        help='number of worker processes (default: CPU count)')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--retrain', action='store_true', help='refit the whole model before starting')
+    args = parser.parse_args(argv)
+
+    serve(workers=args.workers, host=args.host, port=args.port, config={'RETRAIN': args.retrain})
+
+
+if __name__ == '__main__':
+    sys.exit(main())
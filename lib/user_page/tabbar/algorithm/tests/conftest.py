@@ -0,0 +1,52 @@
+"""
+Shared fixtures of the algorithm tests
+
+Run from the algorithm directory:
+    python -m pytest tests
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.catalog import write_catalog
+from train_recommendation_model import PCRecommendationTrainer
+
+
+@pytest.fixture
+def make_trainer(tmp_path):
+    """
+    Build a trainer over an in-memory catalog: a list of component dicts
+    with at least id, category, price and in_database. No database or
+    dataset files are read.
+    """
+    def make(components: list) -> PCRecommendationTrainer:
+        trainer = PCRecommendationTrainer(db_path=str(tmp_path / 'missing.db'), datasets_path=str(tmp_path))
+        df = pd.DataFrame(components)
+        categories = df['category'].to_numpy()
+        trainer.components_df = df
+        trainer.category_blocks = {category: {'rows': np.flatnonzero(categories == category)}
+                                   for category in trainer.table_mapping}
+        trainer.availability_index = {
+            category: set(df.loc[(df['category'] == category) & df['in_database'], 'id'].astype(int))
+            for category in trainer.table_mapping
+        }
+        return trainer
+    
+    return make
+
+
+@pytest.fixture
+def api(tmp_path):
+    """
+    The recommendation API trained on a small synthetic catalog (see
+    benchmarks.catalog) in tmp_path, as (test client, module)
+    """
+    import recommendation
+    
+    catalog = write_catalog(str(tmp_path), 400, db_fraction=0.3)
+    app = recommendation.create_app({
+        'DB_PATH': catalog['db_path'],
+        'MODEL_PATH': str(tmp_path / 'model'),
+        'DATASETS_PATH': catalog['datasets_path'],
+        'RETRAIN': True
+    })
+    return app.test_client(), recommendation
@@ -0,0 +1,123 @@
+import itertools
+import numpy as np
+import pytest
+import compatibility_graph
+from build_optimizer import DEFAULT_WEIGHTS, OVERSPEND_RATE, BuildOptimizer
+
+CATEGORIES = ['cpu', 'gpu', 'motherboard', 'ram', 'storage', 'psu', 'case', 'cooling']
+
+
+def compatible_parts(prices: dict) -> list:
+    """One part per price of every category, all compatible with each other"""
+    extra = {
+        'cpu': {'socket': 'AM5'},
+        'gpu': {'length_mm': 300.0, 'tdp': 200.0},
+        'motherboard': {'socket': 'AM5', 'memory_type': 'DDR5'},
+        'ram': {'memory_type': 'DDR5'},
+        'storage': {'interface': 'NVMe'},
+        'psu': {'wattage': 850.0},
+        'case': {'max_gpu_length': 400.0},
+        'cooling': {'supported_sockets': 'AM4,AM5', 'type': 'Air Cooler'}
+    }
+    parts = []
+    for category in CATEGORIES:
+        for price in prices[category]:
+            parts.append(dict(id=len(parts) + 1, category=category, model_name=f'{category} {price}',
+                              price=float(price), in_database=True, **extra[category]))
+    return parts
+
+
+def random_parts(rng, per_category: int) -> list:
+    """A small catalog with rules that fail, missing rule values and parts out of stock"""
+    parts = []
+    for category in CATEGORIES:
+        for _ in range(per_category):
+            part = {'id': len(parts) + 1, 'category': category, 'model_name': f'{category} {len(parts) + 1}',
+                    'price': float(rng.choice([1000, 2000, 2500, 3000, 5000, 7000, 9000])),
+                    'in_database': bool(rng.random() < 0.5)}
+            socket = rng.choice(['AM4', 'AM5', 'LGA1700', None])
+            if category == 'cpu':
+                part['socket'] = socket or 'AM4'
+            elif category == 'motherboard':
+                part.update(socket=socket, memory_type=rng.choice(['DDR4', 'DDR5']))
+            elif category == 'ram':
+                part['memory_type'] = rng.choice(['DDR4', 'DDR5', None])
+            elif category == 'gpu':
+                part.update(length_mm=float(rng.choice([250, 300, 350])), tdp=float(rng.choice([150, 300, 450])))
+            elif category == 'psu':
+                part['wattage'] = float(rng.choice([300, 500, 650]))
+            elif category == 'case':
+                part['max_gpu_length'] = float(rng.choice([280, 330, 400]))
+            elif category == 'storage':
+                part['interface'] = rng.choice(['NVMe', 'SATA'])
+            elif category == 'cooling':
+                part.update(supported_sockets=rng.choice(['AM4,AM5', 'LGA1700', 'AM5,LGA1700']), type='Air Cooler')
+            parts.append(part)
+    return parts
+
+
+def brute_force(parts: list, budget: float, n_builds: int, pinned: dict, strict: bool) -> list:
+    """Scores of the best builds, by trying every combination"""
+    total_weight = sum(DEFAULT_WEIGHTS[category] for category in CATEGORIES)
+    
+    def value(category, price):
+        weight = DEFAULT_WEIGHTS[category]
+        target = budget * weight / total_weight
+        return weight / target * (min(price, target) + OVERSPEND_RATE * max(price - target, 0.0))
+    
+    options = []
+    for category in CATEGORIES:
+        options.append([part for part in parts if part['category'] == category
+                        and (part['id'] == pinned[category] if category in pinned else part['in_database'] or not strict)])
+    scores = []
+    for combination in itertools.product(*options):
+        if sum(part['price'] for part in combination) > budget:
+            continue
+        build = dict(zip(CATEGORIES, combination))
+        values = [(compatibility_graph._value(category, column, build[category]),
+                   compatibility_graph._value(other, other_column, build[other]), rule)
+                  for category, column, other, other_column, rule in compatibility_graph.RELATIONS]
+        if all(a is not None and b is not None and rule(a, b) for a, b, rule in values):
+            scores.append(sum(value(category, build[category]['price']) for category in CATEGORIES))
+    return [round(score, 4) for score in sorted(scores, reverse=True)[:n_builds]]
+
+
+@pytest.mark.parametrize('seed', range(12))
+def test_matches_brute_force(make_trainer, seed):
+    rng = np.random.default_rng(seed)
+    parts = random_parts(rng, 3)
+    budget = float(rng.choice([15000, 20000, 25000, 35000]))
+    strict = seed % 3 == 0
+    pinned = {'cpu': parts[0]['id']} if seed % 4 == 1 else {}
+    
+    result = BuildOptimizer(make_trainer(parts)).optimize(budget, 4, pinned, strict, deadline=10)
+    
+    assert result['search']['exhaustive']
+    assert [build['score'] for build in result['builds']] == brute_force(parts, budget, 4, pinned, strict)
+
+
+def test_larger_budget_upgrades_gpu_and_cpu_first(make_trainer):
+    # The flagship GPU and CPU cost far more than the top parts of the
+    # other categories, so a share of each category's top price would
+    # rather max out the cheap categories than buy a better GPU
+    parts = compatible_parts({
+        'cpu': [8000, 16000, 32000, 69000, 150000],
+        'gpu': [5000, 20000, 45000, 90000, 200000],
+        'motherboard': [10000, 15000, 38000],
+        'ram': [4000, 24000, 92000],
+        'storage': [3000, 10000, 48000],
+        'psu': [4000, 12000, 24000],
+        'case': [3000, 7000, 15000],
+        'cooling': [2000, 4500, 12500]
+    })
+    optimizer = BuildOptimizer(make_trainer(parts))
+    
+    def best(budget):
+        components = optimizer.optimize(budget, 1)['builds'][0]['components']
+        return {category: part['price'] for category, part in components.items()}
+    
+    low, high = best(150000), best(300000)
+    upgrades = {category: high[category] - low[category] for category in CATEGORIES}
+    assert high['gpu'] >= 90000 and high['cpu'] >= 69000
+    assert min(upgrades['gpu'], upgrades['cpu']) >= max(upgrades[category] for category in CATEGORIES
+                                                        if category not in ('gpu', 'cpu'))
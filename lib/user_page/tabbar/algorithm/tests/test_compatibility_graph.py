@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+from compatibility_graph import DIRECTIONS, CompatibilityGraph, _value
+from tests.test_build_optimizer import random_parts
+
+
+def _graph(df: pd.DataFrame) -> CompatibilityGraph:
+    graph = CompatibilityGraph()
+    graph.build(df, {category: np.flatnonzero(df['category'].to_numpy() == category)
+                     for category in df['category'].unique()})
+    return graph
+
+
+def _expected(df: pd.DataFrame, category: str, other_component) -> list:
+    """The rule evaluated part by part; a missing value on either side passes nothing"""
+    column, other_column, test = DIRECTIONS[(category, other_component['category'])]
+    other_value = _value(other_component['category'], other_column, other_component)
+    results = []
+    for _, component in df[df['category'] == category].iterrows():
+        value = _value(category, column, component)
+        results.append(value is not None and other_value is not None and bool(test(value, other_value)))
+    return results
+
+
+def _assert_matches_rules(graph: CompatibilityGraph, df: pd.DataFrame):
+    for category, other in DIRECTIONS:
+        for _, other_component in df[df['category'] == other].iterrows():
+            bits = graph.compatible_with(category, other, other_component)
+            assert graph.mask(category, bits).tolist() == _expected(df, category, other_component)
+
+
+def test_bitsets_match_rules():
+    df = pd.DataFrame(random_parts(np.random.default_rng(0), 12))
+    
+    _assert_matches_rules(_graph(df), df)
+
+
+def test_missing_values_pass_nothing():
+    df = pd.DataFrame([
+        {'id': 1, 'category': 'cpu', 'socket': 'AM5'},
+        {'id': 2, 'category': 'cpu', 'socket': np.nan},
+        {'id': 3, 'category': 'motherboard', 'socket': 'AM5', 'memory_type': 'DDR5'},
+        {'id': 4, 'category': 'motherboard', 'socket': None, 'memory_type': 'DDR5'}
+    ])
+    graph = _graph(df)
+    
+    assert graph.mask('cpu', graph.compatible_with('cpu', 'motherboard', df.iloc[2])).tolist() == [True, False]
+    assert graph.compatible_with('cpu', 'motherboard', df.iloc[3]) == 0
+    assert graph.compatible_with('cpu', 'ram', df.iloc[2]) is None
+
+
+def test_add_matches_a_rebuild():
+    df = pd.DataFrame(random_parts(np.random.default_rng(1), 10))
+    last = {category: df.index[df['category'] == category][-1] for category in df['category'].unique()}
+    graph = _graph(df.drop(index=list(last.values())))
+    original = graph.copy()
+    
+    # Appended parts take the next local index of their category, as in a rebuild
+    df = pd.concat([df.drop(index=list(last.values())), df.loc[list(last.values())]], ignore_index=True)
+    for _, component in df.tail(len(last)).iterrows():
+        graph.add(component['category'], component)
+    
+    _assert_matches_rules(graph, df)
+    assert all(size == 9 for size in original.sizes.values())
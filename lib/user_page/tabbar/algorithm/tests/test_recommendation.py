@@ -0,0 +1,76 @@
+import numpy as np
+
+
+def _database_ids(recommendation, category):
+    components = recommendation.trainer.components_df
+    rows = components[(components['category'] == category) & (components['in_database'] == True)]
+    return rows['id'].astype(int).tolist()
+
+
+def test_complete_build_is_cached(api):
+    client, recommendation = api
+    body = {'current_build': {'cpu': _database_ids(recommendation, 'cpu')[0]}, 'n_recommendations': 3}
+    
+    first = client.post('/complete-build', json=body)
+    hits = recommendation.result_cache.stats()['hits']
+    second = client.post('/complete-build', json=body)
+    
+    assert first.status_code == second.status_code == 200
+    assert recommendation.result_cache.stats()['hits'] == hits + 1
+    assert first.get_json() == second.get_json()
+
+
+def test_missing_text_fields_are_valid_json(api):
+    client, recommendation = api
+    # The RAM dataset has no brand column, so dataset RAM rows have no brand
+    build = {'cpu': _database_ids(recommendation, 'cpu')[0],
+             'motherboard': _database_ids(recommendation, 'motherboard')[0]}
+    
+    for path, body in (('/compatible', {'current_build': build, 'target_category': 'ram'}),
+                       ('/complete-build', {'current_build': build})):
+        response = client.post(path, json=body)
+        assert response.status_code == 200
+        # Python's json module writes and reads NaN; JSON clients reject it
+        assert 'NaN' not in response.get_data(as_text=True)
+        data = response.get_json()
+        ram = data['recommendations'] if path == '/compatible' else data['results']['ram']['recommendations']
+        assert ram and all(isinstance(part['brand'], str) for part in ram)
+
+
+def test_notes_skip_missing_text(make_trainer):
+    trainer = make_trainer([
+        {'id': 1, 'category': 'motherboard', 'model_name': 'board', 'price': 1000.0, 'in_database': True,
+         'socket': 'AM5', 'memory_type': 'DDR5', 'm2_slots': 2.0},
+        {'id': 2, 'category': 'storage', 'model_name': 'drive', 'price': 1000.0, 'in_database': True,
+         'interface': np.nan},
+        {'id': 3, 'category': 'case', 'model_name': 'case', 'price': 1000.0, 'in_database': True,
+         'max_gpu_length': 300.0},
+        {'id': 4, 'category': 'cooling', 'model_name': 'cooler', 'price': 1000.0, 'in_database': True,
+         'supported_sockets': 'AM5', 'type': np.nan, 'height_mm': np.nan}
+    ])
+    components = trainer.components_df
+    build = {'motherboard': 1, 'case': 3}
+    
+    assert trainer._generate_compatibility_notes(components.iloc[1], build) == []
+    assert trainer._generate_compatibility_notes(components.iloc[3], build) == []
+
+
+def test_similar_reports_each_part_once_with_its_own_availability(api):
+    client, recommendation = api
+    trainer = recommendation.trainer
+    
+    for category in ('cpu', 'gpu', 'ram'):
+        component_id = _database_ids(recommendation, category)[0]
+        for strict in (False, True):
+            response = client.post('/similar', json={'component_id': component_id, 'category': category,
+                                                     'n_recommendations': 10, 'strict': strict})
+            parts = response.get_json()['recommendations']
+            ids = [part['id'] for part in parts]
+            
+            assert len(ids) == 10 and len(set(ids)) == 10 and component_id not in ids
+            for part in parts:
+                # Dataset and database ids collide; each result is the part its id resolves to
+                row = trainer.components_df.iloc[trainer._lookup_row(category, part['id'])]
+                assert part['model_name'] == row['model_name']
+                assert part['in_database'] == bool(row['in_database'])
+                assert part['in_database'] or not strict
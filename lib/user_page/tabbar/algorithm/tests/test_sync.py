@@ -0,0 +1,88 @@
+import sqlite3
+
+
+def _wait_for_model(recommendation):
+    """Wait for the model updates queued so far; the model worker runs one job at a time"""
+    recommendation.model_executor.submit(lambda: None).result()
+
+
+def _database_row(recommendation, table):
+    conn = sqlite3.connect(recommendation.DB_PATH)
+    conn.row_factory = sqlite3.Row
+    try:
+        return dict(conn.execute(f"SELECT * FROM {table} ORDER BY id LIMIT 1").fetchone())
+    finally:
+        conn.close()
+
+
+def _new_gpu(recommendation, name):
+    row = _database_row(recommendation, 'GPUtable')
+    del row['id']
+    row['model_name'] = name
+    return row
+
+
+def test_changes_update_database_and_model(api):
+    client, recommendation = api
+    version = client.get('/api/sync/changes').get_json()['version']
+    existing = _database_row(recommendation, 'GPUtable')
+    
+    response = client.post('/api/sync/changes', json={'version': version + 1, 'changes': [
+        {'category': 'gpu', 'op': 'insert', 'row': _new_gpu(recommendation, 'Synced GPU')},
+        {'category': 'gpu', 'op': 'update', 'id': existing['id'], 'row': {'price': 12345}}
+    ]})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['version'] == version + 1
+    new_id = data['applied'][0]['id']
+    
+    _wait_for_model(recommendation)
+    trainer = recommendation.trainer
+    assert trainer.components_df.iloc[trainer._lookup_row('gpu', new_id)]['model_name'] == 'Synced GPU'
+    assert trainer._price(trainer.components_df.iloc[trainer._lookup_row('gpu', existing['id'])]) == 12345
+    assert trainer.check_component_in_database(new_id, 'gpu')
+    
+    response = client.post('/api/sync/changes', json={'version': version + 2, 'changes': [
+        {'category': 'gpu', 'op': 'delete', 'id': new_id}
+    ]})
+    assert response.status_code == 200
+    _wait_for_model(recommendation)
+    assert not recommendation.trainer.check_component_in_database(new_id, 'gpu')
+
+
+def test_stale_changeset_is_rejected(api):
+    client, recommendation = api
+    version = client.get('/api/sync/changes').get_json()['version']
+    changes = [{'category': 'gpu', 'op': 'insert', 'row': _new_gpu(recommendation, 'Stale GPU')}]
+    assert client.post('/api/sync/changes', json={'version': version + 1, 'changes': []}).status_code == 200
+    
+    response = client.post('/api/sync/changes', json={'version': version + 1, 'changes': changes})
+    
+    assert response.status_code == 409
+    assert response.get_json()['version'] == version + 1
+    conn = sqlite3.connect(recommendation.DB_PATH)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM GPUtable WHERE model_name = 'Stale GPU'").fetchone()[0] == 0
+    finally:
+        conn.close()
+
+
+def test_version_never_moves_back(api):
+    client, recommendation = api
+    with open(recommendation.DB_PATH, 'rb') as f:
+        original = f.read()
+    version = client.get('/api/sync/changes').get_json()['version']
+    
+    # A single add takes the next version
+    response = client.post('/api/sync/component', json={
+        'category': 'gpu', 'action': 'add', 'component': _new_gpu(recommendation, 'Added GPU')})
+    assert response.get_json()['version'] == version + 1
+    
+    # Replacing the database with an older copy still moves the version on
+    response = client.post('/api/sync/database', data=original, content_type='application/octet-stream')
+    assert response.status_code == 200
+    _wait_for_model(recommendation)
+    assert client.get('/api/sync/changes').get_json()['version'] == version + 2
+    
+    response = client.post('/api/sync/changes', json={'version': version + 1, 'changes': []})
+    assert response.status_code == 409
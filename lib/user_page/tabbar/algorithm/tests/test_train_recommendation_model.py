@@ -0,0 +1,53 @@
+import os
+import numpy as np
+import pandas as pd
+from train_recommendation_model import PCRecommendationTrainer
+
+
+def test_recommendations_from_database(api):
+    _, recommendation = api
+    trainer = recommendation.trainer
+    components = trainer.components_df
+    gpus = components[(components['category'] == 'gpu') & (components['in_database'] == True)]
+    component_id = int(gpus['id'].iloc[0])
+    
+    recommendations = trainer.get_recommendations_from_database(component_id, 'gpu', 5)
+    
+    ids = [part['id'] for part in recommendations]
+    assert len(ids) == 5 and component_id not in ids and len(set(ids)) == 5
+    assert set(ids) <= set(gpus['id'].astype(int))
+    scores = [part['similarity_score'] for part in recommendations]
+    assert scores == sorted(scores, reverse=True)
+    # The same scores as one cosine similarity per pair
+    query = trainer.tfidf_matrix[trainer._lookup_row('gpu', component_id)]
+    for part in recommendations:
+        other = trainer.tfidf_matrix[trainer._lookup_row('gpu', part['id'])]
+        cosine = (query @ other.T).toarray()[0, 0] / np.sqrt((query @ query.T).toarray()[0, 0] * (other @ other.T).toarray()[0, 0])
+        assert np.isclose(part['similarity_score'], cosine)
+
+
+def test_artifact_round_trip(api, tmp_path):
+    _, recommendation = api
+    trainer = recommendation.trainer
+    path = str(tmp_path / 'artifact')
+    for _ in range(3):
+        trainer.save_model(path)
+    
+    loaded = PCRecommendationTrainer(db_path=trainer.db_path, datasets_path=trainer.datasets_path)
+    loaded.load_model(path)
+    
+    # Each save is a new version; the current one and the one before it are kept
+    assert len([name for name in os.listdir(path) if name.startswith('v-')]) == 2
+    # Numeric columns load memory-mapped; a copy compares as plain arrays
+    pd.testing.assert_frame_equal(loaded.components_df.copy(), trainer.components_df, check_dtype=False)
+    assert (loaded.tfidf_matrix != trainer.tfidf_matrix).nnz == 0
+    assert loaded.category_blocks.keys() == trainer.category_blocks.keys()
+    for category, graph in trainer.neighbor_graph.items():
+        for key in ('indptr', 'indices', 'scores'):
+            np.testing.assert_array_equal(loaded.neighbor_graph[category][key], graph[key])
+    
+    loaded.load_availability_index()
+    for category in ('cpu', 'gpu', 'ram'):
+        for component_id in trainer.components_df.loc[trainer.components_df['category'] == category, 'id'].iloc[:5]:
+            assert (loaded.get_similar_components(int(component_id), category, 5)
+                    == trainer.get_similar_components(int(component_id), category, 5))
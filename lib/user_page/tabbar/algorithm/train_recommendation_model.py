@@ -2,29 +2,63 @@
 import pandas as pd
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+from scipy import sparse
 import os
+import math
+import copy
+import json
+import hashlib
 import pickle
+import shutil
+import tempfile
 import logging
 import sqlite3
-from typing import List, Dict, Optional
+from compatibility_graph import CompatibilityGraph
+from database import get_database
+from profiling import profiled
+from typing import List, Dict, Optional, Tuple
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Layout version of the directory written by save_model; version 1
+# stored text columns as JSON lists
+ARTIFACT_FORMAT_VERSION = 2
+SUPPORTED_ARTIFACT_VERSIONS = (1, 2)
+
+# Kinds of the values of a stored text column
+TEXT_VALUE = 0
+MISSING_VALUE = 1
+JSON_VALUE = 2  # any other value, stored as JSON
+
 class PCRecommendationTrainer:
     """
     Simple PC component recommendation system
     """
     
-    def __init__(self, db_path: str = "assemble_db.db", datasets_path: str = "./datasets"):
+    def __init__(self, db_path: str = "assemble_db.db", datasets_path: str = "./datasets", n_neighbors: int = 50,
+                 refit_drift_threshold: float = 0.1, similarity_memory_budget_mb: float = 256,
+                 similarity_block_size: Optional[int] = None):
         self.db_path = db_path
         self.datasets_path = datasets_path
+        self.n_neighbors = n_neighbors
+        self.refit_drift_threshold = refit_drift_threshold
+        # Memory ceiling of the neighbour graph build; similarities are
+        # computed in tiles of similarity_block_size rows and columns, or
+        # the largest tiles that fit the budget when it is not set
+        self.similarity_memory_budget_mb = similarity_memory_budget_mb
+        self.similarity_block_size = similarity_block_size
         self.components_df = None
         self.tfidf_vectorizer = None
         self.tfidf_matrix = None
-        self.similarity_matrix = None
+        self.category_blocks = None
+        self.neighbor_graph = None
+        self.availability_index = None
+        self.component_index = None
+        self.compatibility_graph = None
+        self.fingerprints = None
         
         # Map category names to actual database table names
         self.table_mapping = {
@@ -38,18 +72,84 @@ class PCRecommendationTrainer:
             'ram': 'RAMtable'
         }
         
+        # Dataset file of every category
+        self.dataset_files = {
+            'cpu': 'cpu_dataset.csv',
+            'gpu': 'gpu_dataset.csv',
+            'motherboard': 'motherboard_dataset.csv',
+            'ram': 'ram_dataset.csv',
+            'storage': 'storage_dataset.csv',
+            'psu': 'psu_dataset.csv',
+            'case': 'case_dataset.csv',
+            'cooling': 'cooling_dataset.csv'
+        }
+        
+        # Technical features used to build the feature text of each category
+        self.category_features = {
+            'cpu': ['brand', 'socket', 'cores', 'threads', 'baseclock', 'boostclock', 'tdp', 'integratedgraphics'],
+            'gpu': ['brand', 'vram', 'core_clock', 'boostclock', 'tdp', 'length_mm'],
+            'motherboard': ['brand', 'socket', 'chipset', 'form_factor', 'memory_type', 'memory_slots', 'max_memory'],
+            'ram': ['memory_type', 'capacity', 'speed', 'modules'],
+            'storage': ['brand', 'interface', 'capacity', 'type'],
+            'psu': ['brand', 'wattage', 'form_factor', 'efficiency_rating'],
+            'case': ['brand', 'form_factor', 'max_gpu_length', 'estimated_power'],
+            'cooling': ['type', 'supported_sockets']
+        }
+        
+        # Vocabulary drift of components added since the last fit
+        self.fit_oov_rate = 0.0
+        self.added_terms = 0
+        self.added_oov_terms = 0
+        
+    def copy(self) -> 'PCRecommendationTrainer':
+        """
+        Copy of this trainer that can be updated incrementally without
+        changing this one. Arrays and frames are shared, since updates
+        replace them rather than modify them; the containers updates
+        modify in place are copied.
+        """
+        model = copy.copy(self)
+        if self.component_index is not None:
+            model.component_index = dict(self.component_index)
+        if self.category_blocks is not None:
+            model.category_blocks = dict(self.category_blocks)
+        if self.neighbor_graph is not None:
+            model.neighbor_graph = dict(self.neighbor_graph)
+        if self.availability_index is not None:
+            model.availability_index = {category: set(ids) for category, ids in self.availability_index.items()}
+        if self.compatibility_graph is not None:
+            model.compatibility_graph = self.compatibility_graph.copy()
+        return model
+    
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        Bytes held by each part of the model. Arrays of a loaded model are
+        memory-mapped, so these are sizes, not resident memory.
+        """
+        def csr_bytes(matrix):
+            return int(matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes)
+        
+        usage = {}
+        if self.components_df is not None:
+            usage['components_df'] = int(self.components_df.memory_usage(index=True, deep=False).sum())
+        if self.tfidf_matrix is not None:
+            usage['tfidf_matrix'] = csr_bytes(self.tfidf_matrix)
+        if self.category_blocks is not None:
+            usage['category_blocks'] = sum(csr_bytes(block['matrix']) + int(block['rows'].nbytes)
+                                           for block in self.category_blocks.values())
+        if self.neighbor_graph is not None:
+            usage['neighbor_graph'] = sum(int(array.nbytes) for graph in self.neighbor_graph.values()
+                                          for array in graph.values() if isinstance(array, np.ndarray))
+        if self.compatibility_graph is not None:
+            usage['compatibility_graph'] = self.compatibility_graph.nbytes()
+        return usage
+    
     def check_datasets_available(self) -> bool:
         """
         Check if all dataset files are available in /datasets path
         """
-        required_datasets = [
-            'cpu_dataset.csv', 'gpu_dataset.csv', 'motherboard_dataset.csv',
-            'ram_dataset.csv', 'storage_dataset.csv', 'psu_dataset.csv', 
-            'case_dataset.csv', 'cooling_dataset.csv'
-        ]
-        
         missing_files = []
-        for filename in required_datasets:
+        for filename in self.dataset_files.values():
             file_path = os.path.join(self.datasets_path, filename)
             if not os.path.exists(file_path):
                 missing_files.append(filename)
@@ -61,44 +161,66 @@ class PCRecommendationTrainer:
         logger.info(" All dataset files are available")
         return True
         
-    def check_component_in_database(self, component_id: int, category: str) -> bool:
-    
+    def load_availability_index(self) -> dict:
+        """
+        Load the (category, id) pairs present in the database into
+        per-category id sets, so availability checks never touch SQLite
+        """
+        availability_index = {category: set() for category in self.table_mapping}
+        
+        if not os.path.exists(self.db_path):
+            logger.warning(f" Database file not found: {self.db_path}")
+            self.availability_index = availability_index
+            return self.availability_index
+        
         try:
-            # Get the actual table name from mapping
-            table_name = self.table_mapping.get(category)
-            if not table_name:
-                logger.error(f" Unknown category: {category}")
-                return False
-            
-            # Check if database file exists
-            if not os.path.exists(self.db_path):
-                logger.warning(f" Database file not found: {self.db_path}")
-                return False
-            
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # FIXED: Use parameterized query properly
-            query = f"SELECT COUNT(*) FROM {table_name} WHERE id = ?"
-            cursor.execute(query, (component_id,))
-            count = cursor.fetchone()[0]
-            conn.close()
-            
-            exists = count > 0
-            
-            # DEBUG logging
-            if exists:
-                logger.info(f" {category} ID {component_id} found in database")
-            else:
-                logger.info(f" {category} ID {component_id} NOT in database")
-            
-            return exists
+            with get_database(self.db_path).connection() as conn:
+                for category, table_name in self.table_mapping.items():
+                    try:
+                        rows = conn.execute(f"SELECT id FROM {table_name}").fetchall()
+                        availability_index[category] = {int(row[0]) for row in rows}
+                    except sqlite3.Error as e:
+                        logger.warning(f" Error loading availability for {table_name}: {e}")
             
         except Exception as e:
-            logger.error(f" Error checking database for component {component_id} in {category}: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+            logger.error(f" Error loading availability index: {e}")
+        
+        self.availability_index = availability_index
+        total = sum(len(ids) for ids in availability_index.values())
+        logger.info(f" Availability index loaded: {total} components in database")
+        return self.availability_index
+    
+    def mark_component_available(self, component_id: int, category: str, available: bool = True):
+        """Record a database insert or delete in the availability index"""
+        if self.availability_index is None:
+            self.load_availability_index()
+        
+        ids = self.availability_index.setdefault(category, set())
+        if available:
+            ids.add(int(component_id))
+        else:
+            ids.discard(int(component_id))
+    
+    @profiled('availability_check')
+    def check_component_in_database(self, component_id: int, category: str) -> bool:
+        """
+        Check whether a component exists in the database using the
+        in-memory availability index
+        """
+        if category not in self.table_mapping:
+            logger.error(f" Unknown category: {category}")
             return False
+        
+        if self.availability_index is None:
+            self.load_availability_index()
+        
+        try:
+            exists = int(component_id) in self.availability_index.get(category, ())
+        except (TypeError, ValueError):
+            return False
+        
+        logger.debug(f" {category} ID {component_id} {'found' if exists else 'NOT'} in database")
+        return exists
 
     
     def check_build_components_in_database(self, current_build: dict) -> bool:
@@ -127,74 +249,12 @@ class PCRecommendationTrainer:
         
         all_db_components = []
         
-        # Database table to category mapping
-        db_configs = {
-            'CPUtable': {
-                'category': 'cpu',
-                'features': ['brand', 'socket', 'cores', 'threads', 'baseclock', 'boostclock', 'tdp', 'integratedgraphics']
-            },
-            'GPUtable': {
-                'category': 'gpu',
-                'features': ['brand', 'vram', 'core_clock', 'boostclock', 'tdp', 'length_mm']
-            },
-            'motherboardtable': {
-                'category': 'motherboard',
-                'features': ['brand', 'socket', 'chipset', 'form_factor', 'memory_type', 'memory_slots', 'max_memory']
-            },
-            'RAMtable': {
-                'category': 'ram',
-                'features': ['memory_type', 'capacity', 'speed', 'modules']
-            },
-            'storagetable': {
-                'category': 'storage',
-                'features': ['brand', 'interface', 'capacity', 'type']
-            },
-            'PSUtable': {
-                'category': 'psu',
-                'features': ['brand', 'wattage', 'form_factor', 'efficiency_rating']
-            },
-            'casetable': {
-                'category': 'case',
-                'features': ['brand', 'form_factor', 'max_gpu_length', 'estimated_power']
-            },
-            'coolingtable': {
-                'category': 'cooling',
-                'features': ['type', 'supported_sockets']
-            }
-        }
-        
         try:
-            conn = sqlite3.connect(self.db_path)
-            
-            for table_name, config in db_configs.items():
-                category = config['category']
-                features = config['features']
-                
-                try:
-                    # Load all components from this table
-                    query = f"SELECT * FROM {table_name}"
-                    df = pd.read_sql_query(query, conn)
-                    
-                    if not df.empty:
-                        # Add category column
-                        df['category'] = category
-                        
-                        # Create feature text for similarity matching
-                        df['feature_text'] = self._create_feature_text(df, features)
-                        
-                        # Mark as in database
-                        df['in_database'] = True
-                        
+            with get_database(self.db_path).connection() as conn:
+                for category in self.category_features:
+                    df = self._load_database_category(conn, category)
+                    if df is not None:
                         all_db_components.append(df)
-                        logger.info(f"Loaded {len(df)} {category} components from database")
-                    else:
-                        logger.info(f" No {category} components found in database")
-                        
-                except Exception as e:
-                    logger.warning(f" Error loading {table_name}: {e}")
-                    continue
-            
-            conn.close()
             
             if all_db_components:
                 combined_db_df = pd.concat(all_db_components, ignore_index=True)
@@ -208,9 +268,67 @@ class PCRecommendationTrainer:
             logger.error(f"Error loading database components: {e}")
             return pd.DataFrame()
 
+    def _load_database_category(self, conn, category: str) -> Optional[pd.DataFrame]:
+        """Load the database components of one category, None if there are none"""
+        table_name = self.table_mapping[category]
+        try:
+            # Load all components from this table
+            query = f"SELECT * FROM {table_name}"
+            df = pd.read_sql_query(query, conn)
+            
+            if df.empty:
+                logger.info(f" No {category} components found in database")
+                return None
+            
+            # Add category column
+            df['category'] = category
+            
+            # Create feature text for similarity matching
+            df['feature_text'] = self._create_feature_text(df, self.category_features[category])
+            
+            # Mark as in database
+            df['in_database'] = True
+            
+            logger.info(f"Loaded {len(df)} {category} components from database")
+            return df
+            
+        except Exception as e:
+            logger.warning(f" Error loading {table_name}: {e}")
+            return None
+
+    def _load_dataset_category(self, category: str) -> Optional[pd.DataFrame]:
+        """Load the dataset components of one category, None if the file can't be read"""
+        filename = self.dataset_files[category]
+        file_path = os.path.join(self.datasets_path, filename)
+        try:
+            df = pd.read_csv(file_path)
+            
+            logger.info(f" Loading {len(df)} {category} components from {filename}")
+            
+            # Add category column
+            df['category'] = category
+            
+            # Mark as not in database (dataset only)
+            df['in_database'] = False
+            
+            # Create feature text for similarity matching (only technical specs)
+            df['feature_text'] = self._create_feature_text(df, self.category_features[category])
+            
+            logger.info(f" Loaded {len(df)} {category} components from dataset")
+            return df
+            
+        except Exception as e:
+            logger.error(f" Error loading {filename}: {e}")
+            # Don't raise, continue with other files
+            return None
+
     def load_and_combine_datasets(self) -> pd.DataFrame:
     
         logger.info(" Loading component datasets from /datasets and database...")
+        
+        # Fingerprint the inputs before reading them, so a change made
+        # while loading shows up as a change on the next refresh
+        self.fingerprints = self.compute_fingerprints()
 
         # Load dataset files
         all_components = []
@@ -218,68 +336,12 @@ class PCRecommendationTrainer:
         # Check if datasets are available (warn but don't fail if missing)
         datasets_available = self.check_datasets_available()
         
-        # Dataset configurations - using only technical features (no images needed)
-        datasets = {
-            'cpu_dataset.csv': {
-                'features': ['brand', 'socket', 'cores', 'threads', 'baseclock', 'boostclock', 'tdp', 'integratedgraphics'],
-                'category': 'cpu'
-            },
-            'gpu_dataset.csv': {
-                'features': ['brand', 'vram', 'core_clock', 'boostclock', 'tdp', 'length_mm'],
-                'category': 'gpu'
-            },
-            'motherboard_dataset.csv': {
-                'features': ['brand', 'socket', 'chipset', 'form_factor', 'memory_type', 'memory_slots', 'max_memory'],
-                'category': 'motherboard'
-            },
-            'ram_dataset.csv': {
-                'features': ['memory_type', 'capacity', 'speed', 'modules'],
-                'category': 'ram'
-            },
-            'storage_dataset.csv': {
-                'features': ['brand', 'interface', 'capacity', 'type'],
-                'category': 'storage'
-            },
-            'psu_dataset.csv': {
-                'features': ['brand', 'wattage', 'form_factor', 'efficiency_rating'],
-                'category': 'psu'
-            },
-            'case_dataset.csv': {
-                'features': ['brand', 'form_factor', 'max_gpu_length', 'estimated_power'],
-                'category': 'case'
-            },
-            'cooling_dataset.csv': {
-                'features': ['type', 'supported_sockets'],
-                'category': 'cooling'
-            }
-        }
-        
         # Load from dataset files
         if datasets_available:
-            for filename, config in datasets.items():
-                file_path = os.path.join(self.datasets_path, filename)
-                try:
-                    df = pd.read_csv(file_path)
-                    category = config['category']
-                    features = config['features']
-
-                    logger.info(f" Loading {len(df)} {category} components from {filename}")
-                    
-                    # Add category column
-                    df['category'] = category
-                    
-                    # Mark as not in database (dataset only)
-                    df['in_database'] = False
-                    
-                    # Create feature text for similarity matching (only technical specs)
-                    df['feature_text'] = self._create_feature_text(df, features)
+            for category in self.dataset_files:
+                df = self._load_dataset_category(category)
+                if df is not None:
                     all_components.append(df)
-                    
-                    logger.info(f" Loaded {len(df)} {category} components from dataset")
-                    
-                except Exception as e:
-                    logger.error(f" Error loading {filename}: {e}")
-                    # Don't raise, continue with other files
         else:
             logger.warning(" Dataset files not available, loading only from database")
         
@@ -308,20 +370,212 @@ class PCRecommendationTrainer:
         
         return combined_df
 
+    def compute_fingerprints(self) -> dict:
+        """
+        Fingerprint the training inputs of every category: its feature
+        list, its dataset file (size, mtime and content hash) and its
+        database table (row count, max rowid and a checksum of the rows)
+        """
+        previous = self.fingerprints or {}
+        datasets_available = all(os.path.exists(os.path.join(self.datasets_path, filename))
+                                 for filename in self.dataset_files.values())
+        
+        fingerprints = {}
+        for category, features in self.category_features.items():
+            dataset = None
+            if datasets_available:
+                file_path = os.path.join(self.datasets_path, self.dataset_files[category])
+                dataset = self._file_fingerprint(file_path, (previous.get(category) or {}).get('dataset'))
+            fingerprints[category] = {'features': list(features), 'dataset': dataset, 'database': None}
+        
+        if os.path.exists(self.db_path):
+            with get_database(self.db_path).connection() as conn:
+                for category, fingerprint in fingerprints.items():
+                    fingerprint['database'] = self._table_fingerprint(conn, self.table_mapping[category])
+        
+        return fingerprints
+    
+    @staticmethod
+    def _file_fingerprint(file_path: str, previous: Optional[dict] = None) -> dict:
+        """Size, mtime and SHA-256 of a file; the hash is reused while size and mtime match"""
+        stat = os.stat(file_path)
+        if previous and previous['size'] == stat.st_size and previous['mtime_ns'] == stat.st_mtime_ns:
+            return previous
+        
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+    
+    @staticmethod
+    def _table_fingerprint(conn, table_name: str) -> Optional[dict]:
+        """Row count, max rowid and SHA-256 of the rows of a table, None if it can't be read"""
+        try:
+            rows = conn.execute(f"SELECT rowid, * FROM {table_name} ORDER BY rowid").fetchall()
+        except sqlite3.Error:
+            return None
+        
+        return {
+            'rows': len(rows),
+            'max_rowid': rows[-1][0] if rows else 0,
+            'sha256': hashlib.sha256(repr(rows).encode('utf-8')).hexdigest()
+        }
+    
+    @staticmethod
+    def _same_inputs(previous: Optional[dict], current: Optional[dict]) -> bool:
+        """Compare two category fingerprints, ignoring file mtimes"""
+        def content(fingerprint):
+            if fingerprint is None:
+                return None
+            dataset = fingerprint.get('dataset')
+            return fingerprint.get('features'), dataset and dataset['sha256'], fingerprint.get('database')
+        
+        return content(previous) == content(current)
+    
+    def refresh_model(self) -> Optional[set]:
+        """
+        Bring a loaded model up to date with its training inputs.
+        
+        Only categories whose fingerprint changed are reloaded; their rows
+        are featurised with the existing vocabulary and only their
+        similarity blocks and neighbour lists are rebuilt. Rows keep the
+        order a full load gives them. Returns the changed categories, or
+        None when a full retrain is needed: the model has no fingerprints
+        or vocabulary drift would pass refit_drift_threshold.
+        """
+        if self.tfidf_matrix is None:
+            raise Exception("Model not trained!")
+        if not self.fingerprints:
+            return None
+        
+        fingerprints = self.compute_fingerprints()
+        changed = {category for category, fingerprint in fingerprints.items()
+                   if not self._same_inputs(self.fingerprints.get(category), fingerprint)}
+        if not changed:
+            self.fingerprints = fingerprints
+            return changed
+        
+        logger.info(f" Training inputs changed for: {', '.join(sorted(changed))}")
+        
+        df = self.components_df
+        row_categories = df['category'].to_numpy()
+        in_database = df['in_database'].fillna(False).astype(bool).to_numpy()
+        datasets_available = self.check_datasets_available()
+        database = get_database(self.db_path) if os.path.exists(self.db_path) else None
+        
+        # Dataset rows first, then database rows, each in category order
+        frames = []
+        matrices = []
+        for from_database in (False, True):
+            for category in self.category_features:
+                if category not in changed:
+                    positions = np.flatnonzero((row_categories == category) & (in_database == from_database))
+                    if len(positions):
+                        frames.append(df.iloc[positions])
+                        matrices.append(self.tfidf_matrix[positions])
+                    continue
+                
+                new_df = None
+                if from_database:
+                    if database is not None:
+                        with database.connection() as conn:
+                            new_df = self._load_database_category(conn, category)
+                elif datasets_available:
+                    new_df = self._load_dataset_category(category)
+                if new_df is not None:
+                    frames.append(new_df)
+                    matrices.append(None)
+        
+        if not frames:
+            raise Exception("No components loaded from datasets or database")
+        
+        # Rows whose feature text the model already had, like rows that only
+        # changed price, don't add to vocabulary drift
+        known_texts = set(df['feature_text'][np.isin(row_categories, list(changed))])
+        new_texts = [text for frame, matrix in zip(frames, matrices) if matrix is None
+                     for text in frame['feature_text'] if text not in known_texts]
+        if not self._admit_terms(new_texts):
+            return None
+        
+        matrices = [self.tfidf_vectorizer.transform(frame['feature_text']) if matrix is None else matrix
+                    for frame, matrix in zip(frames, matrices)]
+        self.components_df = pd.concat(frames, ignore_index=True)
+        self.tfidf_matrix = sparse.vstack(matrices, format='csr')
+        self.fingerprints = fingerprints
+        
+        self.build_component_index()
+        self.build_similarity_engine(changed)
+        if self.compatibility_graph is not None:
+            self.build_compatibility_graph(changed)
+        if self.neighbor_graph is not None:
+            self.build_neighbor_graph(changed)
+        
+        logger.info(f" Model refreshed: {len(self.components_df)} components")
+        return changed
     
     def _create_feature_text(self, df: pd.DataFrame, features: list) -> pd.Series:
         """
-        Create text from features for similarity matching
+        Create text from features for similarity matching: "<feature> <value>"
+        for every present feature of a row, joined by spaces. The text is
+        built one feature column at a time.
+        """
+        # Values print the way a row of the frame holds them: in the row
+        # dtype when that is numeric (ints print as floats next to float
+        # columns), as Python objects otherwise
+        row_dtype = df.iloc[0].dtype if len(df) else None
+        # Nullable dtypes like Int64 hold numpy scalars
+        row_dtype = getattr(row_dtype, 'numpy_dtype', row_dtype)
+        if not (isinstance(row_dtype, np.dtype) and row_dtype.kind in 'iuf'):
+            row_dtype = None
+        
+        columns = []
+        for feature in features:
+            if feature not in df:
+                continue
+            
+            values = df[feature]
+            present = values.notna().to_numpy()
+            if not present.any():
+                continue
+            
+            # Every part carries a trailing separator, dropped after joining
+            column = np.full(len(df), '', dtype=object)
+            column[present] = feature + ' ' + self._format_feature_values(values[present], row_dtype) + ' '
+            columns.append(column)
+        
+        if not columns:
+            return pd.Series([''] * len(df), index=df.index)
+        return pd.Series([''.join(parts)[:-1] for parts in zip(*columns)], index=df.index)
+    
+    @staticmethod
+    def _format_feature_values(values: pd.Series, row_dtype=None) -> np.ndarray:
+        """
+        str(value).lower().replace('_', ' ') of every value, formatting each
+        distinct value once
         """
-        def create_text(row):
-            text_parts = []
-            for feature in features:
-                if feature in row and pd.notna(row[feature]):
-                    value = str(row[feature]).lower().replace('_', ' ')
-                    text_parts.append(f"{feature} {value}")
-            return " ".join(text_parts)
+        array = values.to_numpy()
+        if row_dtype is not None:
+            array = array.astype(row_dtype)
+        elif array.dtype.kind == 'f':
+            # As Python floats, values print at double precision
+            array = array.astype(np.float64)
+        
+        if array.dtype.kind == 'f':
+            # Factorize the bit patterns, since 0.0 and -0.0 are equal but
+            # print differently
+            codes, uniques = pd.factorize(array.view(f"i{array.dtype.itemsize}"))
+            uniques = uniques.view(array.dtype)
+        elif array.dtype.kind in 'biu' or pd.api.types.infer_dtype(array, skipna=True) == 'string':
+            codes, uniques = pd.factorize(array)
+        else:
+            # Mixed objects like 1 and 1.0 are equal but print differently
+            uniques = values.astype(object).to_numpy()
+            codes = np.arange(len(uniques))
         
-        return df.apply(create_text, axis=1)
+        formatted = pd.Series([str(value) for value in uniques], dtype=object)
+        formatted = formatted.str.lower().str.replace('_', ' ', regex=False)
+        return formatted.to_numpy(dtype=object)[codes]
     
     def train_model(self, df: pd.DataFrame):
         """
@@ -338,24 +592,616 @@ class PCRecommendationTrainer:
         
         self.tfidf_matrix = self.tfidf_vectorizer.fit_transform(df['feature_text'])
         self.components_df = df
+        self.build_component_index()
+        self.build_similarity_engine()
+        self.build_compatibility_graph()
+        
+        # Share of terms the fitted vocabulary leaves out, the baseline
+        # that vocabulary drift of incrementally added components is
+        # measured against
+        terms, oov_terms = self._count_oov_terms(df['feature_text'])
+        self.fit_oov_rate = oov_terms / terms if terms else 0.0
+        self.added_terms = 0
+        self.added_oov_terms = 0
         
         logger.info(f" Model trained with {self.tfidf_matrix.shape[1]} features")
     
-    def calculate_similarity_matrix(self) -> np.ndarray:
+    def _count_oov_terms(self, texts) -> tuple:
+        """Count analysed terms and those missing from the fitted vocabulary"""
+        analyzer = self.tfidf_vectorizer.build_analyzer()
+        vocabulary = self.tfidf_vectorizer.vocabulary_
+        terms = 0
+        oov_terms = 0
+        for text in texts:
+            for term in analyzer(text):
+                terms += 1
+                if term not in vocabulary:
+                    oov_terms += 1
+        return terms, oov_terms
+    
+    def vocabulary_drift(self) -> float:
+        """
+        How much more often terms of incrementally added components fall
+        outside the vocabulary than terms of the corpus it was fitted on
+        """
+        if not self.added_terms:
+            return 0.0
+        return max(0.0, self.added_oov_terms / self.added_terms - self.fit_oov_rate)
+    
+    def _admit_terms(self, texts) -> bool:
+        """
+        Count the terms of texts featurised with the existing vocabulary
+        towards vocabulary drift. Returns False, counting nothing, when
+        drift would pass refit_drift_threshold.
+        """
+        terms, oov_terms = self._count_oov_terms(texts)
+        added_terms = self.added_terms + terms
+        added_oov_terms = self.added_oov_terms + oov_terms
+        drift = max(0.0, added_oov_terms / added_terms - self.fit_oov_rate) if added_terms else 0.0
+        if drift > self.refit_drift_threshold:
+            logger.info(f" Vocabulary drift {drift:.3f} passed {self.refit_drift_threshold}, full retrain needed")
+            return False
+        
+        self.added_terms = added_terms
+        self.added_oov_terms = added_oov_terms
+        return True
+    
+    def add_component(self, component: dict, category: str, component_id: int) -> bool:
+        """
+        Add one database component to the trained model without refitting.
+        
+        The row is featurised with the existing vectorizer and appended to
+        components_df, tfidf_matrix, the component index, the similarity
+        engine and the neighbour graph. Returns False, leaving the model
+        untouched, when vocabulary drift would pass refit_drift_threshold;
+        the caller should run a full retrain instead.
+        """
+        if self.tfidf_matrix is None:
+            raise Exception("Model not trained!")
+        
+        features = self.category_features.get(category)
+        if features is None:
+            raise Exception(f"Unknown category: {category}")
+        
+        row = dict(component)
+        row['id'] = int(component_id)
+        row['category'] = category
+        row['in_database'] = True
+        row_df = pd.DataFrame([row])
+        row_df['feature_text'] = self._create_feature_text(row_df, features)
+        
+        if not self._admit_terms(row_df['feature_text']):
+            return False
+        
+        vector = self.tfidf_vectorizer.transform(row_df['feature_text'])
+        position = len(self.components_df)
+        
+        self.components_df = pd.concat([self.components_df, row_df], ignore_index=True)
+        self.tfidf_matrix = sparse.vstack([self.tfidf_matrix, vector], format='csr')
+        if self.component_index is None:
+            self.build_component_index()
+        else:
+            self.component_index[(category, int(component_id))] = position
+        
+        if self.category_blocks is None:
+            self.build_similarity_engine()
+        else:
+            self._append_to_category(category, position, vector)
+        
+        if self.compatibility_graph is not None:
+            self.compatibility_graph.add(category, row)
+        
+        if self.availability_index is not None:
+            self.mark_component_available(component_id, category)
+        
+        logger.info(f" Added {category} ID {component_id} to the model at row {position}")
+        return True
+    
+    def apply_changes(self, changes: List[dict]) -> bool:
+        """
+        Apply database row changes to the trained model without refitting.
+        
+        Each change is {'op': 'insert' | 'update' | 'delete', 'category',
+        'id', 'row'}; 'row' holds the full row for inserts and the changed
+        columns for updates. A single insert goes through add_component.
+        Otherwise the changed rows are replaced in components_df and
+        tfidf_matrix in one step, and only the categories that changed get
+        their similarity blocks and neighbour lists rebuilt, once.
+        Returns False, leaving the model untouched, when vocabulary drift
+        would pass refit_drift_threshold.
+        """
+        if self.tfidf_matrix is None:
+            raise Exception("Model not trained!")
+        
+        if len(changes) == 1 and changes[0]['op'] == 'insert':
+            change = changes[0]
+            return self.add_component(change['row'], change['category'], change['id'])
+        
+        removed = np.zeros(len(self.components_df), dtype=bool)
+        new_rows = []
+        for change in changes:
+            category = change['category']
+            if category not in self.category_features:
+                raise Exception(f"Unknown category: {category}")
+            
+            position = self._lookup_row(category, change['id'])
+            if position is not None and not bool(self.components_df.iloc[position].get('in_database', False)):
+                # Only database rows are synced; a dataset row with the same id stays
+                position = None
+            
+            row = {}
+            if position is not None and not removed[position]:
+                removed[position] = True
+                row = self.components_df.iloc[position].to_dict()
+            else:
+                # Earlier change in this batch for the same component
+                for index, pending in enumerate(new_rows):
+                    if pending['category'] == category and pending['id'] == int(change['id']):
+                        row = new_rows.pop(index)
+                        break
+            
+            if change['op'] == 'delete':
+                continue
+            
+            row.update(change.get('row') or {})
+            row['id'] = int(change['id'])
+            row['category'] = category
+            row['in_database'] = True
+            new_rows.append(row)
+        
+        new_df = pd.DataFrame(new_rows)
+        if not new_df.empty:
+            new_df['feature_text'] = ''
+            for category, positions in new_df.groupby('category').groups.items():
+                category_rows = new_df.loc[positions]
+                new_df.loc[positions, 'feature_text'] = self._create_feature_text(category_rows, self.category_features[category])
+            
+            if not self._admit_terms(new_df['feature_text']):
+                return False
+        
+        changed_categories = {change['category'] for change in changes}
+        kept = ~removed
+        
+        self.components_df = pd.concat([self.components_df[kept], new_df], ignore_index=True)
+        if new_df.empty:
+            self.tfidf_matrix = self.tfidf_matrix[kept]
+        else:
+            self.tfidf_matrix = sparse.vstack([
+                self.tfidf_matrix[kept],
+                self.tfidf_vectorizer.transform(new_df['feature_text'])
+            ], format='csr')
+        
+        self.build_component_index()
+        self.build_similarity_engine(changed_categories)
+        if self.compatibility_graph is not None:
+            self.build_compatibility_graph(changed_categories)
+        if self.neighbor_graph is not None:
+            self.build_neighbor_graph(changed_categories)
+        
+        if self.availability_index is not None:
+            for change in changes:
+                self.mark_component_available(change['id'], change['category'], change['op'] != 'delete')
+        
+        logger.info(f" Applied {len(changes)} changes to the model ({', '.join(sorted(changed_categories))})")
+        return True
+    
+    def _append_to_category(self, category: str, position: int, vector):
+        """Append one TF-IDF row to a category's engine block and neighbour graph"""
+        vector = normalize(vector, norm='l2')
+        block = self.category_blocks.get(category)
+        if block is None:
+            block = {'rows': np.empty(0, dtype=np.int64), 'matrix': vector[:0]}
+        
+        matrix = sparse.vstack([block['matrix'], vector], format='csr')
+        self.category_blocks[category] = {
+            'rows': np.append(block['rows'], position),
+            'matrix': matrix
+        }
+        
+        if self.neighbor_graph is None:
+            return
+        
+        new_local = matrix.shape[0] - 1
+        scores = np.asarray((matrix @ vector.T).todense()).ravel()
+        graph = self.neighbor_graph.get(category)
+        if graph is None:
+            graph = {
+                'indptr': np.zeros(1, dtype=np.int64),
+                'indices': np.empty(0, dtype=np.int64),
+                'scores': np.empty(0)
+            }
+        
+        graph = self._insert_neighbor(graph, scores[:new_local], new_local)
+        
+        # Neighbour list of the new component itself
+        top_positions = self._top_k(scores, self.n_neighbors, exclude=new_local)
+        self.neighbor_graph[category] = {
+            'indptr': np.append(graph['indptr'], graph['indptr'][-1] + len(top_positions)),
+            'indices': np.concatenate([graph['indices'], top_positions.astype(np.int64)]),
+            'scores': np.concatenate([graph['scores'], scores[top_positions]])
+        }
+    
+    def _insert_neighbor(self, graph: dict, scores: np.ndarray, new_local: int) -> dict:
+        """
+        Insert a new component into the neighbour lists of existing rows.
+        
+        scores[i] is the similarity of row i to the new component. Rows
+        with fewer than K neighbours always take it; full rows take it
+        only when it beats their last neighbour, dropping that one. Since
+        the new component has the highest position it goes after any
+        neighbour with an equal score.
+        """
+        indptr, indices, old_scores = graph['indptr'], graph['indices'], graph['scores']
+        counts = np.diff(indptr)
+        n_rows = len(counts)
+        if n_rows == 0:
+            return graph
+        
+        full = counts >= self.n_neighbors
+        last_scores = np.full(n_rows, np.inf)
+        has_entries = counts > 0
+        last_scores[has_entries] = old_scores[indptr[1:][has_entries] - 1]
+        takes_new = ~full | (scores > last_scores)
+        
+        # Slot of the new neighbour: after every entry scoring >= it
+        entry_rows = np.repeat(np.arange(n_rows), counts)
+        entry_slots = np.arange(len(indices)) - indptr[entry_rows]
+        at_or_above = old_scores >= scores[entry_rows]
+        insert_slots = np.bincount(entry_rows, weights=at_or_above, minlength=n_rows).astype(np.int64)
+        
+        new_counts = counts + (takes_new & ~full)
+        new_indptr = np.concatenate([[0], np.cumsum(new_counts)]).astype(np.int64)
+        
+        shifted_slots = entry_slots + (takes_new[entry_rows] & (entry_slots >= insert_slots[entry_rows]))
+        keep = shifted_slots < new_counts[entry_rows]
+        
+        new_indices = np.empty(new_indptr[-1], dtype=np.int64)
+        new_scores = np.empty(new_indptr[-1])
+        targets = new_indptr[entry_rows[keep]] + shifted_slots[keep]
+        new_indices[targets] = indices[keep]
+        new_scores[targets] = old_scores[keep]
+        
+        inserted_rows = np.flatnonzero(takes_new)
+        targets = new_indptr[inserted_rows] + insert_slots[inserted_rows]
+        new_indices[targets] = new_local
+        new_scores[targets] = scores[inserted_rows]
+        
+        return {'indptr': new_indptr, 'indices': new_indices, 'scores': new_scores}
+    
+    def build_component_index(self) -> dict:
+        """
+        Map (category, id) to the row position in components_df.
+        
+        Dataset and database ids overlap, so the category is part of the
+        key. When a dataset row and a database row share an id within a
+        category, the database row wins: ids sent by the app come from
+        its database.
+        """
+        df = self.components_df
+        in_database = df['in_database'].fillna(False).astype(bool).to_numpy() if 'in_database' in df else np.zeros(len(df), dtype=bool)
+        categories = df['category'].to_numpy()
+        ids = df['id'].to_numpy()
+        
+        self.component_index = {}
+        for positions in (np.flatnonzero(in_database), np.flatnonzero(~in_database)):
+            for position in positions:
+                self.component_index.setdefault((categories[position], int(ids[position])), int(position))
+        
+        logger.info(f" Component index built: {len(self.component_index)} keys")
+        return self.component_index
+    
+    def _lookup_row(self, category: str, component_id) -> Optional[int]:
+        """Row position in components_df of a (category, id) pair, or None"""
+        if self.component_index is None:
+            self.build_component_index()
+        
+        try:
+            return self.component_index.get((category, int(component_id)))
+        except (TypeError, ValueError):
+            return None
+    
+    def _is_indexed_row(self, component: pd.Series) -> bool:
         """
-        Calculate cosine similarity matrix between all components
+        Whether a components_df row is the one its (category, id) resolves
+        to; a dataset row whose id collides with a database row's is not
+        """
+        return self._lookup_row(component['category'], component['id']) == component.name
+    
+    @staticmethod
+    def _in_database(component: pd.Series) -> bool:
+        """Whether a components_df row was loaded from (or synced into) the database"""
+        value = component.get('in_database', False)
+        return False if pd.isna(value) else bool(value)
+    
+    def build_similarity_engine(self, categories: Optional[set] = None):
         """
-        logger.info("Calculating cosine similarity matrix...")
+        Build one L2-normalised TF-IDF block per category so a single
+        matrix-vector product scores every candidate of that category.
         
+        With `categories`, only those blocks are rebuilt; the others keep
+        their matrix and only get their row positions refreshed.
+        """
         if self.tfidf_matrix is None:
             raise Exception("TF-IDF matrix not available. Train model first.")
         
-        # Calculate cosine similarity
-        self.similarity_matrix = cosine_similarity(self.tfidf_matrix)
+        previous_blocks = self.category_blocks or {}
+        row_categories = self.components_df['category'].to_numpy()
+        self.category_blocks = {}
+        for category in pd.unique(row_categories):
+            rows = np.flatnonzero(row_categories == category)
+            if categories is None or category in categories or category not in previous_blocks:
+                matrix = normalize(self.tfidf_matrix[rows], norm='l2')
+            else:
+                matrix = previous_blocks[category]['matrix']
+            self.category_blocks[category] = {'rows': rows, 'matrix': matrix}
         
-        logger.info(f" Similarity matrix shape: {self.similarity_matrix.shape}")
-        return self.similarity_matrix
+        logger.info(f" Similarity engine built for {len(self.category_blocks)} categories")
+    
+    def _category_rows(self, category: str) -> np.ndarray:
+        """Row positions in components_df of every component in a category"""
+        if self.category_blocks is None:
+            self.build_similarity_engine()
+        
+        block = self.category_blocks.get(category)
+        if block is None:
+            return np.empty(0, dtype=np.int64)
+        return block['rows']
+    
+    def _local_index(self, category: str, position) -> Optional[int]:
+        """Position of a components_df row among the rows of its category, or None"""
+        if not isinstance(position, (int, np.integer)):
+            return None
+        rows = self._category_rows(category)
+        local = int(np.searchsorted(rows, position))
+        return local if local < len(rows) and rows[local] == position else None
+    
+    def build_compatibility_graph(self, categories: Optional[set] = None):
+        """
+        Precompute the cross-category compatibility bitsets the compatible,
+        completion and note paths read (see compatibility_graph).
+        
+        With `categories`, only the relations of those categories are
+        rebuilt; the other categories keep their parts in the same order
+        across the incremental updates that pass them.
+        """
+        if self.category_blocks is None:
+            self.build_similarity_engine()
+        
+        if self.compatibility_graph is None or categories is None:
+            self.compatibility_graph = CompatibilityGraph()
+        category_rows = {category: block['rows'] for category, block in self.category_blocks.items()}
+        self.compatibility_graph.build(self.components_df, category_rows, categories)
+        
+        logger.info(f" Compatibility graph built: {self.compatibility_graph.nbytes()} bytes")
+    
+    def _compatibility(self) -> CompatibilityGraph:
+        """The compatibility graph, built on first use"""
+        if self.compatibility_graph is None:
+            self.build_compatibility_graph()
+        return self.compatibility_graph
+    
+    def _score_category(self, component_idx: int, category: str):
+        """
+        Score every component of a category against one component.
+        Returns (row positions in components_df, cosine scores).
+        """
+        rows = self._category_rows(category)
+        if len(rows) == 0:
+            return rows, np.empty(0)
+        
+        block = self.category_blocks[category]
+        query = normalize(self.tfidf_matrix[component_idx], norm='l2')
+        scores = np.asarray((block['matrix'] @ query.T).todense()).ravel()
+        return block['rows'], scores
+    
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int, exclude: Optional[int] = None) -> np.ndarray:
+        """
+        Positions of the k highest scores, ordered by score (descending)
+        and then by position, matching a stable descending sort
+        """
+        candidates = np.arange(len(scores))
+        if exclude is not None:
+            candidates = candidates[candidates != exclude]
+        if k <= 0 or len(candidates) == 0:
+            return candidates[:0]
+        
+        candidate_scores = scores[candidates]
+        if k < len(candidates):
+            # argpartition finds the k-th best score; keep every tie with it
+            # so the final stable ordering is the same as a full sort
+            top = np.argpartition(-candidate_scores, k - 1)[:k]
+            threshold = candidate_scores[top].min()
+            keep = candidate_scores >= threshold
+            candidates = candidates[keep]
+            candidate_scores = candidate_scores[keep]
+        
+        order = np.lexsort((candidates, -candidate_scores))
+        return candidates[order][:k]
+    
+    def build_neighbor_graph(self, categories: Optional[set] = None) -> dict:
+        """
+        Build the per-category top-K neighbour graph.
+        
+        For every category the graph is stored in CSR form: row i of
+        'indptr'/'indices'/'scores' lists the K most similar components of
+        the i-th component in that category, as category-local positions,
+        ordered by score (descending) and then by position.
+        
+        With `categories`, only those categories are rebuilt.
+        """
+        logger.info(f"Building top-{self.n_neighbors} neighbour graph...")
+        
+        if self.tfidf_matrix is None:
+            raise Exception("TF-IDF matrix not available. Train model first.")
+        
+        if self.category_blocks is None:
+            self.build_similarity_engine()
+        
+        previous_graph = self.neighbor_graph if categories is not None and self.neighbor_graph else {}
+        self.neighbor_graph = {}
+        total_edges = 0
+        for category, block in self.category_blocks.items():
+            if category in previous_graph and category not in categories:
+                graph = previous_graph[category]
+            else:
+                graph = self._category_neighbors(block['matrix'])
+            self.neighbor_graph[category] = graph
+            total_edges += len(graph['indices'])
+        
+        logger.info(f" Neighbour graph built: {total_edges} edges over {len(self.neighbor_graph)} categories")
+        return self.neighbor_graph
+    
+    def _category_neighbors(self, matrix) -> dict:
+        """
+        Top-K neighbour lists, in CSR form, of one category block.
+        
+        Similarities are computed one row x column tile at a time and each
+        tile's best candidates are merged into the running top-K of its
+        rows, so memory stays bounded however large the category is.
+        """
+        n_rows = matrix.shape[0]
+        k = min(self.n_neighbors, n_rows - 1)
+        
+        if k <= 0:
+            indices = np.empty((n_rows, 0), dtype=np.int64)
+            scores = np.empty((n_rows, 0))
+        else:
+            block_size = self._similarity_block_size(n_rows, k)
+            indices = np.empty((n_rows, k), dtype=np.int64)
+            scores = np.empty((n_rows, k))
+            
+            for row_start in range(0, n_rows, block_size):
+                rows = matrix[row_start:row_start + block_size]
+                own = np.arange(row_start, row_start + rows.shape[0])
+                best_scores = np.empty((rows.shape[0], 0))
+                best_indices = np.empty((rows.shape[0], 0), dtype=np.int64)
+                
+                for column_start in range(0, n_rows, block_size):
+                    similarities = np.asarray((rows @ matrix[column_start:column_start + block_size].T).todense())
+                    
+                    # A component is never its own neighbour
+                    in_tile = (own >= column_start) & (own < column_start + similarities.shape[1])
+                    similarities[np.flatnonzero(in_tile), own[in_tile] - column_start] = -np.inf
+                    
+                    tile_scores, tile_indices = self._tile_top_k(similarities, k)
+                    best_scores, best_indices = self._merge_top_k(
+                        best_scores, best_indices, tile_scores, tile_indices + column_start, k)
+                
+                scores[row_start:row_start + len(own)] = best_scores
+                indices[row_start:row_start + len(own)] = best_indices
+        
+        return {
+            'indptr': np.arange(n_rows + 1, dtype=np.int64) * indices.shape[1],
+            'indices': indices.ravel().astype(np.int64),
+            'scores': scores.ravel()
+        }
+    
+    def _similarity_block_size(self, n_rows: int, k: int) -> int:
+        """Rows and columns per similarity tile of a category with n_rows components"""
+        if self.similarity_block_size:
+            return max(1, min(self.similarity_block_size, n_rows))
+        
+        # A B x B tile takes about 40 bytes per score across the scores,
+        # the partition buffers and the top-K merge: 40 * B * (B + k)
+        budget = self.similarity_memory_budget_mb * 1024 * 1024
+        block_size = int((math.sqrt(k * k + budget / 10) - k) / 2)
+        return max(1, min(block_size, n_rows))
+    
+    @staticmethod
+    def _tile_top_k(similarities: np.ndarray, k: int):
+        """
+        Scores and column positions of the k best columns of every row of a
+        similarity tile, ordered by score (descending) and then by position
+        """
+        n_columns = similarities.shape[1]
+        if k >= n_columns:
+            # Stable sort keeps equal scores in position order
+            indices = np.argsort(-similarities, axis=1, kind='stable')
+            return np.take_along_axis(similarities, indices, axis=1), indices
+        
+        # Keep every score tied with a row's k-th best, like _top_k, and
+        # order only those candidates
+        thresholds = -np.partition(-similarities, k - 1, axis=1)[:, k - 1]
+        rows, columns = np.nonzero(similarities >= thresholds[:, None])
+        values = similarities[rows, columns]
+        order = np.lexsort((columns, -values, rows))
+        rows, columns, values = rows[order], columns[order], values[order]
+        
+        starts = np.searchsorted(rows, np.arange(len(similarities)))
+        keep = np.arange(len(rows)) - starts[rows] < k
+        return values[keep].reshape(-1, k), columns[keep].reshape(-1, k)
+    
+    @staticmethod
+    def _merge_top_k(scores_a: np.ndarray, indices_a: np.ndarray, scores_b: np.ndarray, indices_b: np.ndarray, k: int):
+        """
+        Merge two per-row candidate lists into the k best of each row.
+        Every index in b is higher than those in a and both are already in
+        score then position order, so a stable sort on score keeps equal
+        scores in position order.
+        """
+        scores = np.concatenate([scores_a, scores_b], axis=1)
+        indices = np.concatenate([indices_a, indices_b], axis=1)
+        order = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(indices, order, axis=1)
+    
+    def calculate_similarity_matrix(self) -> dict:
+        """
+        Kept for existing callers; builds the sparse neighbour graph
+        instead of a dense N x N similarity matrix
+        """
+        return self.build_neighbor_graph()
+    
+    @profiled('similarity_ranking')
+    def _ranked_neighbors(self, component_idx: int, category: str, k: int):
+        """
+        Top-k components of `category` most similar to one row, as
+        (row positions in components_df, scores). Served from the
+        neighbour graph when it holds enough entries, otherwise scored
+        with the similarity engine.
+        """
+        rows = self._category_rows(category)
+        local = np.searchsorted(rows, component_idx)
+        in_category = local < len(rows) and rows[local] == component_idx
+        local = int(local) if in_category else None
+        
+        graph = self.neighbor_graph.get(category) if self.neighbor_graph else None
+        if graph is not None and local is not None:
+            start, end = graph['indptr'][local], graph['indptr'][local + 1]
+            if k <= end - start or end - start == len(rows) - 1:
+                end = min(end, start + k)
+                return rows[graph['indices'][start:end]], graph['scores'][start:end]
+        
+        category_rows, scores = self._score_category(component_idx, category)
+        top_positions = self._top_k(scores, k, exclude=local)
+        return category_rows[top_positions], scores[top_positions]
 
+    def _similar_rows(self, component_idx: int, component_id: int, category: str, n_recommendations: int):
+        """
+        (row, score) of the components most similar to one row, best
+        first, walking the ranking in growing top-k windows. Each component
+        id comes up once, through the row it resolves to, and the query's
+        own id never does, so dataset duplicates of a database component
+        are skipped.
+        """
+        category_size = len(self._category_rows(category))
+        seen = {int(component_id)}
+        checked = 0
+        k = max(n_recommendations * 2, 1)
+        while checked < category_size:
+            neighbor_rows, scores = self._ranked_neighbors(component_idx, category, k)
+            for idx, score in zip(neighbor_rows[checked:], scores[checked:]):
+                checked += 1
+                component = self.components_df.iloc[idx]
+                rec_id = int(component['id'])
+                if rec_id in seen or not self._is_indexed_row(component):
+                    continue
+                seen.add(rec_id)
+                yield component, float(score)
+            if len(neighbor_rows) < k:
+                break
+            k *= 2
+    
     def get_similar_components(self, component_id: int, category: str, n_recommendations: int = 5, strict: bool = False):
         """
         Get similar components based on features
@@ -373,41 +1219,28 @@ class PCRecommendationTrainer:
             raise Exception(" Model not trained!")
         
         # Find component index
-        component_idx = self.components_df[self.components_df['id'] == component_id].index
-        if len(component_idx) == 0:
+        component_idx = self._lookup_row(category, component_id)
+        if component_idx is None:
             logger.warning(f" Component ID {component_id} not found in training data")
             return []
         
-        component_idx = component_idx[0]
-        
-        # Calculate similarities
-        similarity_scores = list(enumerate(cosine_similarity(self.tfidf_matrix)[component_idx]))
-        similarity_scores = sorted(similarity_scores, key=lambda x: x[1], reverse=True)
-        
-        # Get top recommendations - ONLY from database
         recommendations = []
-        for idx, score in similarity_scores[1:]:  # Skip the first (itself)
-            if len(recommendations) >= n_recommendations:
-                break
-                
-            if idx < len(self.components_df):
-                component = self.components_df.iloc[idx]
-                rec_id = int(component['id'])
-                rec_category = component['category']
-                
-                # STRICT CHECK: Only include if in database
-                if self.check_component_in_database(rec_id, rec_category):
-                    recommendations.append({
-                        'id': rec_id,
-                        'model_name': component['model_name'],
-                        'category': rec_category,
-                        'price': int(component.get('price', 0)),
-                        'similarity_score': float(score),
-                        'brand': component.get('brand', ''),
-                        'in_database': True,
-                        'availability_status': 'Available in store',
-                        'reason': self._generate_recommendation_reason(component, score)
-                    })
+        for component, score in self._similar_rows(component_idx, component_id, category, n_recommendations):
+            # STRICT CHECK: Only include if in database
+            if self._in_database(component):
+                recommendations.append({
+                    'id': int(component['id']),
+                    'model_name': self._text(component, 'model_name'),
+                    'category': component['category'],
+                    'price': self._price(component),
+                    'similarity_score': score,
+                    'brand': self._text(component, 'brand'),
+                    'in_database': True,
+                    'availability_status': 'Available in store',
+                    'reason': self._generate_recommendation_reason(component, score)
+                })
+                if len(recommendations) >= n_recommendations:
+                    break
         
         logger.info(f" Found {len(recommendations)} similar recommendations (STRICT MODE - ALL IN DATABASE)")
         return recommendations
@@ -418,59 +1251,34 @@ class PCRecommendationTrainer:
             raise Exception("Model not trained!")
         
         # Find component index
-        component_idx = self.components_df[self.components_df['id'] == component_id].index
-        if len(component_idx) == 0:
+        component_idx = self._lookup_row(category, component_id)
+        if component_idx is None:
             logger.warning(f"Component ID {component_id} not found in training data")
             return []
         
-        component_idx = component_idx[0]
-        
-        # Calculate similarities for SAME CATEGORY only
-        same_category_df = self.components_df[self.components_df['category'] == category]
-        if same_category_df.empty:
+        # Rank the SAME CATEGORY only
+        category_size = len(self._category_rows(category))
+        if category_size == 0:
             logger.warning(f"No {category} components in training data")
             return []
         
-        logger.info(f" Finding similar {category} components from {len(same_category_df)} total")
-        
-        # Get indices for same category
-        category_indices = same_category_df.index.tolist()
-        
-        # Calculate similarities only within same category
-        similarities = []
-        for idx in category_indices:
-            if idx != component_idx:  # Skip itself
-                sim_score = cosine_similarity(
-                    self.tfidf_matrix[component_idx:component_idx+1],
-                    self.tfidf_matrix[idx:idx+1]
-                )[0][0]
-                similarities.append((idx, sim_score))
-        
-        # Sort by similarity
-        similarities.sort(key=lambda x: x[1], reverse=True)
+        logger.info(f" Finding similar {category} components from {category_size} total")
         
         # Get top recommendations and check database availability
         recommendations = []
-        for idx, score in similarities[:n_recommendations * 2]:  # Get 2x more for filtering
-            component = self.components_df.iloc[idx]
-            rec_id = int(component['id'])
-            rec_category = component['category']
-            
-            # Check if component exists in database
-            in_database = self.check_component_in_database(rec_id, rec_category)
-            
+        for component, score in self._similar_rows(component_idx, component_id, category, n_recommendations):
+            in_database = self._in_database(component)
             recommendations.append({
-                'id': rec_id,
-                'model_name': component['model_name'],
-                'category': rec_category,
-                'price': int(component.get('price', 0)),
-                'similarity_score': float(score),
-                'brand': component.get('brand', ''),
+                'id': int(component['id']),
+                'model_name': self._text(component, 'model_name'),
+                'category': component['category'],
+                'price': self._price(component),
+                'similarity_score': score,
+                'brand': self._text(component, 'brand'),
                 'in_database': in_database,
                 'availability_status': 'Available in store' if in_database else 'Reference only - Not in database',
                 'reason': self._generate_recommendation_reason(component, score)
             })
-            
             if len(recommendations) >= n_recommendations:
                 break
         
@@ -480,33 +1288,107 @@ class PCRecommendationTrainer:
         
         return recommendations
 
-    def get_compatible_components(self, current_build: dict, target_category: str, n_recommendations: int = 5, strict: bool = False):
+    def get_compatible_components(self, current_build: dict, target_category: str, n_recommendations: int = 5, strict: bool = False,
+                                  build_parts: Optional[dict] = None):
         """
-        Get compatible components for current build
+        Get compatible components for current build. `build_parts` from
+        _resolve_build can be passed when the build was already resolved.
         """
         if strict:
-            return self.get_compatible_components_strict(current_build, target_category, n_recommendations)
+            return self.get_compatible_components_strict(current_build, target_category, n_recommendations, build_parts)
         else:
-            return self.get_compatible_components_with_availability(current_build, target_category, n_recommendations)
+            return self.get_compatible_components_with_availability(current_build, target_category, n_recommendations, build_parts)
+    
+    def get_compatible_components_batch(self, current_build: dict, target_categories: List[str], n_recommendations: int = 5,
+                                        strict: bool = False, build_parts: Optional[dict] = None) -> Tuple[Dict[str, list], Dict[str, str]]:
+        """
+        Get compatible components of several categories for one build,
+        resolving the build once. A failing category does not fail the
+        others. Returns ({target category: recommendations}, {target category: error}).
+        """
+        if build_parts is None:
+            build_parts = self._resolve_build(current_build)
+        results, errors = {}, {}
+        for target_category in target_categories:
+            try:
+                results[target_category] = self.get_compatible_components(
+                    current_build, target_category, n_recommendations, strict, build_parts
+                )
+            except Exception as e:
+                logger.error(f" Error finding compatible {target_category}: {e}")
+                errors[target_category] = str(e)
+        return results, errors
+    
+    def complete_build(self, current_build: dict, n_recommendations: int = 5, strict: bool = False,
+                       cross_check: bool = False) -> dict:
+        """
+        Rank candidates for every category missing from a partial build,
+        resolving the build once for all of them.
+        
+        With cross_check the top suggestion of each missing category is
+        added to the build and every missing category is ranked again
+        against it, so new suggestions are checked against each other
+        (e.g. GPU TDP against the suggested PSU's wattage), not just
+        against the parts already chosen.
+        """
+        missing_categories = [category for category in self.table_mapping if category not in current_build]
+        build_parts = self._resolve_build(current_build)
+        recommendations, errors = self.get_compatible_components_batch(
+            current_build, missing_categories, n_recommendations, strict, build_parts
+        )
+        
+        result = {
+            'missing_categories': missing_categories,
+            'recommendations': recommendations,
+            'errors': errors,
+        }
+        if not cross_check:
+            return result
+        
+        proposed_build = self._top_suggestions(recommendations)
+        proposed_parts = {}
+        for category, component_id in proposed_build.items():
+            position = self._lookup_row(category, component_id)
+            if position is not None:
+                proposed_parts[category] = self.components_df.iloc[position]
+        
+        for category in list(recommendations):
+            # Check against every other suggestion, never against itself
+            suggested_build = dict(current_build)
+            suggested_parts = dict(build_parts)
+            for other, part in proposed_parts.items():
+                if other != category:
+                    suggested_build[other] = proposed_build[other]
+                    suggested_parts[other] = part
+            rechecked, failed = self.get_compatible_components_batch(
+                suggested_build, [category], n_recommendations, strict, suggested_parts
+            )
+            recommendations.update(rechecked)
+            errors.update(failed)
+        
+        result['proposed_build'] = self._top_suggestions(recommendations)
+        return result
+    
+    @staticmethod
+    def _top_suggestions(recommendations: Dict[str, list]) -> Dict[str, int]:
+        """{category: id of its best recommendation} for categories that have one"""
+        return {category: recs[0]['id'] for category, recs in recommendations.items() if recs}
     
-    def get_compatible_components_strict(self, current_build: dict, target_category: str, n_recommendations: int = 5):
+    def get_compatible_components_strict(self, current_build: dict, target_category: str, n_recommendations: int = 5,
+                                         build_parts: Optional[dict] = None):
         """
         Get compatible components - ONLY those available in database
         """
-        target_components = self.components_df[self.components_df['category'] == target_category]
+        target_components = self.components_df.iloc[self._category_rows(target_category)]
         
         if target_components.empty:
             logger.warning(f" No {target_category} components found in training data")
             return []
         
-        # Calculate compatibility scores
-        compatibility_scores = []
-        for idx, component in target_components.iterrows():
-            score = self._calculate_compatibility(component, current_build)
-            compatibility_scores.append((idx, score))
-        
-        # Sort and get top recommendations
-        compatibility_scores.sort(key=lambda x: x[1], reverse=True)
+        # Score the whole category at once against the resolved build
+        if build_parts is None:
+            build_parts = self._resolve_build(current_build)
+        compatibility_scores = self._ranked_compatibility(target_components, build_parts)
         
         recommendations = []
         for idx, score in compatibility_scores:
@@ -517,26 +1399,27 @@ class PCRecommendationTrainer:
             rec_id = int(component['id'])
             
             # STRICT CHECK: Only include if in database
-            if self.check_component_in_database(rec_id, target_category):
+            if self._in_database(component) and self._is_indexed_row(component):
                 recommendations.append({
                     'id': rec_id,
-                    'model_name': component['model_name'],
+                    'model_name': self._text(component, 'model_name'),
                     'category': component['category'],
-                    'price': int(component.get('price', 0)),
+                    'price': self._price(component),
                     'compatibility_score': float(score),
-                    'brand': component.get('brand', ''),
+                    'brand': self._text(component, 'brand'),
                     'in_database': True,
                     'availability_status': 'Available in store',
-                    'compatibility_notes': self._generate_compatibility_notes(component, current_build),
+                    'compatibility_notes': self._generate_compatibility_notes(component, current_build, build_parts),
                     'reason': self._generate_recommendation_reason(component, score)
                 })
         
         logger.info(f" Found {len(recommendations)} compatible recommendations (STRICT MODE - ALL IN DATABASE)")
         return recommendations
     
-    def get_compatible_components_with_availability(self, current_build: dict, target_category: str, n_recommendations: int = 5):
+    def get_compatible_components_with_availability(self, current_build: dict, target_category: str, n_recommendations: int = 5,
+                                                    build_parts: Optional[dict] = None):
     
-        target_components = self.components_df[self.components_df['category'] == target_category]
+        target_components = self.components_df.iloc[self._category_rows(target_category)]
         
         if target_components.empty:
             logger.warning(f" No {target_category} components found in training data")
@@ -545,14 +1428,10 @@ class PCRecommendationTrainer:
         
         logger.info(f" Finding compatible {target_category} from {len(target_components)} components")
         
-        # Calculate compatibility scores
-        compatibility_scores = []
-        for idx, component in target_components.iterrows():
-            score = self._calculate_compatibility(component, current_build)
-            compatibility_scores.append((idx, score))
-        
-        # Sort and get top recommendations
-        compatibility_scores.sort(key=lambda x: x[1], reverse=True)
+        # Score the whole category at once against the resolved build
+        if build_parts is None:
+            build_parts = self._resolve_build(current_build)
+        compatibility_scores = self._ranked_compatibility(target_components, build_parts)
         
         # Separate database and dataset recommendations
         database_recs = []
@@ -562,21 +1441,21 @@ class PCRecommendationTrainer:
             component = self.components_df.iloc[idx]
             rec_id = int(component['id'])
             
-            # Check if in database (use the in_database column if available, otherwise check)
-            in_database = component.get('in_database', False)
-            if pd.isna(in_database):
-                in_database = self.check_component_in_database(rec_id, target_category)
+            # A dataset row shadowed by a database row of the same id is the same component
+            if not self._is_indexed_row(component):
+                continue
+            in_database = self._in_database(component)
             
             rec_dict = {
                 'id': rec_id,
-                'model_name': component['model_name'],
+                'model_name': self._text(component, 'model_name'),
                 'category': component['category'],
-                'price': int(component.get('price', 0)),
+                'price': self._price(component),
                 'compatibility_score': float(score),
-                'brand': component.get('brand', ''),
+                'brand': self._text(component, 'brand'),
                 'in_database': bool(in_database),
                 'availability_status': 'Available in store' if in_database else 'Reference only - Not in database',
-                'compatibility_notes': self._generate_compatibility_notes(component, current_build),
+                'compatibility_notes': self._generate_compatibility_notes(component, current_build, build_parts),
                 'reason': self._generate_recommendation_reason(component, score)
             }
             
@@ -611,139 +1490,204 @@ class PCRecommendationTrainer:
         if not table_name:
             return []
         
-        conn = sqlite3.connect(self.db_path)
-        query = f"SELECT * FROM {table_name}"
-        available_components = pd.read_sql_query(query, conn)
-        conn.close()
+        with get_database(self.db_path).connection() as conn:
+            query = f"SELECT * FROM {table_name}"
+            available_components = pd.read_sql_query(query, conn)
         
         if available_components.empty:
             return []
         
         # Find the target component in training data
-        target_component = self.components_df[self.components_df['id'] == component_id]
-        if target_component.empty:
+        target_idx = self._lookup_row(category, component_id)
+        if target_idx is None:
             return []
         
-        # Calculate similarity with all available components
-        recommendations = []
-        target_features = self.tfidf_vectorizer.transform([target_component.iloc[0]['feature_text']])
-        
-        for _, db_component in available_components.iterrows():
-            if db_component['id'] == component_id:
-                continue  # Skip itself
-                
-            # Find this component in training data for feature comparison
-            train_component = self.components_df[self.components_df['id'] == db_component['id']]
-            if not train_component.empty:
-                comp_features = self.tfidf_vectorizer.transform([train_component.iloc[0]['feature_text']])
-                similarity = cosine_similarity(target_features, comp_features)[0][0]
-                
-                recommendations.append({
-                    'id': db_component['id'],
-                    'model_name': db_component.get('model_name', ''),
-                    'category': category,
-                    'price': db_component.get('price', 0),
-                    'similarity_score': float(similarity),
-                    'brand': db_component.get('brand', ''),
-                    'in_database': True,
-                    'availability_status': 'Available in store'
-                })
+        # Score the whole category at once and read off the database rows
+        rows, scores = self._score_category(target_idx, category)
+        target_id = int(self.components_df.iloc[target_idx]['id'])
+        positions = available_components['id'].map(lambda db_id: self._lookup_row(category, db_id))
+        ids = pd.to_numeric(available_components['id'], errors='coerce')
+        keep = (positions.notna() & (ids != target_id)).to_numpy()
+        available_components = available_components[keep]
+        similarities = scores[np.searchsorted(rows, positions[keep].astype(np.int64).to_numpy())]
         
-        # Sort by similarity and return top N
-        recommendations.sort(key=lambda x: x['similarity_score'], reverse=True)
-        return recommendations[:n_recommendations]
+        # Most similar first; ties keep the database order
+        recommendations = []
+        for position in self._top_k(similarities, n_recommendations).tolist():
+            db_component = available_components.iloc[position]
+            recommendations.append({
+                'id': int(db_component['id']),
+                'model_name': self._text(db_component, 'model_name'),
+                'category': category,
+                'price': self._price(db_component),
+                'similarity_score': float(similarities[position]),
+                'brand': self._text(db_component, 'brand'),
+                'in_database': True,
+                'availability_status': 'Available in store'
+            })
+        return recommendations
     
-    def _calculate_compatibility(self, component: pd.Series, current_build: dict) -> float:
-        """Calculate compatibility score (0-1) - UPDATED VERSION"""
-        score = 0.0
+    @profiled('resolve_build')
+    def _resolve_build(self, current_build: dict) -> dict:
+        """
+        Look up every part of the current build once.
+        Returns {category: component row} for the parts that were found.
+        """
+        build_parts = {}
+        for category, component_id in current_build.items():
+            position = self._lookup_row(category, component_id)
+            if position is not None:
+                build_parts[category] = self.components_df.iloc[position]
+        return build_parts
+    
+    @staticmethod
+    def _price(component: pd.Series) -> int:
+        """Price of a component in whole rupees, 0 when it has none"""
+        price = pd.to_numeric(component.get('price', 0), errors='coerce')
+        return 0 if pd.isna(price) else int(price)
+    
+    @staticmethod
+    def _text(component, name: str) -> str:
+        """A text field of a component, '' when it is missing or not text"""
+        value = component.get(name, '')
+        return value if isinstance(value, str) else ''
+    
+    @staticmethod
+    def _column(df: pd.DataFrame, name: str, default) -> pd.Series:
+        """A column of df, or a column filled with default if it is missing"""
+        if name in df.columns:
+            return df[name]
+        return pd.Series(default, index=df.index, dtype=object)
+    
+    @staticmethod
+    def _lower_text(values: pd.Series) -> pd.Series:
+        """Lower-cased strings, with '' for missing or non-text values"""
+        return values.map(lambda value: value.lower() if isinstance(value, str) else '')
+    
+    def _compatible_mask(self, target_components: pd.DataFrame, category: str, other: str, part: pd.Series) -> np.ndarray:
+        """
+        Whether each row of a category frame is compatible with a build
+        part of another category, read from the compatibility graph
+        """
+        graph = self._compatibility()
+        rows = self._category_rows(category)
+        positions = target_components.index.to_numpy()
+        local = np.searchsorted(rows, positions)
+        found = local < len(rows)
+        found[found] = rows[local[found]] == positions[found]
+        if not found.all():
+            # Rows that aren't parts of the model
+            return np.array(graph.matches(category, other, (row for _, row in target_components.iterrows()), part), dtype=bool)
+        return graph.mask(category, graph.compatible_with(category, other, part))[local]
+    
+    def _parts_compatible(self, component: pd.Series, other: str, part: pd.Series) -> bool:
+        """Whether a part is compatible with a build part of another category, read from the compatibility graph"""
+        graph = self._compatibility()
         category = component['category']
+        local = self._local_index(category, component.name)
+        if local is None:
+            return graph.matches(category, other, [component], part)[0]
+        return graph.is_compatible(category, local, other, part)
+    
+    def _score_compatibility(self, target_components: pd.DataFrame, build_parts: dict) -> np.ndarray:
+        """
+        Calculate compatibility scores (0-1) for every row of a category
+        frame at once. Each rule is evaluated as a boolean mask over the
+        whole frame against the already resolved build parts; the
+        cross-category rules of the compatibility graph are bitset lookups.
+        The storage and cooler-to-case checks are bonuses rather than graph
+        rules: most catalogs lack the columns they compare, and a graph rule
+        would make such parts compatible with nothing.
+        """
+        scores = np.zeros(len(target_components))
+        if target_components.empty:
+            return scores
+        
+        category = target_components['category'].iloc[0]
+        mobo = build_parts.get('motherboard')
+        case = build_parts.get('case')
+        
+        def add(mask, points):
+            mask = np.asarray(mask, dtype=bool)
+            np.add(scores, points, out=scores, where=mask)
         
         # CPU compatibility
-        if category == 'cpu' and 'motherboard' in current_build:
-            mobo_id = current_build['motherboard']
-            mobo = self.components_df[self.components_df['id'] == mobo_id]
-            if not mobo.empty and mobo.iloc[0]['socket'] == component.get('socket'):
-                score += 0.5
+        if category == 'cpu' and mobo is not None:
+            add(self._compatible_mask(target_components, 'cpu', 'motherboard', mobo), 0.5)
         
-        # RAM compatibility  
-        elif category == 'ram' and 'motherboard' in current_build:
-            mobo_id = current_build['motherboard']
-            mobo = self.components_df[self.components_df['id'] == mobo_id]
-            if not mobo.empty and mobo.iloc[0]['memory_type'] == component.get('memory_type'):
-                score += 0.5
+        # RAM compatibility
+        elif category == 'ram' and mobo is not None:
+            add(self._compatible_mask(target_components, 'ram', 'motherboard', mobo), 0.5)
         
         # GPU compatibility
         elif category == 'gpu':
-            if 'case' in current_build:
-                case_id = current_build['case']
-                case = self.components_df[self.components_df['id'] == case_id]
-                if not case.empty and case.iloc[0]['max_gpu_length'] >= component.get('length_mm', 0):
-                    score += 0.3
+            if case is not None:
+                add(self._compatible_mask(target_components, 'gpu', 'case', case), 0.3)
             
-            if 'psu' in current_build:
-                psu_id = current_build['psu']
-                psu = self.components_df[self.components_df['id'] == psu_id]
-                if not psu.empty and psu.iloc[0]['wattage'] >= component.get('tdp', 0) + 100:
-                    score += 0.2
+            psu = build_parts.get('psu')
+            if psu is not None:
+                add(self._compatible_mask(target_components, 'gpu', 'psu', psu), 0.2)
+        
+        # STORAGE compatibility
+        elif category == 'storage' and mobo is not None:
+            storage_interface = self._lower_text(self._column(target_components, 'interface', ''))
+            is_m2 = storage_interface.str.contains('m.2', regex=False)
+            is_sata = storage_interface.str.contains('sata', regex=False)
+            is_nvme = storage_interface.str.contains('nvme', regex=False)
+            has_m2_slots = bool(mobo.get('m2_slots', 0) > 0)
+            has_sata_ports = bool(mobo.get('sata_ports', 0) > 0)
+            
+            # Check interface compatibility
+            add((is_m2 & has_m2_slots)
+                | (~is_m2 & is_sata & has_sata_ports)
+                | (~is_m2 & ~is_sata & is_nvme & has_m2_slots), 0.4)
+            
+            # Check physical fit for larger drives
+            if case is not None and case.get('drive_bays_3.5', 0) > 0:
+                add(storage_interface.str.contains('3.5', regex=False), 0.1)
         
-        # STORAGE compatibility - NEW
-        elif category == 'storage' and 'motherboard' in current_build:
-            mobo_id = current_build['motherboard']
-            mobo = self.components_df[self.components_df['id'] == mobo_id]
-            if not mobo.empty:
-                storage_interface = component.get('interface', '').lower()
-                
-                # Check interface compatibility
-                if 'm.2' in storage_interface and mobo.iloc[0].get('m2_slots', 0) > 0:
-                    score += 0.4
-                elif 'sata' in storage_interface and mobo.iloc[0].get('sata_ports', 0) > 0:
-                    score += 0.4
-                elif 'nvme' in storage_interface and mobo.iloc[0].get('m2_slots', 0) > 0:
-                    score += 0.4
-                
-                # Check physical fit for larger drives
-                if 'case' in current_build and '3.5' in storage_interface:
-                    case_id = current_build['case']
-                    case = self.components_df[self.components_df['id'] == case_id]
-                    if not case.empty and case.iloc[0].get('drive_bays_3.5', 0) > 0:
-                        score += 0.1
-        
-        # COOLING compatibility - NEW
+        # COOLING compatibility
         elif category == 'cooling':
+            cooler_type = self._lower_text(self._column(target_components, 'type', ''))
+            
             # Check socket compatibility with CPU
-            if 'cpu' in current_build:
-                cpu_id = current_build['cpu']
-                cpu = self.components_df[self.components_df['id'] == cpu_id]
-                if not cpu.empty:
-                    cpu_socket = cpu.iloc[0].get('socket', '')
-                    supported_sockets = component.get('supported_sockets', '')
-                    
-                    if cpu_socket and supported_sockets and cpu_socket in supported_sockets:
-                        score += 0.5
-            
-            # Check case compatibility for radiator sizes
-            if 'case' in current_build and component.get('type', '').lower() in ['liquid', 'aio']:
-                case_id = current_build['case']
-                case = self.components_df[self.components_df['id'] == case_id]
-                if not case.empty:
-                    radiator_size = component.get('radiator_size', '')
-                    case_radiator_support = case.iloc[0].get('radiator_support', '')
-                    
-                    if radiator_size and case_radiator_support and radiator_size in case_radiator_support:
-                        score += 0.3
+            cpu = build_parts.get('cpu')
+            if cpu is not None:
+                add(self._compatible_mask(target_components, 'cooling', 'cpu', cpu), 0.5)
             
-            # Check clearance for air coolers
-            if 'case' in current_build and component.get('type', '').lower() in ['air', 'cpu_cooler']:
-                case_id = current_build['case']
-                case = self.components_df[self.components_df['id'] == case_id]
-                cooler_height = component.get('height_mm', 0)
-                case_cpu_clearance = case.iloc[0].get('max_cpu_cooler_height', 0)
+            if case is not None:
+                # Check case compatibility for radiator sizes
+                case_radiator_support = case.get('radiator_support', '')
+                if isinstance(case_radiator_support, str) and case_radiator_support:
+                    radiator_size = self._column(target_components, 'radiator_size', '')
+                    fits = radiator_size.map(lambda size: isinstance(size, str) and bool(size) and size in case_radiator_support)
+                    add(cooler_type.isin(['liquid', 'aio']) & fits, 0.3)
                 
-                if cooler_height and case_cpu_clearance and cooler_height <= case_cpu_clearance:
-                    score += 0.2
-        
-        return min(score, 1.0)
+                # Check clearance for air coolers
+                case_cpu_clearance = case.get('max_cpu_cooler_height', 0)
+                if case_cpu_clearance:
+                    cooler_height = pd.to_numeric(self._column(target_components, 'height_mm', 0), errors='coerce')
+                    fits = (cooler_height != 0) & (cooler_height <= case_cpu_clearance)
+                    add(cooler_type.isin(['air', 'cpu_cooler']) & fits, 0.2)
+        
+        return np.minimum(scores, 1.0)
+    
+    @profiled('compatibility_scoring')
+    def _ranked_compatibility(self, target_components: pd.DataFrame, build_parts: dict) -> list:
+        """
+        (row index, score) pairs for a category frame, ordered by score
+        (descending) and then by row order
+        """
+        scores = self._score_compatibility(target_components, build_parts)
+        order = np.argsort(-scores, kind='stable')
+        return list(zip(target_components.index[order], scores[order]))
+    
+    def _calculate_compatibility(self, component: pd.Series, current_build: dict) -> float:
+        """Calculate compatibility score (0-1) for a single component"""
+        component_frame = component.to_frame().T
+        return float(self._score_compatibility(component_frame, self._resolve_build(current_build))[0])
     
+    @profiled('recommendation_reason')
     def _generate_recommendation_reason(self, component: pd.Series, score: float) -> str:
         """Generate human-readable reason for recommendation"""
         reasons = []
@@ -765,27 +1709,29 @@ class PCRecommendationTrainer:
         
         return ", ".join(reasons)
     
-    def _generate_compatibility_notes(self, component: pd.Series, current_build: dict) -> List[str]:
+    @profiled('compatibility_notes')
+    def _generate_compatibility_notes(self, component: pd.Series, current_build: dict, build_parts: Optional[dict] = None) -> List[str]:
         """Generate compatibility notes for recommendations - UPDATED VERSION"""
+        if build_parts is None:
+            build_parts = self._resolve_build(current_build)
+        
         notes = []
         category = component['category']
         
         # CPU compatibility notes
         if category == 'cpu' and 'motherboard' in current_build:
-            mobo_id = current_build['motherboard']
-            mobo = self.components_df[self.components_df['id'] == mobo_id]
-            if not mobo.empty:
-                if mobo.iloc[0]['socket'] == component.get('socket'):
+            mobo = build_parts.get('motherboard')
+            if mobo is not None:
+                if self._parts_compatible(component, 'motherboard', mobo):
                     notes.append(" Socket compatible with motherboard")
                 else:
                     notes.append(" Socket mismatch with motherboard")
         
         # RAM compatibility notes
         elif category == 'ram' and 'motherboard' in current_build:
-            mobo_id = current_build['motherboard']
-            mobo = self.components_df[self.components_df['id'] == mobo_id]
-            if not mobo.empty:
-                if mobo.iloc[0]['memory_type'] == component.get('memory_type'):
+            mobo = build_parts.get('motherboard')
+            if mobo is not None:
+                if self._parts_compatible(component, 'motherboard', mobo):
                     notes.append(" Memory type compatible")
                 else:
                     notes.append(" Memory type mismatch")
@@ -793,37 +1739,34 @@ class PCRecommendationTrainer:
         # GPU compatibility notes
         elif category == 'gpu':
             if 'case' in current_build:
-                case_id = current_build['case']
-                case = self.components_df[self.components_df['id'] == case_id]
-                if not case.empty:
-                    if case.iloc[0]['max_gpu_length'] >= component.get('length_mm', 0):
+                case = build_parts.get('case')
+                if case is not None:
+                    if self._parts_compatible(component, 'case', case):
                         notes.append(" Fits in selected case")
                     else:
                         notes.append(" May not fit in case")
             
             if 'psu' in current_build:
-                psu_id = current_build['psu']
-                psu = self.components_df[self.components_df['id'] == psu_id]
-                if not psu.empty:
-                    if psu.iloc[0]['wattage'] >= component.get('tdp', 0) + 100:
+                psu = build_parts.get('psu')
+                if psu is not None:
+                    if self._parts_compatible(component, 'psu', psu):
                         notes.append(" Sufficient PSU power")
                     else:
                         notes.append(" Check PSU wattage")
         
         # STORAGE compatibility notes - NEW
         elif category == 'storage' and 'motherboard' in current_build:
-            mobo_id = current_build['motherboard']
-            mobo = self.components_df[self.components_df['id'] == mobo_id]
-            if not mobo.empty:
-                storage_interface = component.get('interface', '').lower()
+            mobo = build_parts.get('motherboard')
+            if mobo is not None:
+                storage_interface = self._text(component, 'interface').lower()
                 
                 if 'm.2' in storage_interface or 'nvme' in storage_interface:
-                    if mobo.iloc[0].get('m2_slots', 0) > 0:
+                    if mobo.get('m2_slots', 0) > 0:
                         notes.append(" M.2 slot available on motherboard")
                     else:
                         notes.append(" No M.2 slots on motherboard")
                 elif 'sata' in storage_interface:
-                    if mobo.iloc[0].get('sata_ports', 0) > 0:
+                    if mobo.get('sata_ports', 0) > 0:
                         notes.append(" SATA ports available")
                     else:
                         notes.append(" No SATA ports available")
@@ -832,25 +1775,25 @@ class PCRecommendationTrainer:
         elif category == 'cooling':
             # Socket compatibility
             if 'cpu' in current_build:
-                cpu_id = current_build['cpu']
-                cpu = self.components_df[self.components_df['id'] == cpu_id]
-                if not cpu.empty:
-                    cpu_socket = cpu.iloc[0].get('socket', '')
+                cpu = build_parts.get('cpu')
+                if cpu is not None:
+                    cpu_socket = cpu.get('socket', '')
                     supported_sockets = component.get('supported_sockets', '')
                     
-                    if cpu_socket and supported_sockets:
-                        if cpu_socket in supported_sockets:
+                    # Missing values are NaN, which is truthy
+                    if isinstance(cpu_socket, str) and isinstance(supported_sockets, str) and cpu_socket and supported_sockets:
+                        if self._parts_compatible(component, 'cpu', cpu):
                             notes.append(f" Compatible with {cpu_socket} socket")
                         else:
                             notes.append(f" Not compatible with {cpu_socket} socket")
             
             # Case compatibility for liquid cooling
-            if 'case' in current_build and component.get('type', '').lower() in ['liquid', 'aio']:
-                case_id = current_build['case']
-                case = self.components_df[self.components_df['id'] == case_id]
-                if not case.empty:
-                    radiator_size = component.get('radiator_size', '')
-                    case_radiator_support = case.iloc[0].get('radiator_support', '')
+            cooler_type = self._text(component, 'type').lower()
+            if 'case' in current_build and cooler_type in ['liquid', 'aio']:
+                case = build_parts.get('case')
+                if case is not None:
+                    radiator_size = self._text(component, 'radiator_size')
+                    case_radiator_support = self._text(case, 'radiator_support')
                     
                     if radiator_size and case_radiator_support:
                         if radiator_size in case_radiator_support:
@@ -859,13 +1802,12 @@ class PCRecommendationTrainer:
                             notes.append(f" {radiator_size} radiator may not fit in case")
             
             # Clearance for air coolers
-            if 'case' in current_build and component.get('type', '').lower() in ['air', 'cpu_cooler']:
-                case_id = current_build['case']
-                case = self.components_df[self.components_df['id'] == case_id]
+            if 'case' in current_build and cooler_type in ['air', 'cpu_cooler']:
+                case = build_parts.get('case')
                 cooler_height = component.get('height_mm', 0)
-                case_cpu_clearance = case.iloc[0].get('max_cpu_cooler_height', 0)
+                case_cpu_clearance = case.get('max_cpu_cooler_height', 0) if case is not None else 0
                 
-                if cooler_height and case_cpu_clearance:
+                if pd.notna(cooler_height) and pd.notna(case_cpu_clearance) and cooler_height and case_cpu_clearance:
                     if cooler_height <= case_cpu_clearance:
                         notes.append(f" Fits within case cooler clearance ({case_cpu_clearance}mm)")
                     else:
@@ -874,30 +1816,288 @@ class PCRecommendationTrainer:
         return notes
     
     def save_model(self, filepath: str):
-        """Save trained model"""
-        model_data = {
-            'tfidf_vectorizer': self.tfidf_vectorizer,
-            'tfidf_matrix': self.tfidf_matrix,
-            'components_df': self.components_df,
-            'similarity_matrix': self.similarity_matrix
-        }
+        """
+        Save trained model as a directory artifact.
+        
+        The TF-IDF matrix, the category blocks and the neighbour graph are
+        stored as .npy arrays that load_model memory-maps, the catalog
+        column by column (see _save_text_column for text columns), and the
+        vectorizer's vocabulary and idf in header.json. Each save writes a
+        new version directory and makes it current by atomically replacing
+        the CURRENT pointer, so a loading process never sees a half-written
+        model. Several processes may save to the same path concurrently.
+        """
+        if self.tfidf_matrix is None:
+            raise Exception("Model not trained!")
+        if self.category_blocks is None:
+            self.build_similarity_engine()
+        
+        os.makedirs(filepath, exist_ok=True)
+        # Written under a hidden name and renamed once complete, so a
+        # concurrent save never prunes a version that is being written
+        temp_path = tempfile.mkdtemp(prefix='.v-', dir=filepath)
+        version_path = os.path.join(filepath, os.path.basename(temp_path)[1:])
+        try:
+            self._write_artifact(temp_path)
+            os.rename(temp_path, version_path)
+            
+            fd, pointer_path = tempfile.mkstemp(prefix='.CURRENT-', dir=filepath)
+            with os.fdopen(fd, 'w') as f:
+                f.write(os.path.basename(version_path))
+            os.replace(pointer_path, os.path.join(filepath, 'CURRENT'))
+        except Exception:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            shutil.rmtree(version_path, ignore_errors=True)
+            raise
         
-        with open(filepath, 'wb') as f:
-            pickle.dump(model_data, f)
+        self._prune_versions(filepath, keep={version_path})
         
         logger.info(f" Model saved to {filepath}")
     
+    @staticmethod
+    def _prune_versions(filepath: str, keep: set):
+        """
+        Remove all but the two newest version directories, never the one
+        CURRENT names. The previous version is kept for processes that read
+        CURRENT just before the swap; pages already mapped stay valid after
+        removal.
+        """
+        try:
+            with open(os.path.join(filepath, 'CURRENT')) as f:
+                keep = keep | {os.path.join(filepath, f.read().strip())}
+            
+            versions = []
+            for name in os.listdir(filepath):
+                if name.startswith('v-'):
+                    path = os.path.join(filepath, name)
+                    try:
+                        versions.append((os.path.getmtime(path), path))
+                    except FileNotFoundError:
+                        pass  # pruned by a concurrent save
+        except OSError as e:
+            logger.warning(f" Could not prune old model versions: {e}")
+            return
+        
+        pruned = []
+        for _, old_version in sorted(versions)[:-2]:
+            if old_version not in keep:
+                shutil.rmtree(old_version, ignore_errors=True)
+                pruned.append(os.path.basename(old_version))
+        if pruned:
+            logger.info(f" Pruned model versions: {', '.join(pruned)}")
+    
+    def _write_artifact(self, path: str):
+        """Write every part of the model into one version directory"""
+        params = self.tfidf_vectorizer.get_params()
+        header = {
+            'format_version': ARTIFACT_FORMAT_VERSION,
+            'n_neighbors': self.n_neighbors,
+            'fit_oov_rate': self.fit_oov_rate,
+            'added_terms': self.added_terms,
+            'added_oov_terms': self.added_oov_terms,
+            'fingerprints': self.fingerprints,
+            'vectorizer': {
+                'max_features': params['max_features'],
+                'stop_words': params['stop_words'],
+                'ngram_range': list(params['ngram_range'])
+            },
+            'vocabulary': {term: int(index) for term, index in self.tfidf_vectorizer.vocabulary_.items()},
+            'idf': self.tfidf_vectorizer.idf_.tolist(),
+            'n_features': self.tfidf_matrix.shape[1],
+            'columns': [],
+            'categories': [],
+            'neighbor_graph': self.neighbor_graph is not None
+        }
+        
+        self._save_csr(os.path.join(path, 'tfidf'), self.tfidf_matrix)
+        
+        catalog_path = os.path.join(path, 'catalog')
+        os.makedirs(catalog_path)
+        for position, (name, values) in enumerate(self.components_df.items()):
+            if isinstance(values.dtype, np.dtype) and values.dtype.kind in 'biuf':
+                file_name = f"{position}.npy"
+                np.save(os.path.join(catalog_path, file_name), values.to_numpy())
+                header['columns'].append({'name': name, 'file': file_name})
+            else:
+                self._save_text_column(os.path.join(catalog_path, str(position)), values)
+                header['columns'].append({'name': name, 'text': str(position)})
+        
+        for category, block in self.category_blocks.items():
+            category_path = os.path.join(path, 'categories', category)
+            os.makedirs(category_path)
+            np.save(os.path.join(category_path, 'rows.npy'), block['rows'])
+            self._save_csr(os.path.join(category_path, 'matrix'), block['matrix'])
+            
+            graph = (self.neighbor_graph or {}).get(category)
+            if graph is not None:
+                for key in ('indptr', 'indices', 'scores'):
+                    np.save(os.path.join(category_path, f"neighbors_{key}.npy"), graph[key])
+            header['categories'].append(category)
+        
+        with open(os.path.join(path, 'header.json'), 'w') as f:
+            json.dump(header, f)
+    
+    @staticmethod
+    def _save_text_column(prefix: str, values: pd.Series):
+        """
+        Save a text column as <prefix>_data.npy, the UTF-8 bytes of every
+        value followed by a NUL byte, <prefix>_offsets.npy, where each
+        value starts (and the end of the last), and <prefix>_kinds.npy,
+        whether a value is text, missing or another value stored as JSON
+        """
+        kinds = np.full(len(values), TEXT_VALUE, dtype=np.uint8)
+        encoded = []
+        for index, value in enumerate(values):
+            if isinstance(value, str):
+                encoded.append(value.encode('utf-8') + b'\0')
+            elif pd.isna(value):
+                kinds[index] = MISSING_VALUE
+                encoded.append(b'\0')
+            else:
+                kinds[index] = JSON_VALUE
+                encoded.append(json.dumps(value, default=lambda value: value.item()).encode('utf-8') + b'\0')
+        
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        np.save(f"{prefix}_data.npy", np.frombuffer(b''.join(encoded), dtype=np.uint8))
+        np.save(f"{prefix}_offsets.npy", offsets)
+        np.save(f"{prefix}_kinds.npy", kinds)
+    
+    @staticmethod
+    def _load_text_column(prefix: str) -> pd.Series:
+        """
+        Load a text column saved by _save_text_column. The bytes are
+        memory-mapped and decoded in one pass, split at the NUL bytes.
+        """
+        data = np.load(f"{prefix}_data.npy", mmap_mode='r')
+        kinds = np.load(f"{prefix}_kinds.npy", mmap_mode='r')
+        parts = str(memoryview(data), 'utf-8').split('\0') if len(data) else ['']
+        if len(parts) != len(kinds) + 1:
+            # Some values contain NUL bytes; cut the bytes at the offsets instead
+            offsets = np.load(f"{prefix}_offsets.npy", mmap_mode='r')
+            parts = [bytes(data[start:end - 1]).decode('utf-8') for start, end in zip(offsets[:-1], offsets[1:])] + ['']
+        
+        values = np.array(parts[:-1], dtype=object)
+        values[kinds == MISSING_VALUE] = np.nan
+        for index in np.flatnonzero(kinds == JSON_VALUE):
+            values[index] = json.loads(values[index])
+        return pd.Series(values)
+    
+    @staticmethod
+    def _save_csr(prefix: str, matrix):
+        """Save the arrays of a CSR matrix as <prefix>_data/_indices/_indptr.npy"""
+        for key in ('data', 'indices', 'indptr'):
+            np.save(f"{prefix}_{key}.npy", getattr(matrix, key))
+    
+    @staticmethod
+    def _load_csr(prefix: str, shape: tuple):
+        """Memory-map a CSR matrix saved by _save_csr"""
+        arrays = tuple(np.load(f"{prefix}_{key}.npy", mmap_mode='r') for key in ('data', 'indices', 'indptr'))
+        return sparse.csr_matrix(arrays, shape=shape)
+    
     def load_model(self, filepath: str):
-        """Load trained model"""
+        """
+        Load trained model, either a directory written by save_model or a
+        model pickled by earlier versions
+        """
+        if os.path.isdir(filepath):
+            self._load_artifact(filepath)
+        else:
+            self._load_pickle(filepath)
+        
+        if self.fit_oov_rate is None:
+            terms, oov_terms = self._count_oov_terms(self.components_df['feature_text'])
+            self.fit_oov_rate = oov_terms / terms if terms else 0.0
+        
+        # Models saved before the neighbour graph existed carry a dense
+        # similarity matrix instead; rebuild the graph for those
+        if self.neighbor_graph is None:
+            self.build_neighbor_graph()
+        
+        logger.info(f" Model loaded from {filepath}")
+    
+    def _load_artifact(self, filepath: str):
+        """
+        Load the current version of a directory artifact. Arrays are
+        memory-mapped read-only and numeric catalog columns are used in
+        place, so processes loading the same artifact share their pages.
+        Text columns are decoded into Python strings, one pass each. The
+        component index and the compatibility graph are built on first use.
+        """
+        with open(os.path.join(filepath, 'CURRENT')) as f:
+            path = os.path.join(filepath, f.read().strip())
+        with open(os.path.join(path, 'header.json')) as f:
+            header = json.load(f)
+        
+        if header.get('format_version') not in SUPPORTED_ARTIFACT_VERSIONS:
+            raise Exception(f"Unsupported model format: {header.get('format_version')}")
+        
+        vectorizer_params = header['vectorizer']
+        self.tfidf_vectorizer = TfidfVectorizer(
+            max_features=vectorizer_params['max_features'],
+            stop_words=vectorizer_params['stop_words'],
+            ngram_range=tuple(vectorizer_params['ngram_range'])
+        )
+        self.tfidf_vectorizer.vocabulary_ = header['vocabulary']
+        self.tfidf_vectorizer.idf_ = np.asarray(header['idf'])
+        
+        n_features = header['n_features']
+        columns = {}
+        for column in header['columns']:
+            if 'text' in column:
+                columns[column['name']] = self._load_text_column(os.path.join(path, 'catalog', column['text']))
+                continue
+            file_path = os.path.join(path, 'catalog', column['file'])
+            if column['file'].endswith('.npy'):
+                columns[column['name']] = np.load(file_path, mmap_mode='r')
+            else:
+                with open(file_path) as f:
+                    columns[column['name']] = pd.Series([np.nan if value is None else value for value in json.load(f)])
+        # Without a copy the numeric columns stay on the mapped pages
+        self.components_df = pd.DataFrame(columns, copy=False)
+        self.tfidf_matrix = self._load_csr(os.path.join(path, 'tfidf'), (len(self.components_df), n_features))
+        
+        self.category_blocks = {}
+        self.neighbor_graph = {} if header['neighbor_graph'] else None
+        for category in header['categories']:
+            category_path = os.path.join(path, 'categories', category)
+            rows = np.load(os.path.join(category_path, 'rows.npy'), mmap_mode='r')
+            self.category_blocks[category] = {
+                'rows': rows,
+                'matrix': self._load_csr(os.path.join(category_path, 'matrix'), (len(rows), n_features))
+            }
+            if self.neighbor_graph is not None:
+                self.neighbor_graph[category] = {
+                    key: np.load(os.path.join(category_path, f"neighbors_{key}.npy"), mmap_mode='r')
+                    for key in ('indptr', 'indices', 'scores')
+                }
+        
+        self.n_neighbors = header['n_neighbors']
+        self.fit_oov_rate = header['fit_oov_rate']
+        self.added_terms = header.get('added_terms', 0)
+        self.added_oov_terms = header.get('added_oov_terms', 0)
+        self.fingerprints = header.get('fingerprints')
+        self.component_index = None
+        self.compatibility_graph = None
+    
+    def _load_pickle(self, filepath: str):
+        """Load a model pickled by earlier versions"""
         with open(filepath, 'rb') as f:
             model_data = pickle.load(f)
         
         self.tfidf_vectorizer = model_data['tfidf_vectorizer']
         self.tfidf_matrix = model_data['tfidf_matrix']
         self.components_df = model_data['components_df']
-        self.similarity_matrix = model_data.get('similarity_matrix')
-        
-        logger.info(f" Model loaded from {filepath}")
+        self.n_neighbors = model_data.get('n_neighbors', self.n_neighbors)
+        self.neighbor_graph = model_data.get('neighbor_graph')
+        self.fit_oov_rate = model_data.get('fit_oov_rate')
+        self.added_terms = 0
+        self.added_oov_terms = 0
+        # Pickled models don't record their inputs, so they can't be refreshed
+        self.fingerprints = None
+        self.category_blocks = None
+        self.compatibility_graph = None
+        self.build_component_index()
 
 def main():
     """Train and test the model"""
@@ -910,11 +2110,11 @@ def main():
         components_df = trainer.load_and_combine_datasets()
         trainer.train_model(components_df)
         
-        # Calculate similarity matrix
-        similarity_matrix = trainer.calculate_similarity_matrix()
+        # Build the neighbour graph
+        trainer.build_neighbor_graph()
         
         # Save the trained model
-        trainer.save_model("trained_recommendation_model.pkl")
+        trainer.save_model("trained_recommendation_model")
         
         # Test 1: Similar components (STRICT MODE - only database components)
         logger.info("\n Testing similar components (STRICT MODE)...")
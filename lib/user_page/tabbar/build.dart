@@ -229,126 +229,41 @@ class _buildPCState extends State<buildPC> {
 
       print(' Loading recommendations for build: $currentBuild');
 
-      // Load separate database and dataset recommendations
-      // CPU recommendations
-      if (_selectedMotherboardIndex != null && _selectedCpuIndex == null) {
-        final cpuRecs = await RecommendationService.getCompatibleRecommendationsSeparate(
-          currentBuild: currentBuild,
-          targetCategory: 'cpu',
-          nRecommendations: 5,
-        );
-        _cpuRecommendations = cpuRecs['database'] ?? [];
-        _cpuDatasetRecommendations = cpuRecs['dataset'] ?? [];
-        print(' Loaded ${_cpuRecommendations.length} CPU DB + ${_cpuDatasetRecommendations.length} dataset recommendations');
-      } else {
-        _cpuRecommendations = [];
-        _cpuDatasetRecommendations = [];
-      }
-
-      // GPU recommendations
-      if (_selectedGpuIndex == null) {
-        final gpuRecs = await RecommendationService.getCompatibleRecommendationsSeparate(
-          currentBuild: currentBuild,
-          targetCategory: 'gpu',
-          nRecommendations: 5,
-        );
-        _gpuRecommendations = gpuRecs['database'] ?? [];
-        _gpuDatasetRecommendations = gpuRecs['dataset'] ?? [];
-        print(' Loaded ${_gpuRecommendations.length} GPU DB + ${_gpuDatasetRecommendations.length} dataset recommendations');
-      } else {
-        _gpuRecommendations = [];
-        _gpuDatasetRecommendations = [];
-      }
-
-      // RAM recommendations
-      if (_selectedMotherboardIndex != null && _selectedRamIndex == null) {
-        final ramRecs = await RecommendationService.getCompatibleRecommendationsSeparate(
-          currentBuild: currentBuild,
-          targetCategory: 'ram',
-          nRecommendations: 5,
-        );
-        _ramRecommendations = ramRecs['database'] ?? [];
-        _ramDatasetRecommendations = ramRecs['dataset'] ?? [];
-        print(' Loaded ${_ramRecommendations.length} RAM DB + ${_ramDatasetRecommendations.length} dataset recommendations');
-      } else {
-        _ramRecommendations = [];
-        _ramDatasetRecommendations = [];
-      }
-
-      // PSU recommendations
-      if ((_selectedCpuIndex != null || _selectedGpuIndex != null) && _selectedPsuIndex == null) {
-        final psuRecs = await RecommendationService.getCompatibleRecommendationsSeparate(
-          currentBuild: currentBuild,
-          targetCategory: 'psu',
-          nRecommendations: 5,
-        );
-        _psuRecommendation = psuRecs['database'] ?? [];
-        _psuDatasetRecommendation = psuRecs['dataset'] ?? [];
-        print('✅ Loaded ${_psuRecommendation.length} PSU DB + ${_psuDatasetRecommendation.length} dataset recommendations');
-      } else {
-        _psuRecommendation = [];
-        _psuDatasetRecommendation = [];
-      }
-
-      // Case recommendations
-      if ((_selectedMotherboardIndex != null || _selectedGpuIndex != null) && _selectedCaseIndex == null) {
-        final caseRecs = await RecommendationService.getCompatibleRecommendationsSeparate(
-          currentBuild: currentBuild,
-          targetCategory: 'case',
-          nRecommendations: 5,
-        );
-        _caseRecommendation = caseRecs['database'] ?? [];
-        _caseDatasetRecommendation = caseRecs['dataset'] ?? [];
-        print('✅ Loaded ${_caseRecommendation.length} Case DB + ${_caseDatasetRecommendation.length} dataset recommendations');
-      } else {
-        _caseRecommendation = [];
-        _caseDatasetRecommendation = [];
-      }
-
-      // Motherboard recommendations
-      if (_selectedCpuIndex != null && _selectedMotherboardIndex == null) {
-        final moboRecs = await RecommendationService.getCompatibleRecommendationsSeparate(
-          currentBuild: currentBuild,
-          targetCategory: 'motherboard',
-          nRecommendations: 5,
-        );
-        _motherboardRecommendations = moboRecs['database'] ?? [];
-        _motherboardDatasetRecommendations = moboRecs['dataset'] ?? [];
-        print('✅ Loaded ${_motherboardRecommendations.length} Motherboard DB + ${_motherboardDatasetRecommendations.length} dataset recommendations');
-      } else {
-        _motherboardRecommendations = [];
-        _motherboardDatasetRecommendations = [];
-      }
-
-      // STORAGE recommendations
-      if (_selectedStorageIndex == null) {
-        final storageRecs = await RecommendationService.getCompatibleRecommendationsSeparate(
-          currentBuild: currentBuild,
-          targetCategory: 'storage',
-          nRecommendations: 5,
-        );
-        _storageRecommendation = storageRecs['database'] ?? [];
-        _storageDatasetRecommendation = storageRecs['dataset'] ?? [];
-        print(' Loaded ${_storageRecommendation.length} Storage DB + ${_storageDatasetRecommendation.length} dataset recommendations');
-      } else {
-        _storageRecommendation = [];
-        _storageDatasetRecommendation = [];
-      }
+      // Load separate database and dataset recommendations for every
+      // category still missing from the build in a single request
+      final targetCategories = <String>[
+        if (_selectedMotherboardIndex != null && _selectedCpuIndex == null) 'cpu',
+        if (_selectedGpuIndex == null) 'gpu',
+        if (_selectedMotherboardIndex != null && _selectedRamIndex == null) 'ram',
+        if ((_selectedCpuIndex != null || _selectedGpuIndex != null) && _selectedPsuIndex == null) 'psu',
+        if ((_selectedMotherboardIndex != null || _selectedGpuIndex != null) && _selectedCaseIndex == null) 'case',
+        if (_selectedCpuIndex != null && _selectedMotherboardIndex == null) 'motherboard',
+        if (_selectedStorageIndex == null) 'storage',
+        if (_selectedCpuIndex != null && _selectedCoolingIndex == null) 'cooling',
+      ];
+      final recs = await RecommendationService.getCompatibleRecommendationsBatch(
+        currentBuild: currentBuild,
+        targetCategories: targetCategories,
+        nRecommendations: 5,
+      );
 
-      // COOLING recommendations
-      if (_selectedCpuIndex != null && _selectedCoolingIndex == null) {
-        final coolingRecs = await RecommendationService.getCompatibleRecommendationsSeparate(
-          currentBuild: currentBuild,
-          targetCategory: 'cooling',
-          nRecommendations: 5,
-        );
-        _coolingRecommendation = coolingRecs['database'] ?? [];
-        _coolingDatasetRecommendation = coolingRecs['dataset'] ?? [];
-        print('✅ Loaded ${_coolingRecommendation.length} Cooling DB + ${_coolingDatasetRecommendation.length} dataset recommendations');
-      } else {
-        _coolingRecommendation = [];
-        _coolingDatasetRecommendation = [];
-      }
+      _cpuRecommendations = recs['cpu']?['database'] ?? [];
+      _cpuDatasetRecommendations = recs['cpu']?['dataset'] ?? [];
+      _gpuRecommendations = recs['gpu']?['database'] ?? [];
+      _gpuDatasetRecommendations = recs['gpu']?['dataset'] ?? [];
+      _ramRecommendations = recs['ram']?['database'] ?? [];
+      _ramDatasetRecommendations = recs['ram']?['dataset'] ?? [];
+      _psuRecommendation = recs['psu']?['database'] ?? [];
+      _psuDatasetRecommendation = recs['psu']?['dataset'] ?? [];
+      _caseRecommendation = recs['case']?['database'] ?? [];
+      _caseDatasetRecommendation = recs['case']?['dataset'] ?? [];
+      _motherboardRecommendations = recs['motherboard']?['database'] ?? [];
+      _motherboardDatasetRecommendations = recs['motherboard']?['dataset'] ?? [];
+      _storageRecommendation = recs['storage']?['database'] ?? [];
+      _storageDatasetRecommendation = recs['storage']?['dataset'] ?? [];
+      _coolingRecommendation = recs['cooling']?['database'] ?? [];
+      _coolingDatasetRecommendation = recs['cooling']?['dataset'] ?? [];
+      print(' Loaded recommendations for ${recs.length} of ${targetCategories.length} categories');
 
     } catch (e) {
       print('Error loading recommendations: $e');